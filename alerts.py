@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import random
+import threading
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+from rate_limiter import TokenBucket
+from metrics import metrics, span
+
+# ALERT DISPATCH
+# Incident alerts go out on background workers, one per channel (SMS, webhook, log),
+# so a slow or hung provider never stalls analysis. Each channel has a bounded queue,
+# its own rate limit and retries with backoff; whatever piles up while a channel is
+# rate-limited goes out as ONE digest ("5 violations on 3 cameras in the last minute").
+
+ALERT_CHANNELS = os.getenv("ALERT_CHANNELS", "auto")   # auto, or a list like "sms,webhook,log" / "log,fake"
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+ALERT_SMS_PER_MIN = float(os.getenv("ALERT_SMS_PER_MIN", "1"))
+ALERT_WEBHOOK_PER_MIN = float(os.getenv("ALERT_WEBHOOK_PER_MIN", "30"))
+SMS_MAX_CHARS = 1500   # Twilio splits / rejects longer bodies
+
+KINDS = ("open", "escalate", "close")
+
+class Alert:
+    """One incident event. kind: 'open', 'escalate' or 'close'."""
+    def __init__(self, camera, issue, kind="open", confidence=None, created=None):
+        self.camera = camera
+        self.issue = issue
+        self.kind = kind
+        self.confidence = confidence
+        self.created = time.time() if created is None else created
+
+    def text(self):
+        if self.kind == "escalate":
+            return f"🚨 FACTORY ALERT ({self.camera}): ESCALATED ({self.confidence}%): {self.issue}"
+        if self.kind == "close":
+            return f"✅ RESOLVED ({self.camera}): {self.issue}"
+        return f"🚨 FACTORY ALERT ({self.camera}): {self.issue}"
+
+    def to_dict(self):
+        return {"camera": self.camera, "issue": self.issue, "kind": self.kind, "confidence": self.confidence,
+                "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.created))}
+
+def _since(seconds):
+    return "last minute" if seconds < 90 else f"last {round(seconds / 60)} min"
+
+def format_alerts(alerts, dropped=0, max_lines=5):
+    """One alert -> its own text; several -> a digest."""
+    if len(alerts) == 1 and not dropped:
+        return alerts[0].text()
+    violations = [a for a in alerts if a.kind != "close"]
+    resolved = len(alerts) - len(violations)
+    cameras = len({a.camera for a in violations})
+    head = f"🚨 FACTORY ALERT: {len(violations) + dropped} violations on {cameras} camera{'s' if cameras != 1 else ''}"
+    head += f" in the {_since(time.time() - min(a.created for a in alerts))}"
+    if resolved:
+        head += f", {resolved} resolved"
+    lines = [f"{a.camera}: {a.issue}" + (" (escalated)" if a.kind == "escalate" else "") for a in violations[-max_lines:]]
+    if len(violations) > max_lines:
+        lines.append(f"+{len(violations) - max_lines} more")
+    if dropped:
+        lines.append(f"{dropped} older alerts dropped (queue full)")
+    return head + ("\n" + "\n".join(lines) if lines else "")
+
+# 1. CHANNELS
+class Channel(ABC):
+    """
+    Base class. send(message, alerts) delivers one message (single alert or digest)
+    and raises on failure, which triggers a retry. per_minute=0 means no rate limit.
+    """
+    name = "channel"
+    kinds = ("open", "escalate")
+
+    def __init__(self, per_minute=0, burst=1):
+        self.per_minute = per_minute
+        self.burst = burst
+
+    @abstractmethod
+    def send(self, message, alerts):
+        pass
+
+class SmsChannel(Channel):
+    name = "sms"
+
+    def __init__(self, client, from_, to, per_minute=ALERT_SMS_PER_MIN):
+        super().__init__(per_minute)
+        self.client = client
+        self.from_ = from_
+        self.to = to
+
+    def send(self, message, alerts):
+        self.client.messages.create(body=message[:SMS_MAX_CHARS], from_=self.from_, to=self.to)
+        print("📱 SMS SENT")
+
+class WebhookChannel(Channel):
+    """POSTs {'text', 'digest', 'alerts'} as JSON (Slack / Teams style 'text' field)."""
+    name = "webhook"
+    kinds = KINDS
+
+    def __init__(self, url, per_minute=ALERT_WEBHOOK_PER_MIN, timeout=5.0):
+        super().__init__(per_minute, burst=3)
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, message, alerts):
+        body = json.dumps({"text": message, "digest": len(alerts) > 1, "alerts": [a.to_dict() for a in alerts]}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()   # non-2xx raises HTTPError
+
+class LogChannel(Channel):
+    """Console only (the always-on channel when nothing else is configured)."""
+    name = "log"
+    kinds = KINDS
+
+    def send(self, message, alerts):
+        print(f"📣 {message}")
+
+# 2. PER-CHANNEL WORKER
+class ChannelWorker:
+    """
+    Owns one channel: a bounded queue (oldest alerts dropped when full), a token
+    bucket for the channel's rate limit and `max_retries` retries with exponential
+    backoff + jitter. Everything queued when the worker gets a send slot is
+    delivered together, as a digest if there's more than one alert.
+    """
+    def __init__(self, channel, max_queue=100, max_retries=3, backoff=2.0, max_backoff=60.0):
+        self.channel = channel
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.bucket = TokenBucket(channel.per_minute / 60.0, capacity=channel.burst) if channel.per_minute else None
+
+        self._queue = deque()
+        self._overflow = 0
+        self._busy = False
+        self._cond = threading.Condition()
+        self._abort = threading.Event()
+
+        self.queued = 0
+        self.messages = 0
+        self.digests = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.dropped = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"alerts-{channel.name}", daemon=True)
+        self._thread.start()
+
+    def put(self, alert):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self._overflow += 1
+                self.dropped += 1
+                metrics.inc("alerts_dropped", channel=self.channel.name)
+            self._queue.append(alert)
+            self.queued += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._abort.is_set():
+                    self._cond.wait()
+                if self._abort.is_set():
+                    return
+
+            # Rate-limited: wait for a slot; alerts arriving meanwhile join the digest
+            while self.bucket is not None and not self.bucket.try_acquire():
+                if self._abort.wait(min(self.bucket.wait_time(), 1.0)):
+                    return
+
+            with self._cond:
+                batch = list(self._queue)
+                self._queue.clear()
+                dropped, self._overflow = self._overflow, 0
+                self._busy = True
+            try:
+                self._deliver(batch, dropped)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _deliver(self, batch, dropped):
+        name = self.channel.name
+        message = format_alerts(batch, dropped)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with span(f"alert_{name}"):
+                    self.channel.send(message, batch)
+                self.messages += 1
+                self.delivered += len(batch)
+                if len(batch) > 1 or dropped:
+                    self.digests += 1
+                metrics.inc("alerts_sent", len(batch), channel=name)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(batch)
+                    metrics.inc("alerts_failed", len(batch), channel=name)
+                    print(f"❌ {name} alert failed after {attempt + 1} attempts: {e}")
+                    return False
+                self.retries += 1
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.8, 1.2)
+                print(f"⚠️ {name} alert failed ({e}), retrying in {delay:.1f}s")
+                if self._abort.wait(delay):
+                    return False
+
+    def flush(self, timeout=10.0):
+        """Waits until everything queued so far was delivered (or gave up). Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def stop(self, timeout=2.0):
+        self._abort.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            depth = len(self._queue)
+        return {
+            "queue_depth": depth,
+            "queued": self.queued,
+            "messages": self.messages,
+            "digests": self.digests,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retries": self.retries,
+            "dropped": self.dropped,
+        }
+
+# 3. DISPATCHER
+class AlertDispatcher:
+    """Fans alerts out to every channel that wants their kind. dispatch() never blocks."""
+    def __init__(self, channels, **worker_options):
+        self.workers = [ChannelWorker(channel, **worker_options) for channel in channels]
+
+    def dispatch(self, alert):
+        targets = [w for w in self.workers if alert.kind in w.channel.kinds]
+        for worker in targets:
+            worker.put(alert)
+        metrics.inc("alerts", kind=alert.kind)
+        return len(targets)
+
+    def flush(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        return all(w.flush(max(0.0, deadline - time.monotonic())) for w in self.workers)
+
+    def stop(self, flush=True, timeout=10.0):
+        if flush:
+            self.flush(timeout)
+        for worker in self.workers:
+            worker.stop()
+
+    def stats(self):
+        return {w.channel.name: w.stats() for w in self.workers}
+
+def build_channels(spec=ALERT_CHANNELS):
+    """
+    'auto': SMS when TWILIO_ACCOUNT_SID is set, a webhook when ALERT_WEBHOOK_URL is
+    set, and the log channel always. Otherwise a comma list of sms / webhook / log / fake.
+    """
+    names = [n.strip() for n in spec.split(",") if n.strip()]
+    if names == ["auto"]:
+        names = (["sms"] if os.getenv("TWILIO_ACCOUNT_SID") else []) + (["webhook"] if ALERT_WEBHOOK_URL else []) + ["log"]
+
+    channels = []
+    for name in names:
+        if name == "sms":
+            if not os.getenv("TWILIO_ACCOUNT_SID"):
+                print("⚠️ sms alerts requested but TWILIO_ACCOUNT_SID is not set - skipping")
+                continue
+            from twilio.rest import Client
+            client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+            channels.append(SmsChannel(client, os.getenv("TWILIO_PHONE_NUMBER"), os.getenv("MY_PHONE_NUMBER")))
+        elif name == "webhook":
+            if not ALERT_WEBHOOK_URL:
+                print("⚠️ webhook alerts requested but ALERT_WEBHOOK_URL is not set - skipping")
+                continue
+            channels.append(WebhookChannel(ALERT_WEBHOOK_URL))
+        elif name == "log":
+            channels.append(LogChannel())
+        elif name == "fake":
+            from fake_alerts import FakeSink
+            channels.append(FakeSink(path=os.getenv("ALERT_FAKE_FILE", "fake_alerts.jsonl")))
+        else:
+            print(f"⚠️ Unknown alert channel '{name}' - skipping")
+    return channels
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_alert_dispatcher():
+    """Process-wide dispatcher, shared by every camera / script."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher(build_channels())
+            print(f"📣 Alert channels: {', '.join(w.channel.name for w in _dispatcher.workers) or 'none'}")
+        return _dispatcher
+
+def send_alert(camera, issue, kind="open", confidence=None):
+    return get_alert_dispatcher().dispatch(Alert(camera, issue, kind, confidence))
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from google import genai
+from google.genai import types
+from dotenv import load_dotenv
+from scene_gate import SceneChangeGate
+from incidents import IncidentTracker
+from rate_limiter import RateLimitedClient, PRIORITY_BACKGROUND
+from frame_encoder import FrameEncoder
+from context_cache import ContextCache, is_cache_error
+from verdict import PROMPT, FRAME_PROMPT, VerdictParseError, generation_config, parse_verdict
+from reports import generate_full_report
+
+# 1. GEMINI CLIENT
+# Only the pieces a file audit needs: no dashboard channel, incident history, speech
+# or alerts. No verdict cache either: its entries expire on the wall clock, and
+# samples that look alike on the video clock are already skipped by the scene gate.
+load_dotenv(override=True)
+client = RateLimitedClient(genai.Client(api_key=os.getenv("GEMINI_API_KEY")), rpm=float(os.getenv("GEMINI_RPM", "15")))
+MODEL_NAME = "gemini-3-flash-preview"
+encoder = FrameEncoder()
+context = ContextCache(client, MODEL_NAME)
+VERDICT_CONFIG = generation_config(max_tokens=os.getenv("VERDICT_MAX_TOKENS"))
+
+# OFFLINE VIDEO AUDIT
+# Walks a recorded file as fast as decoding + the rate limit allow: frames are picked
+# by VIDEO time (every `interval` seconds of footage), everything in between is only
+# grab()bed (demuxed, never decoded), nothing is displayed, and the sampled frames are
+# analyzed by a worker pool. Verdicts are folded into incidents on the video clock.
+
+def video_clock(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+# 2. FRAME SAMPLING
+def iter_samples(path, interval=10.0, start=0.0, end=None):
+    """
+    Yields (video_seconds, frame) every `interval` seconds of video.
+    Skipped frames are grab()bed only; decoding happens just for the frames we keep.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"❌ Could not open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+    step = max(1, int(round(interval * fps)))
+    index = int(start * fps)
+    if index:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)   # one seek to the start point, then sequential
+    last = int(end * fps) if end else total
+
+    try:
+        next_sample = index
+        while last is None or index < last:
+            if index == next_sample:
+                ok, frame = cap.read()
+                if not ok:
+                    return
+                yield index / fps, frame
+                next_sample += step
+            elif not cap.grab():
+                return
+            index += 1
+    finally:
+        cap.release()
+
+def probe(path):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return {"fps": round(fps, 3), "frames": frames, "duration_s": round(frames / fps, 1) if frames else None}
+
+# 3. ANALYSIS
+def analyze_sample(frame, camera_id):
+    """One sampled frame -> Verdict, with the camera's site context. No dashboard, speech or SMS side effects."""
+    _, jpeg_bytes = encoder.prepare(frame, camera_id)
+    image = types.Part.from_bytes(data=jpeg_bytes, mime_type="image/jpeg")
+    for attempt in range(2):
+        ref = context.resolve(camera_id)
+        if ref is None:
+            parts, config = [image, types.Part.from_text(text=PROMPT)], VERDICT_CONFIG
+        else:
+            parts = ref.parts + [image, types.Part.from_text(text=FRAME_PROMPT)]
+            config = generation_config(max_tokens=os.getenv("VERDICT_MAX_TOKENS"), **ref.config)
+        try:
+            response = client.models.generate_content(priority=PRIORITY_BACKGROUND, model=MODEL_NAME,
+                                                      contents=[types.Content(role="user", parts=parts)], config=config)
+            return parse_verdict(response.text)
+        except Exception as e:
+            if attempt or ref is None or not ref.cached or not is_cache_error(e):
+                raise
+            context.invalidate(ref)   # the context cache vanished server-side: recreate once
+
+def run_audit(path, interval=10.0, workers=4, gate_threshold=8.0, camera_id=None, start=0.0, end=None, max_pending=None):
+    """
+    Audits a video file. Returns {"summary": {...}, "timeline": [...], "verdicts": [...]}.
+    gate_threshold=0 analyzes every sample; otherwise samples that look like the last
+    analyzed one are skipped (re-checked at least once per 10 sampled intervals) and
+    count as another sighting of that sample's verdict, so a long unchanged DANGER
+    scene stays one incident.
+    """
+    camera_id = camera_id or os.path.splitext(os.path.basename(path))[0]
+    info = probe(path)
+    print(f"🎞️ Auditing {path} ({video_clock(info['duration_s'] or 0)} of video, {info['fps']} fps) every {interval}s of footage")
+    print(f"🧵 {workers} worker(s), shared limit GEMINI_RPM={os.getenv('GEMINI_RPM', '15')}")
+
+    gate = SceneChangeGate(threshold=gate_threshold, max_staleness=interval * 10)
+    pending = threading.BoundedSemaphore(max_pending or workers * 2)   # decoded frames waiting for a worker
+    results = []
+    unchanged = []   # video times of gate-skipped samples
+    results_lock = threading.Lock()
+    counts = {"samples": 0, "analyzed": 0, "errors": 0, "unparsed": 0}
+    started = time.time()
+
+    def work(video_t, frame):
+        try:
+            verdict = analyze_sample(frame, camera_id)
+            with results_lock:
+                results.append((video_t, verdict))
+                counts["analyzed"] += 1
+            print(f"   [{video_clock(video_t)}] {verdict.status} {verdict.issue}")
+        except VerdictParseError as e:
+            with results_lock:
+                counts["unparsed"] += 1
+            print(f"   [{video_clock(video_t)}] ⚠️ Unusable answer: {e}")
+        except Exception as e:
+            with results_lock:
+                counts["errors"] += 1
+            print(f"   [{video_clock(video_t)}] ❌ {e}")
+        finally:
+            pending.release()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="audit") as pool:
+        for video_t, frame in iter_samples(path, interval, start, end):
+            counts["samples"] += 1
+            # Gate on the VIDEO clock, not wall time
+            if not gate.should_analyze(frame, now=video_t):
+                unchanged.append(video_t)
+                continue
+            pending.acquire()   # back-pressure: decoding never runs far ahead of the workers
+            pool.submit(work, video_t, frame)
+    wall = time.time() - started
+
+    # 4. TIMELINE (verdicts come back out of order: replay them in video order)
+    timeline = []
+    tracker = IncidentTracker(close_after=interval * 3, safe_to_close=2, clock=lambda: 0.0)
+    track = lambda events: timeline.extend(inc for event, inc in events if event == "open")
+    verdicts = sorted(results, key=lambda r: r[0])
+    # A skipped sample looked like the last analyzed one (the gate's reference): same verdict
+    last = None
+    for video_t, verdict in sorted(verdicts + [(t, None) for t in unchanged], key=lambda r: r[0]):
+        last = verdict if verdict is not None else last
+        if last is not None:
+            track(tracker.observe(camera_id, last.status, last.issue, last.confidence, now=video_t))
+    tracker.close_all()
+
+    incidents = [{
+        "start": video_clock(inc.started),
+        "end": video_clock(inc.last_seen),
+        "start_s": round(inc.started, 1),
+        "end_s": round(inc.last_seen, 1),
+        "issue": inc.issue,
+        "peak_confidence": inc.peak_confidence,
+        "sightings": inc.updates,
+    } for inc in timeline]
+
+    covered = (end or info["duration_s"] or 0) - start
+    summary = {
+        "video": os.path.abspath(path),
+        "camera": camera_id,
+        "video_duration_s": info["duration_s"],
+        "interval_s": interval,
+        "samples": counts["samples"],
+        "skipped_unchanged": gate.skipped,
+        "analyzed": counts["analyzed"],
+        "errors": counts["errors"],
+        "unparsed": counts["unparsed"],
+        "danger_verdicts": sum(1 for _, v in verdicts if v.is_danger),
+        "incidents": len(incidents),
+        "wall_time_s": round(wall, 1),
+        "speedup": round(covered / wall, 1) if wall > 0 and covered > 0 else None,
+    }
+    return {
+        "summary": summary,
+        "timeline": incidents,
+        "verdicts": [{"t": round(t, 1), "time": video_clock(t), **v.to_dict()} for t, v in verdicts],
+    }
+
+# 5. REPORTS
+def write_outputs(result, out_prefix):
+    """<prefix>.json (full timeline + per-sample verdicts) and <prefix>.pdf (incident table)."""
+    with open(f"{out_prefix}.json", "w") as f:
+        json.dump(result, f, indent=2)
+
+    s = result["summary"]
+    rows = [{
+        "timestamp": inc["start"],
+        "ended_at": inc["end"],
+        "location": s["camera"],
+        "issue": inc["issue"],
+        "peak_confidence": inc["peak_confidence"],
+    } for inc in result["timeline"]]
+    notes = [
+        f"Video: {os.path.basename(s['video'])} ({video_clock(s['video_duration_s'] or 0)}), one sample every {s['interval_s']}s",
+        f"{s['samples']} samples, {s['analyzed']} analyzed, {s['skipped_unchanged']} unchanged, {s['errors'] + s['unparsed']} failed",
+        f"{s['incidents']} incidents from {s['danger_verdicts']} DANGER verdicts, audited in {s['wall_time_s']}s ({s['speedup']}x realtime)",
+    ]
+    pdf = generate_full_report(history_data=rows, filters={"camera": s["camera"]}, notes=notes)
+    with open(f"{out_prefix}.pdf", "wb") as f:
+        f.write(pdf)
+    return f"{out_prefix}.json", f"{out_prefix}.pdf"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit a recorded video faster than realtime.")
+    parser.add_argument("video")
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds of VIDEO between samples")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent Gemini requests (still capped by GEMINI_RPM)")
+    parser.add_argument("--gate-threshold", type=float, default=8.0, help="0 = analyze every sample")
+    parser.add_argument("--camera", help="camera ID for the report (default: file name)")
+    parser.add_argument("--start", type=float, default=0.0, help="start at this video second")
+    parser.add_argument("--end", type=float, default=None, help="stop at this video second")
+    parser.add_argument("--out", help="output prefix (default: audit_<video name>)")
+    args = parser.parse_args()
+
+    try:
+        result = run_audit(args.video, interval=args.interval, workers=args.workers, gate_threshold=args.gate_threshold,
+                           camera_id=args.camera, start=args.start, end=args.end)
+    finally:
+        # Context caches are billed while they live: drop the ones this audit created
+        context.close()
+    out = args.out or f"audit_{os.path.splitext(os.path.basename(args.video))[0]}"
+    json_path, pdf_path = write_outputs(result, out)
+
+    s = result["summary"]
+    print("------------------------------------------------")
+    for inc in result["timeline"]:
+        print(f"🚨 {inc['start']} - {inc['end']}  {inc['issue']} (peak {inc['peak_confidence']}%, {inc['sightings']} sightings)")
+    print(f"📊 {s['incidents']} incident(s) | {s['analyzed']} analyzed / {s['samples']} samples | {s['wall_time_s']}s wall ({s['speedup']}x realtime)")
+    print(f"💾 {json_path} | 📄 {pdf_path}")
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import tracemalloc
+
+# OFFLINE SENTINEL BENCHMARK
+# Runs the real gemini3_launch pipeline (run_stream -> analyze_frame -> publish /
+# incident store) headlessly against fake_gemini.FakeClient instead of the API,
+# so throughput and latency can be measured without a key, quota or display.
+# Everything the sentinel writes goes into a throwaway working directory.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def make_synthetic_video(path, seconds=10, fps=30, size=(1280, 720)):
+    """A moving block on a noisy background: enough motion to exercise the scene gate."""
+    import cv2
+    import numpy as np
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    rng = np.random.default_rng(0)
+    w, h = size
+    for i in range(seconds * fps):
+        frame = rng.integers(0, 40, (h, w, 3), dtype=np.uint8)
+        x = int((i * 7) % (w - 200))
+        cv2.rectangle(frame, (x, h // 3), (x + 200, h // 3 + 200), (0, 200, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+def timed(fn, bucket):
+    """Wraps fn so every call adds its duration to bucket['seconds'] / bucket['calls']."""
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            bucket["seconds"] += time.perf_counter() - started
+            bucket["calls"] += 1
+    return wrapper
+
+def process_io():
+    """Bytes read / written by this process (Linux only)."""
+    try:
+        with open("/proc/self/io", "r") as f:
+            data = dict(line.split(": ") for line in f.read().splitlines())
+        return {"read_bytes": int(data["read_bytes"]), "write_bytes": int(data["write_bytes"])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+def peak_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        return None
+
+def run_benchmark(video=None, duration=20.0, interval=0.5, latency=(0.3, 0.8), error_rate=0.0, rate_limit_rate=0.0,
+                  workers=1, batch_size=1, gate_threshold=0.0, seed=0, verdict_cache=False):
+    sys.path.insert(0, REPO_DIR)
+    video = os.path.abspath(video) if video else None
+    workdir = tempfile.mkdtemp(prefix="sentinel-bench-")
+    os.chdir(workdir)
+    if video is None:
+        video = make_synthetic_video(os.path.join(workdir, "synthetic.mp4"))
+
+    # Offline environment: fake key, alerts to the local sink, no persisted verdict cache, no local RPM cap
+    os.environ["GEMINI_API_KEY"] = "offline-benchmark"
+    os.environ["ALERT_CHANNELS"] = "fake"
+    os.environ["GEMINI_RPM"] = "1000000"
+    for var in ("TWILIO_ACCOUNT_SID", "VERDICT_CACHE_FILE"):
+        os.environ.pop(var, None)
+
+    # Swap genai.Client for the stand-in BEFORE the sentinel creates its client
+    from google import genai
+    from fake_gemini import FakeClient
+    fake = FakeClient(latency=latency, error_rate=error_rate, rate_limit_rate=rate_limit_rate, seed=seed)
+    genai.Client = lambda *args, **kwargs: fake
+
+    import dotenv
+    dotenv.load_dotenv = lambda *args, **kwargs: False   # don't let a real .env override the fake key
+
+    tracemalloc.start()
+    import gemini3_launch as sentinel
+    from pipeline import run_stream
+    from scene_gate import SceneChangeGate
+    from metrics import metrics
+
+    publish_io = {"seconds": 0.0, "calls": 0}
+    incident_io = {"seconds": 0.0, "calls": 0}
+    sentinel.publisher.publish = timed(sentinel.publisher.publish, publish_io)
+    sentinel.incident_store.append = timed(sentinel.incident_store.append, incident_io)
+    sentinel.speak_warning = lambda *args, **kwargs: None   # keep the speakers quiet during DANGER verdicts
+    if not verdict_cache:
+        # Every sample goes to the (fake) API: otherwise latency figures mostly time cache lookups
+        sentinel.verdict_cache.max_distance = -1
+
+    io_before = process_io()
+    analyze_fn = sentinel.analyze_batch if batch_size > 1 else sentinel.analyze_frame
+    stats = run_stream(video, analyze_fn, interval=interval, workers=workers, gate=SceneChangeGate(threshold=gate_threshold),
+                       batch_size=batch_size, max_wait=interval * batch_size, headless=True, duration=duration)
+    io_after = process_io()
+    _, peak_heap = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    elapsed = stats["elapsed_s"] or duration
+    result = {
+        "config": {
+            "video": os.path.basename(video), "duration_s": duration, "interval_s": interval,
+            "fake_latency_s": list(latency) if isinstance(latency, (tuple, list)) else latency,
+            "error_rate": error_rate, "rate_limit_rate": rate_limit_rate,
+            "workers": workers, "batch_size": batch_size, "gate_threshold": gate_threshold,
+            "verdict_cache": verdict_cache,
+        },
+        "capture_fps": stats["capture_fps"],
+        "frames_captured": stats["frames"],
+        "frames_decoded": stats["decoded"],
+        "analyses": stats["processed"],
+        "analyses_per_s": round(stats["processed"] / elapsed, 3),
+        "dropped_frames": stats["dropped"],
+        "latency_s": stats["latency_s"],
+        "api": fake.models.stats(),
+        "api_latency": metrics.snapshot()["stages"].get("gemini_call"),
+        "verdict_cache": sentinel.verdict_cache.stats(),
+        "memory": {"peak_python_heap_mb": round(peak_heap / (1024 * 1024), 2), "peak_rss_mb": peak_rss_mb()},
+        "file_io": {
+            "publish_ms_avg": round(1000 * publish_io["seconds"] / publish_io["calls"], 3) if publish_io["calls"] else None,
+            "publish_calls": publish_io["calls"],
+            "incident_write_ms_avg": round(1000 * incident_io["seconds"] / incident_io["calls"], 3) if incident_io["calls"] else None,
+            "incident_writes": incident_io["calls"],
+            "process_write_bytes": io_after["write_bytes"] - io_before["write_bytes"] if io_before and io_after else None,
+        },
+        "gate": stats["gate"],
+        "alerts": sentinel.get_alert_dispatcher().stats(),
+        "stages": metrics.snapshot()["stages"],
+        "platform": {"python": platform.python_version(), "system": platform.system()},
+        "workdir": workdir,
+    }
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless, offline benchmark of the sentinel loop.")
+    parser.add_argument("video", nargs="?", help="video file (default: generated synthetic clip)")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between samples")
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.3, 0.8], metavar=("MIN", "MAX"), help="fake API latency range")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--gate-threshold", type=float, default=0.0, help="0 = analyze every sample")
+    parser.add_argument("--verdict-cache", action="store_true", help="keep the perceptual-hash verdict cache on (hits skip the API)")
+    parser.add_argument("--json", default="bench_results.json", help="machine-readable output file")
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.json)
+    result = run_benchmark(args.video, duration=args.duration, interval=args.interval, latency=tuple(args.latency),
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, workers=args.workers,
+                           batch_size=args.batch_size, gate_threshold=args.gate_threshold, verdict_cache=args.verdict_cache)
+    with open(out_path, "w") as f:
+        json.dump(result, f, indent=2)
+
+    lat = result["latency_s"]
+    print("------------------------------------------------")
+    print(f"🎞️ Capture: {result['capture_fps']} fps | 🤖 Analyses: {result['analyses_per_s']}/s ({result['dropped_frames']} dropped)")
+    print(f"⏱️ Verdict latency p50 {lat['p50']}s | p95 {lat['p95']}s | p99 {lat['p99']}s")
+    api = result["api_latency"] or {}
+    print(f"🤖 API calls {result['api']['calls']} (p50 {api.get('p50_ms')} ms, p95 {api.get('p95_ms')} ms) | ♻️ Verdict cache hits {result['verdict_cache']['hits']}")
+    print(f"🧠 Peak heap {result['memory']['peak_python_heap_mb']} MB | RSS {result['memory']['peak_rss_mb']} MB")
+    print(f"💾 Publish {result['file_io']['publish_ms_avg']} ms avg | wrote {result['file_io']['process_write_bytes']} bytes")
+    print(f"📄 Results: {out_path}")
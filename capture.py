@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import random
+import threading
+import cv2
+from metrics import metrics, span
+
+LIVE_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+
+def is_live(source):
+    return isinstance(source, int) or str(source).isdigit() or str(source).lower().startswith(LIVE_PREFIXES)
+
+def display_available():
+    """False on a headless Linux box, where cv2.imshow would abort the process."""
+    if sys.platform.startswith("linux"):
+        return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+    return True
+
+# FRAME GRABBER
+class FrameGrabber:
+    """
+    Dedicated capture thread for one source.
+    It only grab()s - the packet is demuxed but not decoded - so keeping a stream
+    drained costs little CPU. retrieve() decodes the LATEST grabbed frame when a
+    consumer actually needs pixels (a sample, the detector, the preview).
+    - Files are paced to their own FPS (they behave like a camera) and loop.
+    - Dropped sources (RTSP hiccup, unplugged webcam, unreadable file) are reopened
+      with exponential backoff + jitter, up to `max_backoff` seconds.
+    - With loop_files=False a file that ends or can't be opened sets `finished`.
+    """
+    def __init__(self, source, loop_files=True, max_backoff=30.0, name=None):
+        self.source = source
+        self.loop_files = loop_files
+        self.max_backoff = max_backoff
+        self.live = is_live(source)
+
+        self._cap = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._has_frame = False
+        self._seq = 0               # bumps on every successful grab
+        self._decoded = (-1, None)  # (seq, frame) cache: one decode per grabbed frame at most
+
+        self.grabbed = 0
+        self.retrieved = 0
+        self.reconnects = 0
+        self.connected = False
+        self.finished = False
+
+        self._thread = threading.Thread(target=self._run, name=name or f"grab-{source}", daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        if self.live:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)   # don't queue stale frames in the backend
+        return cap
+
+    def _reconnect(self, attempt):
+        delay = min(self.max_backoff, 2 ** attempt) * random.uniform(0.8, 1.2)
+        print(f"🔌 Source {self.source} unavailable, retrying in {delay:.1f}s")
+        metrics.inc("capture_reconnects")
+        self._stop.wait(delay)
+
+    def _run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            if self._cap is None:
+                cap = self._open()
+                if cap is None and not self.live and not self.loop_files:
+                    print(f"❌ Could not open {self.source}")
+                    self.finished = True
+                    return
+                if cap is None:
+                    self._reconnect(attempt)
+                    attempt += 1
+                    continue
+                with self._lock:
+                    self._cap = cap
+                self.connected = True
+                if attempt:
+                    self.reconnects += 1
+                    print(f"✅ Source {self.source} reconnected")
+                attempt = 0
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                frame_time = 1.0 / fps if (not self.live and fps and fps > 0) else 0.0
+                next_tick = time.monotonic()
+
+            with span("grab"):
+                with self._lock:
+                    ok = self._cap.grab()
+                    if ok:
+                        self._seq += 1
+                        self._has_frame = True
+            if ok:
+                self.grabbed += 1
+                metrics.inc("frames_captured")
+                if frame_time:
+                    # Files: keep to the video's own frame rate
+                    next_tick += frame_time
+                    delay = next_tick - time.monotonic()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    else:
+                        next_tick = time.monotonic()
+                continue
+
+            metrics.inc("capture_failures")
+            if not self.live and self.loop_files and self.grabbed:
+                with self._lock:
+                    self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    looped = self._cap.grab()
+                    if looped:
+                        self._seq += 1
+                if looped:
+                    self.grabbed += 1
+                    metrics.inc("frames_captured")
+                    next_tick = time.monotonic()
+                    continue
+            if not self.live and not self.loop_files:
+                self.finished = True
+                return
+            # Lost the source: drop it and reconnect with backoff
+            with self._lock:
+                self._cap.release()
+                self._cap = None
+                self._has_frame = False
+            self.connected = False
+            self._reconnect(attempt)
+            attempt += 1
+
+    def retrieve(self):
+        """Decodes and returns the latest grabbed frame (None until the first grab)."""
+        with self._lock:
+            if self._cap is None or not self._has_frame:
+                return None
+            seq, frame = self._decoded
+            if seq == self._seq:
+                return frame
+            with span("retrieve"):
+                ok, frame = self._cap.retrieve()
+            if not ok:
+                return None
+            self._decoded = (self._seq, frame)
+            self.retrieved += 1
+            return frame
+
+    def wait_ready(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while not self._has_frame and time.monotonic() < deadline and not self._stop.is_set() and not self.finished:
+            time.sleep(0.05)
+        return self._has_frame
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self._thread.join(timeout)
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+
+    def stats(self):
+        return {
+            "grabbed": self.grabbed,
+            "decoded": self.retrieved,
+            "reconnects": self.reconnects,
+            "connected": self.connected,
+        }
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from verdict import SYSTEM_INSTRUCTION
+from metrics import metrics, span
+
+SITE_CONTEXT_FILE = os.getenv("SITE_CONTEXT_FILE", "site_context.json")
+CONTEXT_CACHE = os.getenv("CONTEXT_CACHE", "auto")   # auto: cache site context server-side; off: send it inline
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", "3600"))
+
+IMAGE_TYPES = {".png": "image/png", ".webp": "image/webp"}
+
+# 1. SITE MATERIAL
+def load_site_context(path=SITE_CONTEXT_FILE):
+    """
+    site_context.json: {"default": {"rules": ["Hard hats everywhere on the floor"]},
+                        "Camera-02": {"rules": ["Press area: gloves + face shield"],
+                                      "references": [{"image": "refs/press_ok.jpg", "caption": "Correct setup"}]}}
+    A camera gets the default entry plus its own. Image paths are relative to the file.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+class SiteContext:
+    """System instruction + reference images for one camera. `key` identifies the material (cameras with the same material share a cache)."""
+    def __init__(self, rules=(), references=(), base_dir="."):
+        self.rules = list(rules)
+        self.references = []
+        for ref in references:
+            path = os.path.join(base_dir, ref["image"])
+            with open(path, "rb") as f:
+                data = f.read()
+            mime = IMAGE_TYPES.get(os.path.splitext(path)[1].lower(), "image/jpeg")
+            self.references.append((ref.get("caption", ""), data, mime))
+
+        digest = hashlib.sha1(self.instruction().encode("utf-8"))
+        for caption, data, mime in self.references:
+            digest.update(caption.encode("utf-8"))
+            digest.update(hashlib.sha1(data).digest())
+        self.key = digest.hexdigest()[:16]
+
+    def instruction(self):
+        if not self.rules:
+            return SYSTEM_INSTRUCTION
+        return SYSTEM_INSTRUCTION + "\nSite rules (a broken rule is a violation):\n" + "\n".join(f"- {r}" for r in self.rules)
+
+    def reference_parts(self):
+        """
+        Labelled reference images. They are lettered, not numbered, and fenced off,
+        so the camera frames that follow stay "images 1-n" for the batch prompt.
+        """
+        from google.genai import types
+        if not self.references:
+            return []
+        parts = [types.Part.from_text(text="Site reference images (examples only, NOT camera frames to check):")]
+        for i, (caption, data, mime) in enumerate(self.references):
+            parts.append(types.Part.from_text(text=f"Reference {chr(ord('A') + i % 26)}: {caption or 'correct setup'}"))
+            parts.append(types.Part.from_bytes(data=data, mime_type=mime))
+        parts.append(types.Part.from_text(text="End of reference images. Only the camera frames after this count."))
+        return parts
+
+class ContextRef:
+    """What one request needs: generation_config options + parts to put before the image."""
+    def __init__(self, key, config, parts=(), cached=False):
+        self.key = key
+        self.config = config
+        self.parts = list(parts)
+        self.cached = cached
+
+def _expiry(cache, ttl):
+    expire = getattr(cache, "expire_time", None)
+    try:
+        return expire.timestamp()
+    except AttributeError:
+        return time.time() + ttl
+
+def is_cache_error(error):
+    """The server no longer knows the cache we referenced (expired early, deleted, other project)."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    text = str(error).lower()
+    return code in (403, 404) or "cachedcontent" in text or "cached content" in text
+
+# 2. CONTEXT CACHE
+class ContextCache:
+    """
+    Registers each camera's site context (system instruction + rules + reference
+    images) ONCE with the Gemini context-caching API and hands out its name, so a
+    request carries only the frame and a short prompt.
+    - Caches live `ttl` seconds; within `refresh_margin` of expiry the TTL is
+      extended (or the cache recreated if it's gone).
+    - If the API refuses (content under the model's minimum cacheable size,
+      model without caching, CONTEXT_CACHE=off) the same context is sent inline
+      as system_instruction + parts, and creation is retried after `retry_after`.
+    - Cameras without site material get None: callers keep the plain PROMPT path.
+    site_context.json is re-read when it changes.
+    """
+    def __init__(self, client, model, path=SITE_CONTEXT_FILE, ttl=CONTEXT_CACHE_TTL, refresh_margin=300,
+                 mode=CONTEXT_CACHE, retry_after=900.0):
+        self.client = client
+        self.model = model
+        self.path = path
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl / 2)
+        self.mode = mode
+        self.retry_after = retry_after
+
+        self._mtime = None
+        self._site = {}
+        self._materials = {}   # camera -> SiteContext or None
+        self._caches = {}      # material key -> {"name", "expires"}
+        self._failed = {}      # material key -> retry creation after this time
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+        self.created = 0
+        self.refreshed = 0
+        self.failures = 0
+        self.cached_requests = 0
+        self.inline_requests = 0
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self._mtime = mtime
+            try:
+                self._site = load_site_context(self.path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not read {self.path}: {e}")
+                self._site = {}
+            self._materials = {}
+
+    def material(self, camera_id=None):
+        """SiteContext for a camera, or None when there's nothing site-specific to add."""
+        with self._lock:
+            self._reload()
+            if camera_id not in self._materials:
+                default = self._site.get("default", {})
+                own = self._site.get(camera_id, {}) if camera_id else {}
+                rules = default.get("rules", []) + own.get("rules", [])
+                references = default.get("references", []) + own.get("references", [])
+                material = None
+                if rules or references:
+                    try:
+                        material = SiteContext(rules, references, os.path.dirname(os.path.abspath(self.path)))
+                    except (OSError, KeyError) as e:
+                        print(f"⚠️ Site context for {camera_id} skipped: {e}")
+                self._materials[camera_id] = material
+            return self._materials[camera_id]
+
+    def prompt_key(self, camera_id, prompt):
+        """Verdict-cache key: the same frame under different site rules is a different question."""
+        material = self.material(camera_id)
+        return prompt if material is None else f"{prompt}\n#site:{material.key}"
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def resolve(self, camera_id=None):
+        """ContextRef for a request from this camera, or None (use the plain prompt)."""
+        material = self.material(camera_id)
+        if material is None:
+            return None
+        name = self._cache_name(material) if self.mode != "off" else None
+        if name:
+            self.cached_requests += 1
+            return ContextRef(material.key, {"cached_content": name}, cached=True)
+        self.inline_requests += 1
+        return ContextRef(material.key, {"system_instruction": material.instruction()}, material.reference_parts())
+
+    def _cache_name(self, material):
+        key = material.key
+        with self._key_lock(key):   # one create / refresh per material, other cameras aren't held up
+            now = time.time()
+            entry = self._caches.get(key)
+            if entry and now < entry["expires"] - self.refresh_margin:
+                return entry["name"]
+            if entry and now < entry["expires"] and self._extend(entry):
+                return entry["name"]
+            if now < self._failed.get(key, 0):
+                return None
+            return self._create(material)
+
+    def _extend(self, entry):
+        from google.genai import types
+        try:
+            with span("context_cache"):
+                cache = self.client.caches.update(name=entry["name"], config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"))
+            entry["expires"] = _expiry(cache, self.ttl)
+            self.refreshed += 1
+            metrics.inc("context_cache", event="refreshed")
+            return True
+        except Exception as e:
+            print(f"⚠️ Context cache refresh failed, recreating: {e}")
+            return False
+
+    def _create(self, material):
+        from google.genai import types
+        contents = [types.Content(role="user", parts=material.reference_parts())] if material.references else None
+        try:
+            with span("context_cache"):
+                cache = self.client.caches.create(
+                    model=self.model,
+                    config=types.CreateCachedContentConfig(
+                        display_name=f"sentinel-{material.key}",
+                        system_instruction=material.instruction(),
+                        contents=contents,
+                        ttl=f"{self.ttl}s",
+                    ),
+                )
+        except Exception as e:
+            self.failures += 1
+            self._failed[material.key] = time.time() + self.retry_after
+            metrics.inc("context_cache", event="failed")
+            print(f"⚠️ Context caching unavailable ({e}) - sending site context inline for {self.retry_after:.0f}s")
+            return None
+        self._caches[material.key] = {"name": cache.name, "expires": _expiry(cache, self.ttl)}
+        self._failed.pop(material.key, None)
+        self.created += 1
+        metrics.inc("context_cache", event="created")
+        print(f"🗂️ Context cached as {cache.name} (ttl {self.ttl}s)")
+        return cache.name
+
+    def invalidate(self, ref):
+        """Call when a request says the referenced cache is gone; the next resolve() recreates it."""
+        if ref is not None:
+            with self._key_lock(ref.key):
+                self._caches.pop(ref.key, None)
+
+    def close(self):
+        """Deletes the caches this process created (they'd expire on their own, but storage is billed until then)."""
+        for key, entry in list(self._caches.items()):
+            try:
+                self.client.caches.delete(name=entry["name"])
+            except Exception as e:
+                print(f"⚠️ Could not delete context cache {entry['name']}: {e}")
+            self._caches.pop(key, None)
+
+    def stats(self):
+        return {
+            "caches": len(self._caches),
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+            "cached_requests": self.cached_requests,
+            "inline_requests": self.inline_requests,
+        }
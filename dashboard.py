@@ -1,12 +1,14 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import json
 import time
-import os
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
-from fpdf import FPDF
+from incident_store import IncidentStore
+from reports import ReportService
+from metrics import counter_rate
+from timeseries import TimeSeriesStore
+from live_feed import LiveFeed
 
 # --- PAGE CONFIG ---
 st.set_page_config(
@@ -16,89 +18,73 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# --- AUTHENTICATION STATE ---
-if 'authenticated' not in st.session_state:
-    st.session_state['authenticated'] = False
+# --- INCIDENT DATABASE ---
+@st.cache_resource
+def get_incident_store():
+    return IncidentStore()
 
-# --- PDF GENERATOR (FIXED FOR TEXT WRAPPING) ---
-class PDF(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 16)
-        self.cell(0, 10, 'Factory Sentinel - Full Incident Report', 0, 1, 'C')
-        self.ln(10)
-    
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+# --- PDF REPORTS (rendered off the UI thread, shared by all sessions) ---
+@st.cache_resource
+def get_report_service():
+    return ReportService(get_incident_store())
 
-def generate_pdf(report_data):
-    # This is for single reports (from button)
-    # We wrap this in a list to use the same logic as the full report
-    return generate_full_report([report_data] if isinstance(report_data, dict) else report_data)
+# --- CONFIDENCE HISTORY (written by the sentinel, one series per camera) ---
+@st.cache_resource
+def get_timeseries():
+    return TimeSeriesStore()
 
-def generate_full_report(history_data=None):
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    
-    # Meta Data
-    pdf.cell(0, 10, f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 0, 1)
-    pdf.cell(0, 10, f"Location: Factory Floor - Sector 4 (Cam-01)", 0, 1)
-    pdf.ln(5)
-    
-    # Table Header
-    pdf.set_fill_color(200, 220, 255)
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(50, 10, "Time", 1, 0, 'C', 1)
-    pdf.cell(140, 10, "Violation Detected", 1, 1, 'C', 1)
-    
-    # Table Content
-    pdf.set_font("Arial", size=10)
-    
-    # Load data if not provided directly
-    if history_data is None:
-        if os.path.exists("incident_log.json"):
-            with open("incident_log.json", "r") as f:
-                history_data = json.load(f)
-        else:
-            history_data = []
+# --- LIVE FEED (one poller per dashboard process, every tab reads its snapshot) ---
+@st.cache_resource
+def get_live_feed():
+    return LiveFeed(store=get_incident_store(), timeseries=get_timeseries())
 
-    for item in history_data:
-        timestamp = str(item.get('timestamp', item.get('Time', 'N/A')))
-        issue = str(item.get('issue', item.get('Violation', 'Unknown Issue')))
-        
-        # --- LOGIC FOR TEXT WRAPPING ---
-        # 1. Save current cursor position (Top-Left of the row)
-        x_start = pdf.get_x()
-        y_start = pdf.get_y()
-        
-        # 2. Check for page break
-        if y_start > 270: # If near bottom of A4 page
-            pdf.add_page()
-            y_start = pdf.get_y()
-            x_start = pdf.get_x()
-        
-        # 3. Print the "Violation" cell FIRST using MultiCell to measure its height
-        # We move the cursor to the right to print the second column first
-        pdf.set_xy(x_start + 50, y_start)
-        pdf.multi_cell(140, 10, issue, 1, 'L')
-        
-        # 4. Get the new Y position (Bottom of the row)
-        y_end = pdf.get_y()
-        row_height = y_end - y_start
-        
-        # 5. Move cursor BACK to the start to print the "Time" cell
-        pdf.set_xy(x_start, y_start)
-        pdf.cell(50, row_height, timestamp, 1, 0, 'C') # Use row_height so borders match
-        
-        # 6. Move cursor to the next line for the next loop
-        pdf.set_xy(x_start, y_end)
+TREND_WINDOWS = {"15 min": 900, "1 hour": 3600, "24 hours": 86400, "7 days": 7 * 86400, "30 days": 30 * 86400}
+
+def render_trend(ph, camera, window, series):
+    # At most ~300 points whatever the window: raw, 1-minute or 1-hour rollups
+    if not series["t"]:
+        ph.caption(f"No verdicts recorded for {camera} in the last {window}.")
+        return
+    df = pd.DataFrame(series)
+    df["Time"] = pd.to_datetime(df["t"], unit="s", utc=True).dt.tz_convert(datetime.now().astimezone().tzinfo)
+    fig = px.area(df, x="Time", y="avg", markers=series["resolution"] == "raw", color_discrete_sequence=["#00cc96"])
+    if series["resolution"] != "raw":
+        # min / max envelope of each bucket
+        fig.add_scatter(x=df["Time"], y=df["max"], mode="lines", line=dict(width=0.5, color="#ff4b4b"), name="max")
+        fig.add_scatter(x=df["Time"], y=df["min"], mode="lines", line=dict(width=0.5, color="#00cc96", dash="dot"), name="min")
+    fig.update_layout(plot_bgcolor="#0e1117", paper_bgcolor="rgba(0,0,0,0)", font=dict(color="#00cc96"), height=250, yaxis_range=[0,100],
+                      yaxis_title="Conf", xaxis_title=f"{camera} ({series['resolution']} resolution)", showlegend=False)
+    try: ph.plotly_chart(fig, use_container_width=True)
+    except: ph.plotly_chart(fig)
 
-    if not history_data:
-        pdf.cell(190, 10, "No incidents recorded.", 1, 1, 'C')
+# --- PIPELINE HEALTH (sentinel's rolling metrics file) ---
+def render_health(ph, snap):
+    with ph.container():
+        if not snap:
+            st.caption("No metrics yet - start the sentinel to see per-stage timings.")
+            return
+        age = time.time() - snap.get("timestamp", 0)
+        m1, m2, m3, m4, m5 = st.columns(5)
+        capture = counter_rate(snap, "frames_captured")
+        analyzed = counter_rate(snap, "frames_analyzed")
+        counters = snap.get("counters", {})
+        parses = sum(v for k, v in counters.items() if k.startswith("verdict_parse{"))
+        failed = counters.get('verdict_parse{result="failed"}', 0)
+        m1.metric("Capture FPS", f"{capture:.1f}" if capture is not None else "-")
+        m2.metric("Analyses / min", f"{analyzed * 60:.1f}" if analyzed is not None else "-")
+        m3.metric("Queue depth", snap.get("gauges", {}).get("queue_depth", 0))
+        m4.metric("Dropped frames", counters.get("frames_dropped", 0))
+        m5.metric("Parse failures", f"{failed / parses:.1%}" if parses else "-")
+        stages = snap.get("stages", {})
+        if stages:
+            df = pd.DataFrame([{"Stage": name, **summary} for name, summary in stages.items()])
+            df = df.rename(columns={"count": "Calls", "avg_ms": "Avg ms", "p50_ms": "p50 ms", "p95_ms": "p95 ms", "max_ms": "Max ms"})
+            st.dataframe(df.sort_values("p95 ms", ascending=False), hide_index=True, use_container_width=True)
+        st.caption(f"Updated {age:.0f}s ago" + (" - sentinel may be stopped" if age > 30 else ""))
 
-    return pdf.output(dest='S').encode('latin-1')
+# --- AUTHENTICATION STATE ---
+if 'authenticated' not in st.session_state:
+    st.session_state['authenticated'] = False
 
 # --- 1. LOGIN PAGE ---
 def login_page():
@@ -143,8 +129,17 @@ def main_dashboard():
         
     st.markdown("---")
     st.subheader("📈 CONFIDENCE TREND")
+    t1, t2 = st.columns(2)
+    with t1: trend_window = st.selectbox("Window", list(TREND_WINDOWS), index=1)
+    with t2: trend_camera = st.selectbox("Trend camera", ["Live camera"] + get_timeseries().cameras())
     graph_ph = st.empty()
     
+    st.markdown("---")
+    st.subheader("🩺 PIPELINE HEALTH")
+    health_ph = st.empty()
+    feed = get_live_feed()
+    render_health(health_ph, feed.snapshot().metrics)
+    
     st.markdown("---")
     c_log, c_rep = st.columns(2)
     with c_log: 
@@ -153,57 +148,103 @@ def main_dashboard():
     with c_rep:
         st.subheader("📑 FULL HISTORY REPORT")
         
-        hist_count = 0
-        if os.path.exists("incident_log.json"):
-            try:
-                with open("incident_log.json", "r") as f:
-                    hist_count = len(json.load(f))
-            except: pass
+        store = get_incident_store()
+        reports = get_report_service()
+        # Counts come from the shared feed; only the filtered count below hits the database
+        counts = feed.snapshot().incidents
+        hist_count = counts["total"] if counts else store.count()
+        open_count = counts["open"] if counts else store.open_count()
+        st.info(f"Database contains {hist_count} recorded incidents" + (f" ({open_count} ongoing)." if open_count else "."))
+        
+        # Report filters
+        f1, f2 = st.columns(2)
+        with f1: dates = st.date_input("Date range", value=())
+        with f2: camera = st.selectbox("Camera", ["All"] + store.cameras())
+        f3, f4 = st.columns(2)
+        with f3: search = st.text_input("Issue contains")
+        with f4: max_pages = st.number_input("Max pages", min_value=1, max_value=500, value=50)
+        
+        filters = {
+            "start": f"{dates[0]} 00:00:00" if len(dates) > 0 else None,
+            "end": f"{dates[-1]} 23:59:59" if len(dates) > 0 else None,
+            "camera": None if camera == "All" else camera,
+            "search": search or None,
+        }
+        match_count = store.count(**filters)
         
-        st.info(f"Database contains {hist_count} recorded incidents.")
+        if st.button(f"Generate PDF Report ({match_count} Events) 📄", type="primary"):
+            # Rendered on a background thread from the incident database
+            st.session_state['report_key'] = reports.request(filters, max_pages=int(max_pages))
         
-        if st.button(f"Download Full PDF Report ({hist_count} Events) 📄", type="primary"):
-            # Generates PDF from the JSON log file
-            pdf_data = generate_full_report()
-            st.download_button("📥 Click to Save PDF", data=pdf_data, file_name="Full_Incident_Log.pdf", mime="application/pdf")
+        report_key = st.session_state.get('report_key')
+        if report_key:
+            try:
+                pdf_data = reports.result(report_key)
+            except Exception as e:
+                pdf_data = None
+                st.error(f"Report failed: {e}")
+                st.session_state['report_key'] = None
+            if pdf_data:
+                st.download_button("📥 Click to Save PDF", data=pdf_data, file_name="Full_Incident_Log.pdf", mime="application/pdf")
+            elif reports.is_pending(report_key):
+                st.caption("⏳ Building report in the background...")
 
-    if 'history' not in st.session_state: st.session_state['history'] = []
-    
     if live:
+        # The shared LiveFeed polls the sentinel's channel once for every tab;
+        # this loop only compares versions and renders what changed
+        seq = None
+        curr = {}
+        first = True
+        version = None
+        shown_metrics = feed.snapshot().metrics
+        last_health = time.time()
+        shown_trend = None
         while live:
-            status_file = "status.json"
-            curr = {}
-            if os.path.exists(status_file):
-                try:
-                    with open(status_file, "r") as f: curr = json.load(f)
-                    if curr: 
-                        st.session_state['history'].append({"Time": datetime.now().strftime("%H:%M:%S"), "Conf": curr.get("confidence", 0)})
-                        if len(st.session_state['history']) > 30: st.session_state['history'].pop(0)
-                except: pass
-            
-            if os.path.exists("current_frame.jpg"):
-                try: vid_ph.image("current_frame.jpg", caption="Live Feed", width="stretch")
-                except: vid_ph.image("current_frame.jpg", caption="Live Feed", use_container_width=True)
+            # Wakes on a new snapshot, or after a second to tick the clock
+            snap = feed.wait(version, timeout=1.0)
+            version = snap.version
+            status_changed = False
+            if snap.seq != seq:
+                seq, curr, frame_bytes = snap.seq, snap.status, snap.jpeg
+                status_changed = True
+                
+                if frame_bytes:
+                    caption = f"Live Feed - {curr.get('camera', 'Camera-01')}"
+                    try: vid_ph.image(frame_bytes, caption=caption, width="stretch")
+                    except: vid_ph.image(frame_bytes, caption=caption, use_container_width=True)
             
             date_ph.write(f"**{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}**")
             
-            if curr.get("status") == "DANGER":
-                stat_ph.markdown(f'<div class="danger-box">⚠️ VIOLATION: {curr.get("issue")}</div>', unsafe_allow_html=True)
-                log_ph.error(f"{curr.get('issue')}")
-            else:
-                stat_ph.markdown(f'<div class="safe-box">✅ SAFE</div>', unsafe_allow_html=True)
-                log_ph.success("No active violations.")
-                
-            conf_ph.metric("Confidence", f"{curr.get('confidence', 0)}%")
+            if status_changed or first:
+                if curr.get("status") == "DANGER":
+                    stat_ph.markdown(f'<div class="danger-box">⚠️ VIOLATION ({curr.get("camera", "Camera-01")}): {curr.get("issue")}</div>', unsafe_allow_html=True)
+                    log_ph.error(f"[{curr.get('camera', 'Camera-01')}] {curr.get('issue')}")
+                else:
+                    stat_ph.markdown(f'<div class="safe-box">✅ SAFE</div>', unsafe_allow_html=True)
+                    log_ph.success("No active violations.")
+                    
+                conf_ph.metric("Confidence", f"{curr.get('confidence', 0)}%")
+            first = False
+            
+            # Redraw the trend when the camera's series grew, or once a minute so the window slides
+            # (the feed caches the query, so every tab on the same camera shares it)
+            camera_id = curr.get("camera", "Camera-01") if trend_camera == "Live camera" else trend_camera
+            series = feed.trend(camera_id, TREND_WINDOWS[trend_window])
+            if series is not shown_trend:
+                shown_trend = series
+                render_trend(graph_ph, camera_id, trend_window, series)
             
-            if st.session_state['history']:
-                df = pd.DataFrame(st.session_state['history'])
-                fig = px.area(df, x="Time", y="Conf", markers=True, color_discrete_sequence=["#00cc96"])
-                fig.update_layout(plot_bgcolor="#0e1117", paper_bgcolor="rgba(0,0,0,0)", font=dict(color="#00cc96"), height=250, yaxis_range=[0,100])
-                try: graph_ph.plotly_chart(fig, use_container_width=True)
-                except: graph_ph.plotly_chart(fig)
+            # New metrics snapshot, or every 5 s to keep the "updated ... ago" caption honest
+            if snap.metrics is not shown_metrics or time.time() - last_health >= 5:
+                shown_metrics = snap.metrics
+                last_health = time.time()
+                render_health(health_ph, snap.metrics)
             
-            time.sleep(1)
+            # Background report finished: rerun once to show its download button
+            report_key = st.session_state.get('report_key')
+            if report_key and st.session_state.get('report_shown') != report_key and not reports.is_pending(report_key):
+                st.session_state['report_shown'] = report_key
+                st.rerun()
 
 # --- 3. CONTROLLER ---
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+import os
+import json
+import cv2
+import numpy as np
+
+ZONES_FILE = os.getenv("DETECTOR_ZONES", "detector_zones.json")
+
+# Optional cv2.dnn person detector (MobileNet-SSD, Caffe). Without these the HOG detector is used.
+DNN_PROTO = os.getenv("DETECTOR_DNN_PROTO")
+DNN_MODEL = os.getenv("DETECTOR_DNN_MODEL")
+DNN_PERSON_CLASS = 15   # "person" in the 20-class VOC label map MobileNet-SSD ships with
+
+# 1. ZONES
+def load_zones(path=ZONES_FILE):
+    """
+    detector_zones.json: {"default": [[0, 0, 1, 1]], "Camera-01": [[0.1, 0.3, 0.5, 0.7], [0.6, 0.2, 0.3, 0.5]]}
+    Zones are (x, y, w, h), fractions of the frame if all <= 1, else pixels.
+    With crop enabled the upload is the detection box, so leave the camera's
+    encoder roi (camera_settings.json) unset - the zones already do that job.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _to_pixels(rect, width, height):
+    x, y, w, h = rect
+    if max(rect) <= 1:
+        return int(x * width), int(y * height), int(w * width), int(h * height)
+    return int(x), int(y), int(w), int(h)
+
+def _overlaps(box, zone):
+    bx, by, bw, bh = box
+    zx, zy, zw, zh = zone
+    return bx < zx + zw and zx < bx + bw and by < zy + zh and zy < by + bh
+
+def union_box(boxes, width, height, pad=0.15):
+    """Smallest box holding all `boxes`, grown by `pad` (fraction of its size) and clipped to the frame."""
+    x1 = min(b[0] for b in boxes)
+    y1 = min(b[1] for b in boxes)
+    x2 = max(b[0] + b[2] for b in boxes)
+    y2 = max(b[1] + b[3] for b in boxes)
+    dx, dy = int((x2 - x1) * pad), int((y2 - y1) * pad)
+    x1, y1 = max(0, x1 - dx), max(0, y1 - dy)
+    x2, y2 = min(width, x2 + dx), min(height, y2 + dy)
+    return x1, y1, x2 - x1, y2 - y1
+
+# 2. DETECTION RESULT
+class Detection:
+    """escalate: worth a Gemini call. reason: 'person' / 'motion' / 'idle'. boxes in full-frame pixels."""
+    def __init__(self, escalate, reason, boxes=(), box=None):
+        self.escalate = escalate
+        self.reason = reason
+        self.boxes = list(boxes)
+        self.box = box
+
+    def crop(self, frame):
+        if self.box is None:
+            return frame
+        x, y, w, h = self.box
+        return frame[y:y + h, x:x + w]
+
+# 3. CASCADE
+class DetectorCascade:
+    """
+    On-CPU first stage in front of the scene gate and Gemini. One per camera.
+    - Motion: a MOG2 background model, fed every checked frame (cheap, on a small copy),
+      catches machinery moving inside the zones.
+    - People: HOG (or a cv2.dnn SSD model if DETECTOR_DNN_PROTO / _MODEL are set),
+      only run when a sample is due, on a `width`-pixel copy of the frame.
+    Only frames with a person or motion overlapping a zone escalate. With
+    crop=True the upload is cut down to the detections (plus padding).
+    """
+    def __init__(self, zones=None, mode="hog", width=320, min_motion_area=0.01, person_threshold=0.5, crop=False):
+        self.zones = zones
+        self.mode = mode
+        self.width = width
+        self.min_motion_area = min_motion_area
+        self.person_threshold = person_threshold
+        self.crop = crop
+
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(history=300, varThreshold=32, detectShadows=False)
+        self._kernel = np.ones((3, 3), np.uint8)
+        self._hog = None
+        self._net = None
+        if mode == "dnn" and DNN_PROTO and DNN_MODEL:
+            self._net = cv2.dnn.readNetFromCaffe(DNN_PROTO, DNN_MODEL)
+        elif mode in ("hog", "dnn"):
+            if mode == "dnn":
+                print("⚠️ DETECTOR_DNN_PROTO / DETECTOR_DNN_MODEL not set - using the HOG person detector")
+            self._hog = cv2.HOGDescriptor()
+            self._hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+        self.frames = 0
+        self.checks = 0
+        self.escalated = {"person": 0, "motion": 0}
+        self.idle = 0
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.width / w)
+        if scale >= 1.0:
+            return frame, 1.0
+        return cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA), scale
+
+    def _zones(self, width, height):
+        if not self.zones:
+            return [(0, 0, width, height)]
+        return [_to_pixels(z, width, height) for z in self.zones]
+
+    def _motion_boxes(self, small, scale):
+        mask = self._subtractor.apply(small)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = self.min_motion_area * small.shape[0] * small.shape[1]
+        boxes = []
+        for c in contours:
+            if cv2.contourArea(c) >= min_area:
+                x, y, w, h = cv2.boundingRect(c)
+                boxes.append((int(x / scale), int(y / scale), int(w / scale), int(h / scale)))
+        return boxes
+
+    def _person_boxes(self, small, scale):
+        if self._net is not None:
+            h, w = small.shape[:2]
+            blob = cv2.dnn.blobFromImage(cv2.resize(small, (300, 300)), 0.007843, (300, 300), 127.5)
+            self._net.setInput(blob)
+            out = self._net.forward()
+            boxes = []
+            for det in out[0, 0]:
+                if int(det[1]) == DNN_PERSON_CLASS and det[2] >= self.person_threshold:
+                    x1, y1, x2, y2 = det[3] * w, det[4] * h, det[5] * w, det[6] * h
+                    boxes.append((int(x1 / scale), int(y1 / scale), int((x2 - x1) / scale), int((y2 - y1) / scale)))
+            return boxes
+        if self._hog is not None:
+            rects, weights = self._hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+            return [tuple(int(v / scale) for v in r) for r, wt in zip(rects, np.ravel(weights)) if wt >= self.person_threshold]
+        return []
+
+    def check(self, frame, people=True):
+        """
+        Call on every decoded frame. Motion is always updated; the person detector only
+        runs when people=True (i.e. a sample is due). Returns a Detection.
+        """
+        self.frames += 1
+        height, width = frame.shape[:2]
+        small, scale = self._small(frame)
+        motion = self._motion_boxes(small, scale)
+        if not people:
+            return None
+
+        self.checks += 1
+        zones = self._zones(width, height)
+        in_zone = lambda boxes: [b for b in boxes if any(_overlaps(b, z) for z in zones)]
+
+        persons = in_zone(self._person_boxes(small, scale))
+        moving = in_zone(motion)
+        if persons:
+            reason, boxes = "person", persons + moving
+        elif moving:
+            reason, boxes = "motion", moving
+        else:
+            self.idle += 1
+            return Detection(False, "idle")
+
+        self.escalated[reason] += 1
+        box = union_box(boxes, width, height) if self.crop else None
+        return Detection(True, reason, boxes, box)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "checks": self.checks,
+            "escalated": dict(self.escalated),
+            "idle": self.idle,
+        }
+
+def make_detector(mode, camera_id="Camera-01", crop=False, zones=None):
+    """mode: None/'off', 'motion', 'hog' or 'dnn'. Zones come from detector_zones.json unless given."""
+    if not mode or mode == "off":
+        return None
+    if zones is None:
+        all_zones = load_zones()
+        zones = all_zones.get(camera_id, all_zones.get("default"))
+    return DetectorCascade(zones=zones, mode=mode, crop=crop)
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import argparse
+import cv2
+from dotenv import load_dotenv
+from frame_encoder import EncodeSettings, FrameEncoder
+from verdict import PROMPT, VerdictParseError, generation_config, parse_verdict
+
+# PAYLOAD SIZE vs. VERDICT STABILITY
+# Encodes sample frames at several resolutions / JPEG qualities and reports the
+# payload size and encode time of each. With --analyze every variant is also sent
+# to the model (or the local fake with --fake) and we count how often its verdict
+# matches the verdict for the highest-quality variant.
+
+WIDTHS = [1280, 960, 640, 480, 320]
+QUALITIES = [95, 80, 60, 40]
+
+def sample_frames(video_path, count):
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    frames = []
+    for i in range(count):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(i * total / count))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+def ask(client, model, jpeg_bytes):
+    from google.genai import types
+    response = client.models.generate_content(
+        model=model,
+        contents=[types.Content(role="user", parts=[
+            types.Part.from_bytes(data=jpeg_bytes, mime_type="image/jpeg"),
+            types.Part.from_text(text=PROMPT),
+        ])],
+        config=generation_config(),
+    )
+    try:
+        return parse_verdict(response.text).status
+    except VerdictParseError:
+        return None
+
+def run(video_path, count, analyze=False, fake=False, model="gemini-3-flash-preview"):
+    frames = sample_frames(video_path, count)
+    if not frames:
+        raise SystemExit(f"❌ Could not read frames from {video_path}")
+    print(f"🎞️ {len(frames)} frames from {video_path} ({frames[0].shape[1]}x{frames[0].shape[0]})")
+
+    client = None
+    if analyze:
+        if fake:
+            from fake_gemini import FakeClient
+            client = FakeClient(latency=0.0, seed=0)
+        else:
+            from google import genai
+            load_dotenv(override=True)
+            client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+    variants = [(w, q) for w in WIDTHS for q in QUALITIES]
+    results = []
+    baseline = None
+    for width, quality in variants:
+        encoder = FrameEncoder(settings={}, default=EncodeSettings(max_width=width, max_height=width * 3 // 4, quality=quality))
+        sizes, encode_ms, statuses = [], [], []
+        for frame in frames:
+            started = time.perf_counter()
+            _, jpeg = encoder.prepare(frame)
+            encode_ms.append((time.perf_counter() - started) * 1000)
+            sizes.append(len(jpeg))
+            if client is not None:
+                statuses.append(ask(client, model, jpeg))
+
+        row = {
+            "width": width,
+            "quality": quality,
+            "avg_kb": round(sum(sizes) / len(sizes) / 1024, 1),
+            "encode_ms": round(sum(encode_ms) / len(encode_ms), 2),
+        }
+        if client is not None:
+            if baseline is None:
+                baseline = statuses
+            agree = sum(1 for a, b in zip(statuses, baseline) if a == b)
+            row["agreement"] = round(agree / len(baseline), 3)
+        results.append(row)
+        print(f"   {width:>5}px q{quality:<3} {row['avg_kb']:>7} KB  {row['encode_ms']:>6} ms" + (f"  agree {row['agreement']:.0%}" if "agreement" in row else ""))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Payload size vs. verdict stability for frame encode settings.")
+    parser.add_argument("video", nargs="?", default="factory_sample.mp4")
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--analyze", action="store_true", help="also ask the model about every variant")
+    parser.add_argument("--fake", action="store_true", help="use the local Gemini stand-in")
+    parser.add_argument("--model", default="gemini-3-flash-preview")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.video, args.frames, analyze=args.analyze, fake=args.fake, model=args.model)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Saved {args.json}")
@@ -0,0 +1,49 @@
+import json
+import time
+import random
+import threading
+from alerts import Channel, KINDS
+
+# LOCAL ALERT SINK
+# Stands in for SMS / webhook providers so the dispatcher (retries, rate limits,
+# digests) can be exercised offline: ALERT_CHANNELS=log,fake
+
+class FakeSinkError(Exception):
+    pass
+
+class FakeSink(Channel):
+    """
+    Records every delivered message in `messages` (and appends it to `path` as a
+    JSON line, if given, for inspection from another process).
+    latency: seconds per send, or (min, max); fail_rate: chance a send raises;
+    per_minute: rate limit, like a real provider's.
+    """
+    name = "fake"
+    kinds = KINDS
+
+    def __init__(self, path=None, latency=0.0, fail_rate=0.0, per_minute=0, seed=None):
+        super().__init__(per_minute)
+        self.path = path
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.messages = []
+        self.attempts = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, message, alerts):
+        with self._lock:
+            self.attempts += 1
+            delay = self._random.uniform(*self.latency) if isinstance(self.latency, (tuple, list)) else self.latency
+            fail = self._random.random() < self.fail_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeSinkError("503 fake provider unavailable")
+
+        record = {"sent": time.strftime("%Y-%m-%d %H:%M:%S"), "text": message, "alerts": [a.to_dict() for a in alerts]}
+        with self._lock:
+            self.messages.append(record)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
@@ -0,0 +1,234 @@
+import json
+import time
+import random
+import threading
+from datetime import datetime, timezone
+
+# LOCAL GEMINI STAND-IN
+# Mimics the bits of genai.Client the sentinels use (models.generate_content,
+# models.list, caches.*) so rate limiting, routing, context caching and the pipeline can be exercised
+# offline, without an API key or quota.
+
+DEFAULT_VERDICTS = [
+    {"status": "SAFE", "issue": "All workers wearing PPE", "confidence": 92},
+    {"status": "SAFE", "issue": "Walkway clear", "confidence": 88},
+    {"status": "DANGER", "issue": "Worker without helmet near press", "confidence": 81},
+]
+
+class FakeAPIError(Exception):
+    def __init__(self, code, message, retry_after=None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.retry_after = retry_after
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = f"models/{name}"
+        self.supported_generation_methods = ["generateContent"]
+
+def count_images(contents):
+    """Number of inline image parts in a generate_content `contents` argument."""
+    if isinstance(contents, str):
+        return 0
+    count = 0
+    for content in contents if isinstance(contents, (list, tuple)) else [contents]:
+        for part in getattr(content, "parts", None) or []:
+            if getattr(part, "inline_data", None) is not None:
+                count += 1
+    return count
+
+def _option(config, name):
+    """Reads a field from a GenerateContentConfig-like object or a plain dict."""
+    if isinstance(config, dict):
+        return config.get(name)
+    return getattr(config, name, None)
+
+def _ttl_seconds(ttl, default=3600.0):
+    try:
+        return float(str(ttl).rstrip("s"))
+    except (TypeError, ValueError):
+        return default
+
+class FakeCachedContent:
+    def __init__(self, name, model, display_name, expires, tokens):
+        self.name = name
+        self.model = model
+        self.display_name = display_name
+        self.tokens = tokens
+        self.set_expiry(expires)
+
+    def set_expiry(self, expires):
+        self.expires = expires
+        self.expire_time = datetime.fromtimestamp(expires, timezone.utc)
+
+class FakeCaches:
+    """
+    In-memory context caches (client.caches.create / update / get / delete / list).
+    min_tokens: reject contexts smaller than this, like the real minimum cacheable size
+    (text ~4 chars per token, 258 tokens per image).
+    """
+    def __init__(self, min_tokens=0, clock=time.time):
+        self.min_tokens = min_tokens
+        self.clock = clock
+        self._caches = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+
+    def _tokens(self, config):
+        text = len(str(_option(config, "system_instruction") or "")) // 4
+        contents = _option(config, "contents") or []
+        for content in contents:
+            for part in getattr(content, "parts", None) or []:
+                text += len(getattr(part, "text", None) or "") // 4
+        return text + 258 * count_images(contents)
+
+    def create(self, model=None, config=None):
+        tokens = self._tokens(config)
+        if tokens < self.min_tokens:
+            raise FakeAPIError(400, f"Cached content is too small. total_token_count={tokens}, min_total_token_count={self.min_tokens}")
+        with self._lock:
+            self._next += 1
+            name = f"cachedContents/fake-{self._next}"
+            cache = FakeCachedContent(name, model, _option(config, "display_name"), self.clock() + _ttl_seconds(_option(config, "ttl")), tokens)
+            self._caches[name] = cache
+            self.created += 1
+        return cache
+
+    def get(self, name=None):
+        with self._lock:
+            cache = self._caches.get(name)
+            if cache is None or cache.expires <= self.clock():
+                self._caches.pop(name, None)
+                raise FakeAPIError(404, f"CachedContent not found (or permission denied): {name}")
+            return cache
+
+    def update(self, name=None, config=None):
+        cache = self.get(name)
+        with self._lock:
+            cache.set_expiry(self.clock() + _ttl_seconds(_option(config, "ttl")))
+            self.updated += 1
+        return cache
+
+    def delete(self, name=None):
+        with self._lock:
+            if self._caches.pop(name, None) is not None:
+                self.deleted += 1
+
+    def list(self):
+        with self._lock:
+            return list(self._caches.values())
+
+    def alive(self, name):
+        try:
+            self.get(name)
+            return True
+        except FakeAPIError:
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {"live": len(self._caches), "created": self.created, "updated": self.updated, "deleted": self.deleted}
+
+class FakeModels:
+    """
+    latency: seconds per call, or (min, max) for a uniform range.
+    error_rate: chance of a 503; rate_limit_rate: chance of a 429 (with a retry hint).
+    verdicts: cycled through; multi-image requests get a JSON array.
+    failing_models: model names that always fail (for router tests).
+    """
+    def __init__(self, latency=0.0, error_rate=0.0, rate_limit_rate=0.0, verdicts=None,
+                 models=("gemini-2.0-flash", "gemini-1.5-flash-001"), failing_models=(), seed=None, fenced=False):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.verdicts = list(verdicts or DEFAULT_VERDICTS)
+        self.model_names = list(models)
+        self.failing_models = set(failing_models)
+        self.fenced = fenced
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next = 0
+        self.caches = None   # FakeCaches, set by FakeClient
+
+        self.calls = 0
+        self.errors = 0
+        self.images = 0
+        self.cached_calls = 0
+        self.calls_by_model = {}
+
+    def _sleep(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            with self._lock:
+                latency = self._random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def _verdict(self):
+        with self._lock:
+            verdict = self.verdicts[self._next % len(self.verdicts)]
+            self._next += 1
+        return dict(verdict)
+
+    def generate_content(self, model=None, contents=None, config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+            roll = self._random.random()
+        self._sleep()
+
+        if model in self.failing_models:
+            with self._lock:
+                self.errors += 1
+            raise FakeAPIError(404, f"models/{model} is not found")
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.errors += 1
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED. Please retry in 1.5s.", retry_after=1.5)
+        if roll < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.errors += 1
+            raise FakeAPIError(503, "UNAVAILABLE")
+
+        cached = _option(config, "cached_content")
+        if cached:
+            if self.caches is None or not self.caches.alive(cached):
+                with self._lock:
+                    self.errors += 1
+                raise FakeAPIError(404, f"CachedContent not found (or permission denied): {cached}")
+            with self._lock:
+                self.cached_calls += 1
+
+        images = count_images(contents)
+        with self._lock:
+            self.images += images
+        if images > 1:
+            text = json.dumps([dict(self._verdict(), frame=i + 1) for i in range(images)])
+        else:
+            text = json.dumps(self._verdict())
+        if self.fenced:
+            text = f"```json\n{text}\n```"
+        return FakeResponse(text)
+
+    def list(self):
+        return [FakeModel(name) for name in self.model_names]
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors, "images": self.images, "cached_calls": self.cached_calls,
+                    "calls_by_model": dict(self.calls_by_model)}
+
+class FakeClient:
+    """Stands in for genai.Client(api_key=...). min_cache_tokens: see FakeCaches."""
+    def __init__(self, api_key=None, min_cache_tokens=0, **options):
+        self.models = FakeModels(**options)
+        self.caches = FakeCaches(min_tokens=min_cache_tokens)
+        self.models.caches = self.caches
@@ -1,12 +1,18 @@
-import cv2
-import time
-import json
 import os
-import pyttsx3
-import threading
+import argparse
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from pipeline import run_stream
+from rate_limiter import RateLimitedClient
+from speech import speak_warning
+from frame_channel import FramePublisher, WRITE_FILES
+from frame_encoder import FrameEncoder
+from timeseries import TimeSeriesStore
+from model_discovery import discover, cache_key
+from incidents import IncidentTracker
+from metrics import span, start_exporter
+from verdict import PROMPT, VerdictParseError, generation_config, parse_verdict
 
 # 1. SETUP
 load_dotenv(override=True)
@@ -17,120 +23,122 @@ if not api_key:
     exit()
 
 print(f"🔑 Using Key: ...{api_key[-4:]}")
-client = genai.Client(api_key=api_key)
-
-# 2. AUDIO SETUP
-engine = pyttsx3.init()
-engine.setProperty('rate', 150)
-
-def speak_warning(text):
-    def run_speech():
-        try:
-            local_engine = pyttsx3.init()
-            local_engine.say(f"Alert! {text}")
-            local_engine.runAndWait()
-        except:
-            pass
-    t = threading.Thread(target=run_speech)
-    t.start()
-
-# 3. AUTO-DISCOVER WORKING MODEL (Fixed for New SDK)
-print("\n🔍 Scanning for available models...")
-valid_model = None
-
-try:
+# Every Gemini call goes through one token bucket (GEMINI_RPM) with 429 backoff
+client = RateLimitedClient(genai.Client(api_key=api_key), rpm=float(os.getenv("GEMINI_RPM", "15")))
+publisher = FramePublisher(write_files=WRITE_FILES)
+encoder = FrameEncoder()
+timeseries = TimeSeriesStore()
+
+# 2. AUTO-DISCOVER WORKING MODEL (Fixed for New SDK)
+FALLBACK_MODEL = "gemini-1.5-flash-001"
+
+def scan_models():
+    """Lists the models this key can use and picks one. Raises if listing fails."""
+    print("\n🔍 Scanning for available models...")
+    chosen = None
+    preferred_found = False
+    capabilities = {}
+
     # --- FIX: Use client.models.list() for the new SDK ---
     for m in client.models.list():
+        methods = list(getattr(m, "supported_generation_methods", None) or getattr(m, "supported_actions", None) or [])
+        capabilities[m.name.replace("models/", "")] = methods
+        # Keep listing (to cache capabilities) but stop choosing once we have the best
+        if preferred_found:
+            continue
         # We prefer 2.0 Flash if available (fastest)
         if "gemini-2.0-flash" in m.name and "lite" not in m.name:
-             valid_model = m.name
-             break
+             chosen = m.name
+             preferred_found = True
+             continue
         # Fallback to 1.5 Flash (most reliable)
         if "gemini-1.5-flash" in m.name and "001" in m.name:
-            valid_model = m.name
+            chosen = m.name
         
         # Capture any valid generation model as a last resort
-        if "generateContent" in m.supported_generation_methods and not valid_model:
-            valid_model = m.name
-
-except Exception as e:
-    print(f"❌ Error listing models: {e}")
-    # Hardcoded fallback if listing fails completely
-    valid_model = "gemini-1.5-flash-001"
-
-if not valid_model:
-    print("❌ No models found! Trying hardcoded fallback.")
-    valid_model = "gemini-1.5-flash-001"
-else:
+        if "generateContent" in methods and not chosen:
+            chosen = m.name
+
+    if not chosen:
+        print("❌ No models found! Trying hardcoded fallback.")
+        chosen = FALLBACK_MODEL
+
     # Clean up the name for the API call
-    valid_model = valid_model.replace("models/", "")
+    return {"selected": chosen.replace("models/", ""), "capabilities": capabilities}
+
+def on_models_revalidated(value):
+    global valid_model
+    print(f"🔁 Model list changed, switching to: {value['selected']}")
+    valid_model = value["selected"]
+
+# Cached on disk: restarts skip the list call entirely
+discovery = discover(
+    cache_key("final_run", api_key), scan_models,
+    fallback={"selected": FALLBACK_MODEL, "capabilities": {}},
+    on_update=on_models_revalidated,
+)
+valid_model = discovery["selected"]
 
 print(f"✅ SELECTED MODEL: {valid_model}")
 print("------------------------------------------------")
 
-# 4. MAIN LOOP
+# 3. MAIN LOOP
+# Speak once when a violation starts (or clearly gets worse), not on every DANGER frame
+def on_incident(incident):
+    print(f"🔊 WARNING: {incident.issue}")
+    speak_warning(f"Violation. {incident.issue}")
+
+incidents = IncidentTracker(on_open=on_incident, on_escalate=on_incident)
+
 def analyze_frame(frame):
-    frame_resized = cv2.resize(frame, (640, 480))
-    _, buffer = cv2.imencode('.jpg', frame_resized)
-    image_bytes = buffer.tobytes()
+    # Aspect-preserving resize + one JPEG encode, reused for upload and dashboard
+    frame_resized, image_bytes = encoder.prepare(frame)
     
-    prompt = "You are a Factory Safety Officer. Analyze this image. Return ONLY JSON: {'status': 'SAFE'/'DANGER', 'issue': 'short description', 'confidence': 0-100}"
-
     try:
-        response = client.models.generate_content(
-            model=valid_model, 
-            contents=[
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
-                        types.Part.from_text(text=prompt)
-                    ]
-                )
-            ]
-        )
+        with span("gemini_call"):
+            response = client.models.generate_content(
+                model=valid_model, 
+                contents=[
+                    types.Content(
+                        role="user",
+                        parts=[
+                            types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
+                            types.Part.from_text(text=PROMPT)
+                        ]
+                    )
+                ],
+                # JSON mode + verdict schema: no fences, no pseudo-JSON, a few dozen output tokens
+                config=generation_config(max_tokens=os.getenv("VERDICT_MAX_TOKENS")),
+            )
         
-        text_data = response.text.replace("```json", "").replace("```", "").strip()
-        print(f"🤖 AI: {text_data}")
+        # Parse FIRST: a garbled answer must not overwrite the dashboard status
+        with span("parse"):
+            verdict = parse_verdict(response.text)
+        print(f"🤖 AI: {verdict.to_json()}")
 
-        try:
-            data = json.loads(text_data)
-            if data.get("status") == "DANGER":
-                print(f"🔊 WARNING: {data.get('issue')}")
-                speak_warning(f"Violation. {data.get('issue')}")
-        except:
-            pass
+        # Atomic hand-off to the dashboard (reuses the JPEG we just uploaded)
+        publisher.publish(verdict.to_json(), image_bytes)
+        timeseries.record("Camera-01", verdict.confidence, verdict.status)
 
-        with open("status.json", "w") as f:
-            f.write(text_data)
-        cv2.imwrite("current_frame.jpg", frame_resized)
+        incidents.observe("Camera-01", verdict.status, verdict.issue, verdict.confidence)
 
+    except VerdictParseError as e:
+        print(f"⚠️ Unusable answer, status left unchanged: {e}")
     except Exception as e:
         print(f"❌ API Error: {e}")
 
-def start_stream(video_source):
-    cap = cv2.VideoCapture(video_source)
-    print("🎥 Starting Video Feed...")
-    last_analysis_time = 0
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            continue
-
-        cv2.imshow('Factory Sentinel - Live', frame)
-
-        if time.time() - last_analysis_time >= 15.0:
-            print("📸 Scanning...")
-            analyze_frame(frame)
-            last_analysis_time = time.time()
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+def start_stream(video_source, headless=False):
+    # Analysis runs on a background worker; the video loop never waits on Gemini
+    # headless=True (or no display) runs without the preview window, e.g. on a server
+    return run_stream(video_source, analyze_frame, interval=15.0, window_title='Factory Sentinel - Live', headless=headless)
 
 if __name__ == "__main__":
-    start_stream("factory_sample.mp4")
+    parser = argparse.ArgumentParser(description="Watch one camera with the Gemini sentinel.")
+    # Use 0 for webcam, or filename / RTSP URL for video
+    parser.add_argument("source", nargs="?", default="factory_sample.mp4")
+    parser.add_argument("--headless", action="store_true", help="no preview window")
+    args = parser.parse_args()
+
+    # Per-stage timings: http://127.0.0.1:METRICS_PORT/metrics and METRICS_FILE (dashboard)
+    start_exporter()
+    start_stream(int(args.source) if args.source.isdigit() else args.source, headless=args.headless)
@@ -0,0 +1,125 @@
+import cv2
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 1. PERCEPTUAL HASH
+def dhash(frame, hash_size=8):
+    """64-bit difference hash: survives JPEG noise, small lighting changes and rescaling."""
+    small = cv2.resize(frame, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    bits = small[:, 1:] > small[:, :-1]
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+# 2. VERDICT CACHE
+class VerdictCache:
+    """
+    LRU + TTL cache of Gemini verdicts keyed by (model, prompt, perceptual hash).
+    A lookup hits when a stored frame for the same model/prompt is within
+    `max_distance` bits of the new one, so looping videos and static scenes
+    stop costing API calls. Set `path` to keep the cache across restarts.
+    """
+    def __init__(self, max_entries=256, ttl=300.0, max_distance=6, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.path = path
+        self._entries = OrderedDict()   # (context, phash) -> {"verdict", "created"}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if path:
+            self.load()
+
+    @staticmethod
+    def context_key(prompt, model):
+        return hashlib.sha1(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+    def _expire(self, now):
+        for key in [k for k, e in self._entries.items() if now - e["created"] > self.ttl]:
+            del self._entries[key]
+            self.expirations += 1
+
+    def get(self, frame, prompt, model, phash=None):
+        """Returns (verdict or None, phash). Pass the phash back into put() to avoid rehashing."""
+        phash = dhash(frame) if phash is None else phash
+        context = self.context_key(prompt, model)
+        with self._lock:
+            self._expire(time.time())
+            best_key, best_dist = None, None
+            for key in self._entries:
+                if key[0] != context:
+                    continue
+                dist = hamming(key[1], phash)
+                if dist <= self.max_distance and (best_dist is None or dist < best_dist):
+                    best_key, best_dist = key, dist
+            if best_key is None:
+                self.misses += 1
+                return None, phash
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return dict(self._entries[best_key]["verdict"]), phash
+
+    def put(self, frame, prompt, model, verdict, phash=None):
+        phash = dhash(frame) if phash is None else phash
+        key = (self.context_key(prompt, model), phash)
+        with self._lock:
+            self._entries[key] = {"verdict": dict(verdict), "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if self.path:
+            self.save()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    # 3. PERSISTENCE
+    def save(self):
+        with self._lock:
+            rows = [{"context": k[0], "phash": k[1], **e} for k, e in self._entries.items()]
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(rows, f)
+            os.replace(tmp, self.path)   # atomic: a crash never leaves half a cache
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️ Ignoring unreadable cache file: {self.path}")
+            return
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                if now - row["created"] <= self.ttl:
+                    self._entries[(row["context"], row["phash"])] = {"verdict": row["verdict"], "created": row["created"]}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,182 @@
+import os
+import json
+import mmap
+import struct
+import threading
+
+CHANNEL_FILE = os.getenv("SENTINEL_CHANNEL", "sentinel_channel.bin")
+# SENTINEL_WRITE_FILES=1 keeps status.json / current_frame.jpg up to date for readers without the channel
+WRITE_FILES = os.getenv("SENTINEL_WRITE_FILES", "0") == "1"
+STATUS_FILE = "status.json"
+FRAME_FILE = "current_frame.jpg"
+
+# Layout: [header][slot 0][slot 1]
+#   header: magic(4s) version(I) seq(Q) slot_size(I)          -> 24 bytes, padded to 64
+#   slot:   seq(Q) status_len(I) jpeg_len(I) status... jpeg... -> 16 byte slot header
+MAGIC = b"SNTL"
+VERSION = 1
+HEADER = struct.Struct("<4sIQI")
+SLOT_HEADER = struct.Struct("<QII")
+HEADER_SIZE = 64
+DEFAULT_SLOT_SIZE = 2 * 1024 * 1024
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+# 1. SENTINEL SIDE
+class FramePublisher:
+    """
+    Publishes the latest verdict + JPEG for the dashboard.
+    Two slots in an mmap'd file, guarded like a seqlock: each publish marks the
+    slot the readers are NOT looking at as invalid (slot seq 0), fills it, stamps
+    the new seq on the slot and only then bumps the header sequence number.
+    A reader that copied a slot re-checks its seq, so a lapped read is discarded.
+    With write_files=True (SENTINEL_WRITE_FILES=1) status.json / current_frame.jpg
+    are also written (atomically, via rename) for older readers.
+    """
+    def __init__(self, path=CHANNEL_FILE, slot_size=DEFAULT_SLOT_SIZE, write_files=WRITE_FILES):
+        self.path = path
+        self.slot_size = slot_size
+        self.write_files = write_files
+        self._lock = threading.Lock()
+
+        size = HEADER_SIZE + 2 * slot_size
+        with open(path, "a+b") as f:
+            f.truncate(size)
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+        magic, version, seq, existing_slot = HEADER.unpack_from(self._mm, 0)
+        if magic == MAGIC and version == VERSION and existing_slot == slot_size:
+            self.seq = seq   # keep counting so open dashboards see the next frame as new
+        else:
+            self.seq = 0
+            HEADER.pack_into(self._mm, 0, MAGIC, VERSION, 0, slot_size)
+
+    def publish(self, status, jpeg_bytes):
+        """`status` is a dict or JSON text. Returns the new sequence number."""
+        status_bytes = status.encode("utf-8") if isinstance(status, str) else json.dumps(status).encode("utf-8")
+        with self._lock:
+            seq = self.seq + 1
+            slot_jpeg = jpeg_bytes
+            if SLOT_HEADER.size + len(status_bytes) + len(jpeg_bytes) > self.slot_size:
+                # Too big for the slot: publish the verdict, readers pick the image up from the file
+                print(f"⚠️ Frame too large for channel slot ({len(jpeg_bytes)} bytes), using {FRAME_FILE}")
+                slot_jpeg = b""
+
+            # Files first, so a reader following the new seq to the file never gets the old image
+            if self.write_files or not slot_jpeg:
+                _write_atomic(STATUS_FILE, status_bytes)
+                _write_atomic(FRAME_FILE, jpeg_bytes)
+
+            if SLOT_HEADER.size + len(status_bytes) + len(slot_jpeg) <= self.slot_size:
+                offset = HEADER_SIZE + (seq % 2) * self.slot_size
+                body = offset + SLOT_HEADER.size
+                # Invalidate first: a reader still copying the old frame from this slot sees seq 0 afterwards
+                SLOT_HEADER.pack_into(self._mm, offset, 0, len(status_bytes), len(slot_jpeg))
+                self._mm[body:body + len(status_bytes)] = status_bytes
+                self._mm[body + len(status_bytes):body + len(status_bytes) + len(slot_jpeg)] = slot_jpeg
+                struct.pack_into("<Q", self._mm, offset, seq)
+                # The swap: readers switch to the new slot when they see the new seq
+                HEADER.pack_into(self._mm, 0, MAGIC, VERSION, seq, self.slot_size)
+            else:
+                print(f"⚠️ Verdict too large for channel slot ({len(status_bytes)} bytes), file fallback only")
+            self.seq = seq
+        return seq
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+# 2. DASHBOARD SIDE
+def parse_status(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return {}
+
+class FrameSubscriber:
+    """
+    Reads the latest publication. read(last_seq) returns None when nothing new was
+    published, else (seq, status_dict, jpeg_bytes). Falls back to the status.json /
+    current_frame.jpg files when no channel file exists.
+    """
+    def __init__(self, path=CHANNEL_FILE):
+        self.path = path
+        self._mm = None
+        self._file = None
+
+    def _open(self):
+        if self._mm is not None:
+            return True
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < HEADER_SIZE:
+            return False
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return True
+
+    def read_view(self, last_seq=None, retries=5):
+        """
+        Zero-copy read: (seq, status_memoryview, jpeg_memoryview).
+        The views are only valid until the writer laps this slot; confirm with is_current(seq).
+        """
+        if not self._open():
+            return None
+        for _ in range(retries):
+            magic, version, seq, slot_size = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != VERSION or seq == 0:
+                return None
+            if seq == last_seq:
+                return None
+            offset = HEADER_SIZE + (seq % 2) * slot_size
+            slot_seq, status_len, jpeg_len = SLOT_HEADER.unpack_from(self._mm, offset)
+            if slot_seq != seq:
+                continue   # writer is mid-swap: retry
+            body = offset + SLOT_HEADER.size
+            view = memoryview(self._mm)
+            return seq, view[body:body + status_len], view[body + status_len:body + status_len + jpeg_len]
+        return None
+
+    def is_open(self):
+        """True once the channel file is mapped (False: readers are on the file fallback)."""
+        return self._open()
+
+    def is_current(self, seq):
+        """True while the slot for `seq` hasn't been invalidated or overwritten. Check AFTER copying out of a view."""
+        offset = HEADER_SIZE + (seq % 2) * HEADER.unpack_from(self._mm, 0)[3]
+        return SLOT_HEADER.unpack_from(self._mm, offset)[0] == seq
+
+    def read(self, last_seq=None):
+        result = self.read_view(last_seq)
+        if result is not None:
+            seq, status_view, jpeg_view = result
+            status_text, jpeg_bytes = str(status_view, "utf-8", "replace"), bytes(jpeg_view)
+            status_view.release()
+            jpeg_view.release()
+            if self.is_current(seq):
+                return seq, parse_status(status_text), jpeg_bytes or self.read_frame_file()
+        if self._mm is None:
+            return self._read_files(last_seq)
+        return None
+
+    def _read_files(self, last_seq):
+        # Compatibility path: sequence = status file mtime
+        try:
+            seq = os.stat(STATUS_FILE).st_mtime_ns
+            if seq == last_seq:
+                return None
+            with open(STATUS_FILE, "r") as f:
+                status = json.load(f)
+            return seq, status, self.read_frame_file()
+        except (OSError, ValueError):
+            return None
+
+    def read_frame_file(self):
+        try:
+            with open(FRAME_FILE, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
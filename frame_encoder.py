@@ -0,0 +1,116 @@
+import os
+import json
+import threading
+import cv2
+from metrics import span
+
+SETTINGS_FILE = os.getenv("CAMERA_SETTINGS", "camera_settings.json")
+
+# 1. PER-CAMERA SETTINGS
+class EncodeSettings:
+    """
+    How a camera's frames are prepared for upload.
+    max_width / max_height: bounding box, aspect ratio is kept and frames are never upscaled.
+    quality: JPEG quality (OpenCV default is 95).
+    roi: optional work-zone crop (x, y, w, h) - fractions of the frame if all <= 1, else pixels.
+    target_bytes: optional payload budget; quality steps down (to min_quality) while frames
+                  exceed it and creeps back up when there's room.
+    """
+    def __init__(self, max_width=640, max_height=480, quality=80, roi=None, target_bytes=None, min_quality=40):
+        self.max_width = max_width
+        self.max_height = max_height
+        self.quality = quality
+        self.roi = tuple(roi) if roi else None
+        self.target_bytes = target_bytes
+        self.min_quality = min_quality
+
+    @classmethod
+    def from_dict(cls, data):
+        allowed = ("max_width", "max_height", "quality", "roi", "target_bytes", "min_quality")
+        return cls(**{k: v for k, v in data.items() if k in allowed})
+
+def load_camera_settings(path=SETTINGS_FILE):
+    """
+    camera_settings.json: {"default": {...}, "Camera-01": {"quality": 70, "roi": [0.2, 0.1, 0.6, 0.8]}}
+    Camera entries override the default entry.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        raw = json.load(f)
+    default = raw.get("default", {})
+    return {cam: EncodeSettings.from_dict({**default, **cfg}) for cam, cfg in raw.items()}
+
+# 2. FRAME PREP
+def crop_roi(frame, roi):
+    if not roi:
+        return frame
+    h, w = frame.shape[:2]
+    x, y, rw, rh = roi
+    if max(roi) <= 1:
+        x, y, rw, rh = int(x * w), int(y * h), int(rw * w), int(rh * h)
+    x, y = max(0, int(x)), max(0, int(y))
+    rw, rh = min(w - x, int(rw)), min(h - y, int(rh))
+    if rw <= 0 or rh <= 0:
+        return frame
+    return frame[y:y + rh, x:x + rw]
+
+def fit_within(frame, max_width, max_height):
+    """Downscale to fit the box, keeping the aspect ratio (the old fixed 640x480 squashed 16:9 video)."""
+    h, w = frame.shape[:2]
+    scale = min(max_width / w, max_height / h, 1.0)
+    if scale >= 1.0:
+        return frame
+    return cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+def encode_jpeg(frame, quality):
+    ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
+
+class FrameEncoder:
+    """
+    The ONE place a frame is cropped, resized and JPEG-encoded. The returned bytes are
+    used for the Gemini upload AND the dashboard, so each analyzed frame is encoded once.
+    """
+    def __init__(self, settings=None, default=None):
+        self.settings = settings if settings is not None else load_camera_settings()
+        self.default = default or self.settings.get("default") or EncodeSettings()
+        self._quality = {}
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.bytes_out = 0
+
+    def settings_for(self, camera_id):
+        return self.settings.get(camera_id, self.default)
+
+    def prepare(self, frame, camera_id="Camera-01"):
+        """Returns (prepared_frame, jpeg_bytes)."""
+        cfg = self.settings_for(camera_id)
+        with span("resize"):
+            prepared = fit_within(crop_roi(frame, cfg.roi), cfg.max_width, cfg.max_height)
+        with self._lock:
+            quality = self._quality.get(camera_id, cfg.quality)
+        with span("imencode"):
+            jpeg = encode_jpeg(prepared, quality)
+
+        if cfg.target_bytes:
+            # Adapt for the NEXT frame instead of re-encoding this one
+            if len(jpeg) > cfg.target_bytes:
+                quality = max(cfg.min_quality, quality - 10)
+            elif len(jpeg) < 0.6 * cfg.target_bytes:
+                quality = min(cfg.quality, quality + 5)
+        with self._lock:
+            self._quality[camera_id] = quality
+            self.frames += 1
+            self.bytes_out += len(jpeg)
+        return prepared, jpeg
+
+    def stats(self):
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "avg_bytes": int(self.bytes_out / self.frames) if self.frames else 0,
+                "quality": dict(self._quality),
+            }
@@ -1,160 +1,275 @@
-import cv2
-import time
 import json
 import os
-import pyttsx3
-import threading
+import argparse
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
-from twilio.rest import Client
+from pipeline import run_stream
+from rate_limiter import RateLimitedClient, PRIORITY_URGENT, PRIORITY_ROUTINE
+from speech import speak_warning
+from alerts import get_alert_dispatcher, send_alert
+from frame_channel import FramePublisher, WRITE_FILES
+from frame_cache import VerdictCache
+from frame_encoder import FrameEncoder
+from incident_store import IncidentStore
+from incidents import IncidentTracker
+from timeseries import TimeSeriesStore
+from metrics import metrics, span, start_exporter
+from detector import make_detector
+from verdict import Verdict, VerdictParseError, PROMPT, BATCH_PROMPT, FRAME_PROMPT, BATCH_FRAME_PROMPT, generation_config, parse_verdict, parse_verdicts
+from context_cache import ContextCache, is_cache_error
 
 # 1. SETUP
 load_dotenv(override=True)
 api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
+# Every Gemini call goes through one token bucket (GEMINI_RPM) with 429 backoff
+client = RateLimitedClient(genai.Client(api_key=api_key), rpm=float(os.getenv("GEMINI_RPM", "15")))
 MODEL_NAME = "gemini-3-flash-preview" # Or gemini-3-flash-preview
 
-# Twilio (Optional)
-twilio_sid = os.getenv("TWILIO_ACCOUNT_SID")
-twilio_auth = os.getenv("TWILIO_AUTH_TOKEN")
-twilio_from = os.getenv("TWILIO_PHONE_NUMBER")
-twilio_to = os.getenv("MY_PHONE_NUMBER")
-sms_client = Client(twilio_sid, twilio_auth) if twilio_sid else None
+# Latest verdict + frame for the dashboard
+publisher = FramePublisher(write_files=WRITE_FILES)
+# Every verdict's confidence, per camera, with 1-min / 1-hour rollups (dashboard trend)
+timeseries = TimeSeriesStore()
 
-# 2. ROBUST AUDIO SYSTEM
-def speak_warning(text):
+# Per-camera resolution / JPEG quality / work-zone crop (camera_settings.json)
+encoder = FrameEncoder()
+
+# Verdict cache (set VERDICT_CACHE_FILE to keep it across restarts)
+verdict_cache = VerdictCache(path=os.getenv("VERDICT_CACHE_FILE"))
+
+# Site rules / reference images per camera (site_context.json), registered once with
+# Gemini's context cache and referenced by name on each request
+context = ContextCache(client, MODEL_NAME)
+
+# 2. INCIDENT LOGGING SYSTEM
+# Append-only SQLite store; imports the old incident_log.json on first run
+incident_store = IncidentStore()
+
+# 3. MAIN ANALYSIS LOOP
+# Last verdict per camera: cameras in DANGER get their re-checks served first
+last_status = {}
+
+def priority_for(*camera_ids):
+    return PRIORITY_URGENT if any(last_status.get(c) == "DANGER" for c in camera_ids) else PRIORITY_ROUTINE
+
+# Short output: JSON mode + schema; VERDICT_MAX_TOKENS optionally caps each answer
+max_tokens = os.getenv("VERDICT_MAX_TOKENS")
+VERDICT_CONFIG = generation_config(max_tokens=max_tokens)
+
+def generate_with_context(image_parts, prompt, context_prompt, priority, camera_id, batch_size=1):
     """
-    Re-initializes the engine every time to prevent crashing/freezing.
-    Runs in a separate thread so it doesn't block the video.
+    generate_content with the camera's site context: a cached-content reference when
+    available, else the context inline, else just `prompt` (no site material, or
+    context_prompt=None).
+    A cache that vanished server-side is recreated and the call retried once.
     """
-    def run_speech():
-        try:
-            # Re-init engine locally for stability
-            engine = pyttsx3.init()
-            engine.setProperty('rate', 150)
-            engine.say(f"Alert! {text}")
-            engine.runAndWait()
-            engine.stop()
-        except:
-            pass # Ignore audio errors if system is busy
-    
-    t = threading.Thread(target=run_speech)
-    t.start()
-
-# 3. INCIDENT LOGGING SYSTEM
-def log_incident(issue_text):
-    """Saves the incident to a permanent history file."""
-    log_file = "incident_log.json"
-    entry = {
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "issue": issue_text,
-        "location": "Camera-01"
-    }
-    
-    # Load existing logs or start new
-    history = []
-    if os.path.exists(log_file):
-        try:
-            with open(log_file, "r") as f:
-                history = json.load(f)
-        except:
-            history = []
-    
-    # Add new entry
-    history.append(entry)
-    
-    # Save back
-    with open(log_file, "w") as f:
-        json.dump(history, f, indent=4)
-
-# 4. SMS ALERT (With Cooldown)
-last_sms_time = 0
-def send_sms_alert(issue_text):
-    global last_sms_time
-    if time.time() - last_sms_time < 60: return 
-    if sms_client:
+    for attempt in range(2):
+        ref = context.resolve(camera_id) if context_prompt else None
+        if ref is None:
+            parts = image_parts + [types.Part.from_text(text=prompt)]
+            config = VERDICT_CONFIG if batch_size == 1 else generation_config(batch_size=batch_size, max_tokens=max_tokens)
+        else:
+            parts = ref.parts + image_parts + [types.Part.from_text(text=context_prompt)]
+            config = generation_config(batch_size=batch_size, max_tokens=max_tokens, **ref.config)
         try:
-            sms_client.messages.create(
-                body=f"🚨 FACTORY ALERT: {issue_text}",
-                from_=twilio_from, to=twilio_to
-            )
-            print("📱 SMS SENT")
-            last_sms_time = time.time()
-        except: pass
-
-# 5. MAIN ANALYSIS LOOP
-def analyze_frame(frame):
-    # Resize to save bandwidth
-    frame_resized = cv2.resize(frame, (640, 480))
-    _, buffer = cv2.imencode('.jpg', frame_resized)
-    image_bytes = buffer.tobytes()
-    
-    prompt = "Factory Safety Officer. Analyze image. JSON ONLY: {'status': 'SAFE'/'DANGER', 'issue': 'short description', 'confidence': 0-100}"
-
-    print(f"🚀 Analyzing...", end=" ")
-    try:
-        response = client.models.generate_content(
-            model=MODEL_NAME, 
-            contents=[
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
-                        types.Part.from_text(text=prompt)
-                    ]
+            with span("gemini_call"):
+                return client.models.generate_content(
+                    priority=priority,
+                    model=MODEL_NAME,
+                    contents=[types.Content(role="user", parts=parts)],
+                    config=config,
                 )
-            ]
-        )
-        
-        text_data = response.text.replace("```json", "").replace("```", "").strip()
-        print(f"✅ {text_data}")
-        
-        # Save Current Status (For Dashboard Live View)
-        with open("status.json", "w") as f:
-            f.write(text_data)
-        cv2.imwrite("current_frame.jpg", frame_resized)
-
-        # Process Logic
-        data = json.loads(text_data)
-        if data.get("status") == "DANGER":
-            issue = data.get("issue", "Unknown")
-            
-            # 1. Speak
-            speak_warning(issue)
-            
-            # 2. Log to History (NEW)
-            log_incident(issue)
-            
-            # 3. Send SMS
-            send_sms_alert(issue)
+        except Exception as e:
+            if attempt or ref is None or not ref.cached or not is_cache_error(e):
+                raise
+            print(f"🗂️ Context cache gone ({e}) - recreating")
+            context.invalidate(ref)
+
+def request_verdict(image_bytes, prompt, priority=PRIORITY_ROUTINE, camera_id=None):
+    """One Gemini round-trip. Returns a Verdict (raises VerdictParseError on an unusable answer)."""
+    image = types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg")
+    response = generate_with_context([image], prompt, FRAME_PROMPT, priority, camera_id)
+    with span("parse"):
+        return parse_verdict(response.text)
+
+# One incident per camera + issue: alert when it opens or escalates, not on every DANGER verdict
+def on_incident_open(incident):
+    # 1. Speak (queued; the speech worker times the actual TTS)
+    speak_warning(f"{incident.camera}. {incident.issue}")
+    # 2. Send SMS / webhook (queued; never blocks the analysis worker)
+    send_alert(incident.camera, incident.issue, "open", incident.peak_confidence)
+
+def on_incident_escalate(incident):
+    speak_warning(f"{incident.camera}. Still ongoing: {incident.issue}")
+    send_alert(incident.camera, incident.issue, "escalate", incident.peak_confidence)
+
+def on_incident_close(incident):
+    print(f"✅ [{incident.camera}] Incident closed: {incident.issue} ({incident.updates} sightings)")
+    send_alert(incident.camera, incident.issue, "close", incident.peak_confidence)
+
+# The tracker writes the history rows: one per incident, updated in place
+incidents = IncidentTracker(incident_store, on_open=on_incident_open, on_escalate=on_incident_escalate, on_close=on_incident_close)
+
+def handle_verdict(jpeg_bytes, verdict, camera_id):
+    """Publishes one (already parsed) verdict: status file, live frame, then feeds the incident tracker."""
+    # Tag the verdict with the camera it came from
+    data = verdict.to_dict()
+    data["camera"] = camera_id
+
+    # Save Current Status (For Dashboard Live View) - atomic, versioned hand-off
+    # Same JPEG bytes that were uploaded: no second encode
+    with span("publish"):
+        publisher.publish(json.dumps(data), jpeg_bytes)
+        timeseries.record(camera_id, verdict.confidence, verdict.status)
+
+    # Process Logic
+    last_status[camera_id] = verdict.status
+    metrics.inc("verdicts", status=verdict.status)
+    # Open / update / close the camera's incident; alerts fire on open and escalation only
+    with span("incidents"):
+        incidents.observe(camera_id, verdict.status, verdict.issue, verdict.confidence)
 
+def analyze_frame(frame, camera_id="Camera-01", charge=None):
+    # charge([camera_id]), if given, books the request when one is actually sent (supervisor budget)
+    # Crop / resize / encode ONCE with this camera's settings
+    frame_resized, jpeg_bytes = encoder.prepare(frame, camera_id)
+    # Verdict-cache key: PROMPT plus this camera's site rules, if any
+    prompt = context.prompt_key(camera_id, PROMPT)
+
+    # Near-identical frame already judged? Reuse the verdict instead of calling Gemini.
+    with span("cache_lookup"):
+        cached, phash = verdict_cache.get(frame_resized, prompt, MODEL_NAME)
+    if cached is not None:
+        metrics.inc("cache_hits")
+        print(f"♻️ [{camera_id}] Cache hit ({verdict_cache.stats()['hit_rate']:.0%})", end=" ")
+
+    print(f"🚀 [{camera_id}] Analyzing...", end=" ")
+    try:
+        if cached is not None:
+            verdict = Verdict.from_dict(cached)
+        else:
+            if charge is not None:
+                charge([camera_id])
+            # Parsed BEFORE anything is published: a garbled answer never reaches the dashboard
+            verdict = request_verdict(jpeg_bytes, PROMPT, priority_for(camera_id), camera_id)
+            verdict_cache.put(frame_resized, prompt, MODEL_NAME, verdict.to_dict(), phash=phash)
+        print(f"✅ {verdict.to_json()}")
+
+        handle_verdict(jpeg_bytes, verdict, camera_id)
+
+    except VerdictParseError as e:
+        print(f"⚠️ Unusable answer, status left unchanged: {e}")
     except Exception as e:
+        metrics.inc("analysis_errors", stage="analyze_frame")
         print(f"❌ Error: {e}")
 
-def start_stream(video_source):
-    cap = cv2.VideoCapture(video_source)
-    last_analysis_time = 0
-    analysis_interval = 5.0 # Check every 10 seconds
+# 4. BATCH MODE
+def request_batch_verdicts(images, priority=PRIORITY_ROUTINE, camera_id=None):
+    """
+    One Gemini round-trip for several JPEGs. Returns one Verdict per image (None if missing).
+    Every image must share camera_id's site context (analyze_batch groups them).
+    """
+    parts = [types.Part.from_bytes(data=img, mime_type="image/jpeg") for img in images]
+    n = len(images)
+    response = generate_with_context(parts, BATCH_PROMPT.format(n=n), BATCH_FRAME_PROMPT.format(n=n), priority, camera_id, batch_size=n)
+    with span("parse"):
+        return parse_verdicts(response.text, len(images))
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            continue
+def analyze_batch(jobs, charge=None):
+    """
+    Pipeline entry point for batch mode: `jobs` is a list of (frame, camera_id) tuples,
+    from several cameras or several moments of one camera. Cache hits are answered
+    locally, the rest go out as ONE multi-image request per site context (cameras
+    under different site rules can't share a system instruction) and are fanned back out.
+    charge(camera_ids), if given, is called once per request actually sent (supervisor budget).
+    """
+    groups = {}   # verdict-cache key (PROMPT + site rules) -> pending frames
+    for job in jobs:
+        frame = job[0]
+        camera_id = job[1] if len(job) > 1 else "Camera-01"
+        frame_resized, jpeg_bytes = encoder.prepare(frame, camera_id)
+        prompt = context.prompt_key(camera_id, PROMPT)
+        with span("cache_lookup"):
+            cached, phash = verdict_cache.get(frame_resized, prompt, MODEL_NAME)
+        if cached is not None:
+            metrics.inc("cache_hits")
+            verdict = Verdict.from_dict(cached)
+            print(f"♻️ [{camera_id}] Cache hit: {verdict.to_json()}")
+            handle_verdict(jpeg_bytes, verdict, camera_id)
+        else:
+            groups.setdefault(prompt, []).append((frame_resized, jpeg_bytes, camera_id, phash))
 
-        cv2.imshow('Factory Sentinel', frame)
+    for prompt, pending in groups.items():
+        analyze_group(prompt, pending, charge)
 
-        if time.time() - last_analysis_time >= analysis_interval:
-            analyze_frame(frame)
-            last_analysis_time = time.time()
+def analyze_group(prompt, pending, charge=None):
+    """One batch request for frames sharing a site context; verdicts are cached under that context's key."""
+    print(f"🚀 Analyzing batch of {len(pending)} frame(s)...", end=" ")
+    try:
+        images = [jpeg for _, jpeg, _, _ in pending]
+        cameras = [c for _, _, c, _ in pending]
+        if charge is not None:
+            charge(cameras)
+        verdicts = request_batch_verdicts(images, priority_for(*cameras), cameras[0])
+    except VerdictParseError as e:
+        print(f"⚠️ Unusable batch answer, statuses left unchanged: {e}")
+        return
+    except Exception as e:
+        metrics.inc("analysis_errors", stage="analyze_batch")
+        print(f"❌ Error: {e}")
+        return
+    print("✅")
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    for (frame_resized, jpeg_bytes, camera_id, phash), verdict in zip(pending, verdicts):
+        if verdict is None:
+            print(f"⚠️ [{camera_id}] No verdict for this frame in the batch response")
+            continue
+        verdict_cache.put(frame_resized, prompt, MODEL_NAME, verdict.to_dict(), phash=phash)
+        print(f"   [{camera_id}] {verdict.to_json()}")
+        try:
+            handle_verdict(jpeg_bytes, verdict, camera_id)
+        except Exception as e:
+            print(f"❌ [{camera_id}] Error: {e}")
 
-    cap.release()
-    cv2.destroyAllWindows()
+def start_stream(video_source, batch_size=1, max_wait=None, detector=None, crop=None, headless=False):
+    # Analysis runs on a background worker; the video loop never waits on Gemini.
+    # batch_size > 1 sends several timestamps of this camera in one request; by default
+    # the batch waits long enough for all of them (one sample every `interval` seconds).
+    # detector ('motion' / 'hog' / 'dnn', or SENTINEL_DETECTOR) only escalates frames
+    # with people or moving machinery in the detector_zones.json zones.
+    # headless=True (or no display) runs without the preview window, e.g. on a server.
+    # Per-stage timings: http://127.0.0.1:METRICS_PORT/metrics and METRICS_FILE (dashboard)
+    start_exporter()
+    detector = detector if detector is not None else os.getenv("SENTINEL_DETECTOR")
+    crop = crop if crop is not None else os.getenv("DETECTOR_CROP") == "1"
+    cascade = make_detector(detector, crop=crop)
+    interval = 5.0
+    try:
+        if batch_size > 1:
+            max_wait = max_wait if max_wait is not None else interval * (batch_size - 1)
+            if max_wait <= 0:
+                raise ValueError("batch_size > 1 needs max_wait > 0, otherwise every batch holds a single frame")
+            return run_stream(video_source, analyze_batch, interval=interval, window_title='Factory Sentinel', batch_size=batch_size, max_wait=max_wait, detector=cascade, headless=headless)
+        return run_stream(video_source, analyze_frame, interval=interval, window_title='Factory Sentinel', detector=cascade, headless=headless)
+    finally:
+        # Don't leave incidents 'open' in the history when the sentinel stops
+        incidents.close_all()
+        # ...and give queued alerts a chance to go out
+        get_alert_dispatcher().flush(timeout=10.0)
+        # Context caches are billed while they live: drop ours
+        context.close()
 
 if __name__ == "__main__":
-    # Use 0 for webcam, or filename for video
-    start_stream("factory_sample.mp4")
+    parser = argparse.ArgumentParser(description="Watch one camera with the Gemini sentinel.")
+    # Use 0 for webcam, or filename / RTSP URL for video
+    parser.add_argument("source", nargs="?", default="factory_sample.mp4")
+    parser.add_argument("--headless", action="store_true", help="no preview window")
+    parser.add_argument("--batch-size", type=int, default=1, help="frames per Gemini request (1 = no batching)")
+    parser.add_argument("--batch-wait", type=float, default=None, help="max seconds to wait for a batch to fill (default: long enough to fill it)")
+    parser.add_argument("--detector", choices=["off", "motion", "hog", "dnn"], default=os.getenv("SENTINEL_DETECTOR"), help="local first stage in front of Gemini")
+    parser.add_argument("--detector-crop", action="store_true", default=os.getenv("DETECTOR_CROP") == "1", help="upload only the detection box")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    start_stream(source, batch_size=args.batch_size, max_wait=args.batch_wait, detector=args.detector,
+                 crop=args.detector_crop, headless=args.headless)
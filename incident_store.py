@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+DB_FILE = "incidents.db"
+LEGACY_LOG = "incident_log.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp  TEXT NOT NULL,
+    camera     TEXT NOT NULL,
+    issue      TEXT NOT NULL,
+    confidence REAL,
+    ended_at   TEXT,
+    peak_confidence REAL,
+    updates    INTEGER NOT NULL DEFAULT 1,
+    state      TEXT NOT NULL DEFAULT 'closed'
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON incidents (timestamp);
+CREATE INDEX IF NOT EXISTS idx_incidents_camera    ON incidents (camera, timestamp);
+CREATE INDEX IF NOT EXISTS idx_incidents_issue     ON incidents (issue);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Needs the columns from ADDED_COLUMNS, so it runs after _add_columns().
+# meta 'changes' is bumped by every write (from any process): version() is one key lookup
+CHANGE_TRACKING = """
+CREATE INDEX IF NOT EXISTS idx_incidents_open ON incidents (camera, timestamp) WHERE state = 'open';
+INSERT OR IGNORE INTO meta (key, value) VALUES ('changes', '0');
+CREATE TRIGGER IF NOT EXISTS incidents_changed_insert AFTER INSERT ON incidents BEGIN
+    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'changes';
+END;
+CREATE TRIGGER IF NOT EXISTS incidents_changed_update AFTER UPDATE ON incidents BEGIN
+    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'changes';
+END;
+CREATE TRIGGER IF NOT EXISTS incidents_changed_delete AFTER DELETE ON incidents BEGIN
+    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'changes';
+END;
+"""
+
+# Columns added after the first release: (name, definition) for ALTER TABLE on old databases
+ADDED_COLUMNS = [
+    ("ended_at", "TEXT"),
+    ("peak_confidence", "REAL"),
+    ("updates", "INTEGER NOT NULL DEFAULT 1"),
+    ("state", "TEXT NOT NULL DEFAULT 'closed'"),
+]
+
+# INCIDENT STORE
+class IncidentStore:
+    """
+    Append-only incident history in SQLite (WAL mode).
+    Every incident is one INSERT instead of rewriting the whole JSON file, a crash
+    can't corrupt older rows, and the dashboard can count / page through history
+    without loading it. Timestamps are 'YYYY-MM-DD HH:MM:SS' strings, so range
+    filters compare as text. Records come back in the old incident_log.json
+    shape ({'timestamp', 'issue', 'location'}) plus 'id' and 'confidence'.
+    Rows written by incidents.IncidentTracker span time: 'timestamp' is the start,
+    'ended_at' the last sighting, and 'state' is 'open' until the incident closes.
+    """
+    def __init__(self, path=DB_FILE, migrate_from=LEGACY_LOG):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        self._add_columns(conn)
+        conn.executescript(CHANGE_TRACKING)
+        if migrate_from and os.path.exists(migrate_from):
+            self.migrate_json(migrate_from)
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads: one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _add_columns(conn):
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(incidents)")}
+        for name, definition in ADDED_COLUMNS:
+            if name not in existing:
+                try:
+                    conn.execute(f"ALTER TABLE incidents ADD COLUMN {name} {definition}")
+                except sqlite3.OperationalError:
+                    pass   # another process added it first
+
+    @staticmethod
+    def _record(row):
+        return {
+            "id": row["id"],
+            "timestamp": row["timestamp"],
+            "issue": row["issue"],
+            "location": row["camera"],
+            "confidence": row["confidence"],
+            "ended_at": row["ended_at"],
+            "peak_confidence": row["peak_confidence"],
+            "updates": row["updates"],
+            "state": row["state"],
+        }
+
+    @staticmethod
+    def _where(start=None, end=None, camera=None, issue=None, search=None, after_id=None):
+        clauses, params = [], []
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if camera:
+            clauses.append("camera = ?")
+            params.append(camera)
+        if issue:
+            clauses.append("issue = ?")
+            params.append(issue)
+        if search:
+            clauses.append("issue LIKE ?")
+            params.append(f"%{search}%")
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    # 1. WRITES
+    def append(self, issue, camera="Camera-01", timestamp=None, confidence=None, state="closed"):
+        timestamp = timestamp or time.strftime("%Y-%m-%d %H:%M:%S")
+        cur = self._conn().execute(
+            "INSERT INTO incidents (timestamp, camera, issue, confidence, peak_confidence, state) VALUES (?, ?, ?, ?, ?, ?)",
+            (timestamp, camera, issue, confidence, confidence, state),
+        )
+        return cur.lastrowid
+
+    def update_incident(self, incident_id, ended_at=None, peak_confidence=None, updates=None, state=None):
+        """Extends an aggregated incident in place (one UPDATE instead of another row)."""
+        self._conn().execute(
+            "UPDATE incidents SET ended_at = COALESCE(?, ended_at), peak_confidence = COALESCE(?, peak_confidence), "
+            "updates = COALESCE(?, updates), state = COALESCE(?, state) WHERE id = ?",
+            (ended_at, peak_confidence, updates, state, incident_id),
+        )
+
+    def close_stale(self, before):
+        """Closes 'open' rows not seen since `before` (left behind by a crash). Returns how many."""
+        cur = self._conn().execute(
+            "UPDATE incidents SET state = 'closed', ended_at = COALESCE(ended_at, timestamp) "
+            "WHERE state = 'open' AND COALESCE(ended_at, timestamp) < ?",
+            (before,),
+        )
+        return cur.rowcount
+
+    # 2. QUERIES
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self._conn().execute(f"SELECT COUNT(*) FROM incidents{where}", params).fetchone()[0]
+
+    def range(self, limit=None, offset=0, newest_first=False, **filters):
+        """Incidents matching the filters (start, end, camera, issue, search), ordered by time."""
+        where, params = self._where(**filters)
+        order = "DESC" if newest_first else "ASC"
+        sql = f"SELECT * FROM incidents{where} ORDER BY timestamp {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        return [self._record(r) for r in self._conn().execute(sql, params)]
+
+    def iter_chunks(self, chunk_size=500, **filters):
+        """Yields lists of incidents in insertion order without holding the whole history in memory."""
+        last_id = 0
+        conn = self._conn()
+        while True:
+            where, params = self._where(after_id=last_id, **filters)
+            rows = conn.execute(f"SELECT * FROM incidents{where} ORDER BY id LIMIT ?", params + [chunk_size]).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            yield [self._record(r) for r in rows]
+
+    def last_id(self):
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM incidents").fetchone()[0]
+
+    def version(self):
+        """Changes whenever a row is added or an incident is updated (cache key for reports). One meta lookup."""
+        row = self._conn().execute("SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def open_count(self, **filters):
+        """Ongoing incidents; served from the partial index on open rows."""
+        where, params = self._where(**filters)
+        where = f"{where} AND state = 'open'" if where else " WHERE state = 'open'"
+        return self._conn().execute(f"SELECT COUNT(*) FROM incidents{where}", params).fetchone()[0]
+
+    def cameras(self):
+        return [r[0] for r in self._conn().execute("SELECT DISTINCT camera FROM incidents ORDER BY camera")]
+
+    # 3. ONE-TIME MIGRATION
+    def migrate_json(self, path=LEGACY_LOG):
+        """Imports the old incident_log.json once (remembered in the meta table). Returns rows imported."""
+        conn = self._conn()
+        key = f"migrated:{os.path.abspath(path)}"
+        conn.execute("BEGIN IMMEDIATE")   # two processes starting together won't both import
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                conn.execute("COMMIT")
+                return 0
+            try:
+                with open(path, "r") as f:
+                    history = json.load(f)
+            except (OSError, ValueError):
+                print(f"⚠️ Could not read {path}, skipping migration")
+                history = []
+
+            rows = [(
+                str(item.get("timestamp", item.get("Time", ""))),
+                str(item.get("location", "Camera-01")),
+                str(item.get("issue", item.get("Violation", "Unknown Issue"))),
+                item.get("confidence"),
+            ) for item in history if isinstance(item, dict)]
+            conn.executemany("INSERT INTO incidents (timestamp, camera, issue, confidence) VALUES (?, ?, ?, ?)", rows)
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, time.strftime("%Y-%m-%d %H:%M:%S")))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if rows:
+            print(f"📦 Migrated {len(rows)} incidents from {path} into {self.path}")
+        return len(rows)
@@ -0,0 +1,217 @@
+import re
+import time
+import threading
+from difflib import SequenceMatcher
+from metrics import metrics
+
+# INCIDENT AGGREGATION
+# A worker without a helmet for ten minutes is ONE incident, not forty DANGER rows.
+# Verdicts are folded into per-camera incidents keyed by a fuzzy match on the issue
+# text; alerts (speech / SMS) fire when an incident opens or escalates, and the
+# store sees one INSERT per incident plus a few throttled UPDATEs.
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def normalize_issue(text):
+    return " ".join(_WORD.findall((text or "").lower()))
+
+def issue_similarity(a, b):
+    """0-1. Best of character-level ratio and word overlap, so rewordings still match."""
+    a, b = normalize_issue(a), normalize_issue(b)
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    words_a, words_b = set(a.split()), set(b.split())
+    overlap = len(words_a & words_b) / min(len(words_a), len(words_b))
+    return max(SequenceMatcher(None, a, b).ratio(), overlap)
+
+def _stamp(epoch):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(epoch))
+
+class Incident:
+    def __init__(self, camera, issue, confidence, now):
+        self.id = None
+        self.camera = camera
+        self.issue = issue
+        self.started = now
+        self.last_seen = now
+        self.peak_confidence = confidence
+        self.alerted_confidence = confidence or 0
+        self.updates = 1
+        self.flushed_at = now
+        self.state = "open"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "camera": self.camera,
+            "issue": self.issue,
+            "started": _stamp(self.started),
+            "last_seen": _stamp(self.last_seen),
+            "peak_confidence": self.peak_confidence,
+            "updates": self.updates,
+            "state": self.state,
+        }
+
+class IncidentTracker:
+    """
+    Per-camera incident state machine: open -> update* -> closed.
+    - A DANGER verdict updates the open incident of that camera whose issue is at
+      least `similarity` alike, otherwise it opens a new one.
+    - Escalation: confidence `escalate_by` points above what was last alerted.
+    - An incident closes after `safe_to_close` SAFE verdicts in a row from its camera,
+      or when it hasn't been seen for `close_after` seconds.
+    on_open / on_escalate / on_close get the Incident; `store` (IncidentStore, optional)
+    gets one row per incident, refreshed at most every `flush_interval` seconds. Rows
+    still 'open' in the store from a previous run that nobody could have refreshed
+    since (older than close_after + flush_interval) are closed on start.
+    """
+    def __init__(self, store=None, on_open=None, on_escalate=None, on_close=None, similarity=0.6,
+                 close_after=120.0, safe_to_close=2, escalate_by=15, flush_interval=30.0, clock=time.time):
+        self.store = store
+        self.on_open = on_open
+        self.on_escalate = on_escalate
+        self.on_close = on_close
+        self.similarity = similarity
+        self.close_after = close_after
+        self.safe_to_close = safe_to_close
+        self.escalate_by = escalate_by
+        self.flush_interval = flush_interval
+        self.clock = clock
+
+        self._open = {}          # camera -> [Incident]
+        self._safe_streak = {}   # camera -> consecutive SAFE verdicts
+        self._lock = threading.Lock()
+        self._store_lock = threading.Lock()   # store writes, in event order per incident
+
+        if store is not None:
+            stale = store.close_stale(_stamp(clock() - close_after - flush_interval))
+            if stale:
+                print(f"🧹 Closed {stale} incident(s) left open by a previous run")
+
+        self.opened = 0
+        self.updated = 0
+        self.escalated = 0
+        self.closed = 0
+
+    # 1. VERDICTS IN
+    def observe(self, camera, status, issue=None, confidence=None, now=None):
+        """Feeds one verdict. Returns the list of (event, Incident) it caused."""
+        now = self.clock() if now is None else now
+        events = []
+        with self._lock:
+            events += self._expire(now)
+            if status == "DANGER":
+                self._safe_streak[camera] = 0
+                events.append(self._danger(camera, issue or "Unknown", confidence, now))
+            else:
+                streak = self._safe_streak.get(camera, 0) + 1
+                self._safe_streak[camera] = streak
+                if streak >= self.safe_to_close:
+                    events += [self._close(inc, now) for inc in self._open.pop(camera, [])]
+
+        self._emit(events)
+        return events
+
+    def _match(self, camera, issue):
+        best, best_score = None, self.similarity
+        for incident in self._open.get(camera, []):
+            score = issue_similarity(incident.issue, issue)
+            if score >= best_score:
+                best, best_score = incident, score
+        return best
+
+    def _danger(self, camera, issue, confidence, now):
+        incident = self._match(camera, issue)
+        if incident is None:
+            incident = Incident(camera, issue, confidence, now)
+            self._open.setdefault(camera, []).append(incident)
+            self.opened += 1
+            return ("open", incident)
+
+        incident.last_seen = now
+        incident.updates += 1
+        if confidence is not None and (incident.peak_confidence is None or confidence > incident.peak_confidence):
+            incident.peak_confidence = confidence
+        self.updated += 1
+        if confidence is not None and confidence - incident.alerted_confidence >= self.escalate_by:
+            incident.alerted_confidence = confidence
+            self.escalated += 1
+            return ("escalate", incident)
+        return ("update", incident)
+
+    def _close(self, incident, now):
+        incident.state = "closed"
+        self.closed += 1
+        return ("close", incident)
+
+    def _expire(self, now):
+        events = []
+        for camera in list(self._open):
+            keep = []
+            for incident in self._open[camera]:
+                if now - incident.last_seen >= self.close_after:
+                    events.append(self._close(incident, now))
+                else:
+                    keep.append(incident)
+            if keep:
+                self._open[camera] = keep
+            else:
+                del self._open[camera]
+        return events
+
+    def sweep(self, now=None):
+        """Closes incidents nobody has seen for close_after seconds (call periodically / on shutdown)."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            events = self._expire(now)
+        self._emit(events)
+        return events
+
+    def close_all(self):
+        now = self.clock()
+        with self._lock:
+            events = [self._close(inc, now) for incidents in self._open.values() for inc in incidents]
+            self._open.clear()
+        self._emit(events)
+        return events
+
+    # 2. SIDE EFFECTS (outside the lock)
+    def _emit(self, events):
+        self._persist(events)
+        for event, incident in events:
+            metrics.inc("incidents", event=event)
+            callback = {"open": self.on_open, "escalate": self.on_escalate, "close": self.on_close}.get(event)
+            if callback:
+                try:
+                    callback(incident)
+                except Exception as e:
+                    print(f"⚠️ Incident {event} handler failed: {e}")
+
+    def _persist(self, events):
+        if self.store is None:
+            return
+        with self._store_lock:
+            for event, incident in events:
+                if event == "open":
+                    incident.id = self.store.append(incident.issue, camera=incident.camera, timestamp=_stamp(incident.started),
+                                                    confidence=incident.peak_confidence, state="open")
+                    incident.flushed_at = incident.started
+                    # Another thread may have closed it before the INSERT: its close was skipped (no id yet)
+                    if incident.state != "open":
+                        self._flush(incident)
+                elif incident.id is not None and (event != "update" or incident.last_seen - incident.flushed_at >= self.flush_interval):
+                    self._flush(incident)
+
+    def _flush(self, incident):
+        self.store.update_incident(incident.id, ended_at=_stamp(incident.last_seen), peak_confidence=incident.peak_confidence,
+                                   updates=incident.updates, state=incident.state)
+        incident.flushed_at = incident.last_seen
+
+    def open_incidents(self):
+        with self._lock:
+            return [inc.to_dict() for incidents in self._open.values() for inc in incidents]
+
+    def stats(self):
+        with self._lock:
+            active = sum(len(v) for v in self._open.values())
+        return {"open": active, "opened": self.opened, "updated": self.updated, "escalated": self.escalated, "closed": self.closed}
@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+from frame_channel import FrameSubscriber, parse_status
+from metrics import METRICS_FILE, load_metrics_file
+
+# SHARED DASHBOARD FEED
+# Every browser tab used to poll the channel, the metrics file and the incident
+# database on its own. One LiveFeed per dashboard process does the polling; tabs
+# only compare version numbers and pick up the same in-memory objects.
+
+class Snapshot:
+    """
+    Immutable view of everything the live dashboard shows.
+    A field is replaced (never mutated) when its source changes, so a session
+    can tell what to re-render with an identity check: `snap.metrics is not last`.
+    """
+    def __init__(self, version=0, seq=None, status=None, jpeg=None, metrics=None, incidents=None, updated=0.0):
+        self.version = version
+        self.seq = seq                      # channel sequence of the latest verdict
+        self.status = status or {}          # parsed verdict dict
+        self.jpeg = jpeg                    # JPEG bytes exactly as the sentinel uploaded them
+        self.metrics = metrics              # sentinel_metrics.json snapshot (or None)
+        self.incidents = incidents or {}    # {"version", "total", "open"}
+        self.updated = updated
+
+    def replace(self, **changes):
+        fields = dict(self.__dict__, **changes)
+        fields["version"] = self.version + 1
+        fields["updated"] = time.time()
+        return Snapshot(**fields)
+
+class LiveFeed:
+    """
+    Process-wide reader for the dashboard (keep ONE, e.g. behind st.cache_resource).
+    A daemon thread polls the frame channel every `poll` seconds, the metrics file
+    when its mtime changes and the incident store every `incident_poll` seconds.
+    Sessions call wait(last_version) and get the shared Snapshot: no file I/O,
+    JSON parsing or SQL per viewer.
+    trend() memoizes time-series queries, so tabs showing the same camera and
+    window share one query per new verdict.
+    """
+    def __init__(self, store=None, timeseries=None, poll=0.25, incident_poll=2.0, subscriber=None):
+        self.store = store
+        self.timeseries = timeseries
+        self.poll = poll
+        self.incident_poll = incident_poll
+        self._subscriber = subscriber or FrameSubscriber()
+        self._snapshot = Snapshot()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._trends = {}
+        self._trend_lock = threading.Lock()
+
+        self.polls = 0
+        self.publishes = 0
+        self.trend_queries = 0
+
+        self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+        self._thread.start()
+
+    # 1. POLLING (one thread for all sessions)
+    def _run(self):
+        metrics_mtime = None
+        next_incidents = 0.0
+        while not self._stop.is_set():
+            snap = self._snapshot
+            changes = {}
+            try:
+                update = self._read_channel(snap.seq)
+                if update is not None:
+                    changes["seq"], changes["status"], changes["jpeg"] = update
+
+                mtime = os.stat(METRICS_FILE).st_mtime_ns if os.path.exists(METRICS_FILE) else None
+                if mtime != metrics_mtime:
+                    metrics_mtime = mtime
+                    changes["metrics"] = load_metrics_file()
+
+                if self.store is not None and time.time() >= next_incidents:
+                    next_incidents = time.time() + self.incident_poll
+                    version = self.store.version()
+                    if version != snap.incidents.get("version"):
+                        changes["incidents"] = {"version": version, "total": self.store.count(), "open": self.store.open_count()}
+            except Exception as e:
+                print(f"⚠️ Live feed poll failed: {e}")
+
+            self.polls += 1
+            if changes:
+                with self._cond:
+                    self._snapshot = snap.replace(**changes)
+                    self.publishes += 1
+                    self._cond.notify_all()
+            self._stop.wait(self.poll)
+
+    def _read_channel(self, last_seq):
+        """
+        Latest (seq, status, jpeg) straight out of the channel slot: the JPEG is
+        copied once, into the snapshot, and only kept if the writer didn't lap
+        the slot meanwhile (the next poll then picks up the newer frame).
+        """
+        subscriber = self._subscriber
+        if not subscriber.is_open():
+            return subscriber.read(last_seq)   # status.json / current_frame.jpg fallback
+        view = subscriber.read_view(last_seq)
+        if view is None:
+            return None
+        seq, status_view, jpeg_view = view
+        status, jpeg = str(status_view, "utf-8", "replace"), bytes(jpeg_view)
+        status_view.release()
+        jpeg_view.release()
+        if not subscriber.is_current(seq):
+            return None
+        return seq, parse_status(status), jpeg or subscriber.read_frame_file()
+
+    # 2. SESSION SIDE
+    def snapshot(self):
+        return self._snapshot
+
+    def wait(self, version=None, timeout=1.0):
+        """Blocks until the snapshot is newer than `version` (or `timeout`), then returns the latest one."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._snapshot.version != version, timeout)
+            return self._snapshot
+
+    def trend(self, camera, seconds, max_points=300):
+        """TimeSeriesStore.query for the last `seconds`, cached until the camera records a verdict or a minute passes."""
+        if self.timeseries is None:
+            return None
+        key = (camera, seconds, max_points)
+        valid = (self.timeseries.version(camera), int(time.time() // 60))
+        with self._trend_lock:
+            cached = self._trends.get(key)
+            if cached is not None and cached[0] == valid:
+                return cached[1]
+        series = self.timeseries.query(camera, start=time.time() - seconds, max_points=max_points)
+        self.trend_queries += 1
+        with self._trend_lock:
+            if len(self._trends) > 64:
+                self._trends.clear()
+            self._trends[key] = (valid, series)
+        return series
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {"version": self._snapshot.version, "polls": self.polls, "publishes": self.publishes, "trend_queries": self.trend_queries}
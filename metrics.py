@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+METRICS_FILE = os.getenv("METRICS_FILE", "sentinel_metrics.json")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))   # 0 = no HTTP endpoint
+
+# Seconds; covers a ~1 ms resize up to a slow multi-second Gemini call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 1. HISTOGRAM
+class Histogram:
+    """Fixed-bucket histogram: O(log buckets) per observation, constant memory."""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Bucket-interpolated estimate (good enough to spot which stage is slow)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, low + (high - low) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(1000 * self.sum / self.count, 2) if self.count else None,
+            "p50_ms": round(1000 * self.quantile(0.5), 2) if self.count else None,
+            "p95_ms": round(1000 * self.quantile(0.95), 2) if self.count else None,
+            "max_ms": round(1000 * self.max, 2) if self.count else None,
+        }
+
+# 2. REGISTRY
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _label_text(key):
+    return ",".join(f'{k}="{v}"' for k, v in key)
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and per-stage timing histograms.
+    Hot-path cost is one perf_counter pair and a dict update under a lock.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}     # stage -> Histogram
+        self._counters = {}   # (name, labels) -> float
+        self._gauges = {}     # (name, labels) -> float
+        self.started = time.time()
+
+    @contextmanager
+    def span(self, stage):
+        """with metrics.span("imencode"): ... - records the block's duration, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = Histogram()
+            hist.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def snapshot(self):
+        """JSON-friendly view: per-stage latency summary, counters and gauges."""
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "uptime_s": round(time.time() - self.started, 1),
+                "stages": {stage: h.summary() for stage, h in sorted(self._stages.items())},
+                "counters": {self._flat(name, key): v for (name, key), v in sorted(self._counters.items())},
+                "gauges": {self._flat(name, key): v for (name, key), v in sorted(self._gauges.items())},
+            }
+
+    @staticmethod
+    def _flat(name, key):
+        return f"{name}{{{_label_text(key)}}}" if key else name
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = ["# HELP sentinel_stage_seconds Time spent per pipeline stage.", "# TYPE sentinel_stage_seconds histogram"]
+        with self._lock:
+            for stage, h in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'sentinel_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'sentinel_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'sentinel_stage_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'sentinel_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+            for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+                typed = set()
+                for (name, key), value in sorted(values.items()):
+                    metric = f"sentinel_{name}_total" if kind == "counter" else f"sentinel_{name}"
+                    if metric not in typed:
+                        lines.append(f"# TYPE {metric} {kind}")
+                        typed.add(metric)
+                    lines.append(f"{metric}{{{_label_text(key)}}} {value}" if key else f"{metric} {value}")
+            lines.append("# TYPE sentinel_uptime_seconds gauge")
+            lines.append(f"sentinel_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+span = metrics.span
+
+# 3. EXPORT (HTTP endpoint + rolling file)
+class MetricsExporter:
+    """
+    Serves GET /metrics (Prometheus text) on localhost:`port` and rewrites `path`
+    every `interval` seconds with the latest snapshot plus a short rolling history,
+    which is what the dashboard reads.
+    """
+    def __init__(self, registry=metrics, port=METRICS_PORT, path=METRICS_FILE, interval=5.0, history=60):
+        self.registry = registry
+        self.port = port
+        self.path = path
+        self.interval = interval
+        self.history = history
+        self._points = []
+        self._stop = threading.Event()
+        self._server = None
+
+        if port:
+            self._start_http()
+        if path:
+            threading.Thread(target=self._write_loop, name="metrics-file", daemon=True).start()
+
+    def _start_http(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint disabled (port {self.port}): {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"📈 Metrics at http://127.0.0.1:{self.port}/metrics")
+
+    def write(self):
+        snap = self.registry.snapshot()
+        self._points.append({"timestamp": snap["timestamp"], "counters": snap["counters"]})
+        self._points = self._points[-self.history:]
+        snap["history"] = self._points
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snap, f)
+        os.replace(tmp, self.path)
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"⚠️ Metrics file error: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def start_exporter(**options):
+    """Process-wide exporter; safe to call from every entry point."""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = MetricsExporter(**options)
+        return _exporter
+
+def load_metrics_file(path=METRICS_FILE):
+    """Latest snapshot written by a running sentinel, or None."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def counter_rate(snapshot, name):
+    """Per-second rate of a counter over the snapshot's rolling history (all label sets summed)."""
+    points = (snapshot or {}).get("history") or []
+    if len(points) < 2:
+        return None
+    total = lambda p: sum(v for k, v in p["counters"].items() if k == name or k.startswith(name + "{"))
+    elapsed = points[-1]["timestamp"] - points[0]["timestamp"]
+    return (total(points[-1]) - total(points[0])) / elapsed if elapsed > 0 else None
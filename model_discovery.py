@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+CACHE_FILE = os.getenv("MODEL_CACHE_FILE", "model_cache.json")
+DEFAULT_TTL = 24 * 3600
+
+_file_lock = threading.Lock()
+
+def cache_key(namespace, api_key):
+    """Different API keys can see different models, so the key is part of the cache key."""
+    return f"{namespace}:{hashlib.sha1((api_key or '').encode('utf-8')).hexdigest()[:10]}"
+
+def _load_all(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_entry(key, path=CACHE_FILE):
+    return _load_all(path).get(key)
+
+def save_entry(key, value, path=CACHE_FILE):
+    with _file_lock:
+        data = _load_all(path)
+        data[key] = {"value": value, "saved_at": time.time()}
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+
+# CACHED DISCOVERY
+def discover(key, compute_fn, fallback=None, ttl=DEFAULT_TTL, path=CACHE_FILE, on_update=None):
+    """
+    Returns the discovery result for `key` without touching the network when possible.
+    - Fresh cache entry: returned as-is.
+    - Stale entry: returned immediately, compute_fn() re-runs on a background thread
+      and on_update(new_value) is called if the answer changed.
+    - No entry: compute_fn() runs now; if it fails, `fallback` is returned.
+    compute_fn must return something JSON-serialisable.
+    """
+    entry = load_entry(key, path)
+    if entry is not None:
+        age = time.time() - entry.get("saved_at", 0)
+        if age <= ttl:
+            print(f"⚡ Model discovery from cache ({age / 60:.0f} min old)")
+            return entry["value"]
+
+        print(f"⚡ Model discovery from stale cache ({age / 3600:.1f} h old), revalidating in background")
+        cached = entry["value"]
+
+        def revalidate():
+            try:
+                value = compute_fn()
+            except Exception as e:
+                print(f"⚠️ Background model discovery failed, keeping cached choice: {e}")
+                return
+            save_entry(key, value, path)
+            if on_update and value != cached:
+                on_update(value)
+
+        threading.Thread(target=revalidate, name="model-discovery", daemon=True).start()
+        return cached
+
+    try:
+        value = compute_fn()
+    except Exception as e:
+        print(f"❌ Model discovery failed: {e}")
+        return fallback
+    save_entry(key, value, path)
+    return value
@@ -0,0 +1,233 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}   # model_circuit_state gauge
+
+def is_rate_limit(error):
+    """True for quota / 429 errors, whatever the SDK wraps them in."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    text = str(error)
+    return code == 429 or "429" in text or "RESOURCE_EXHAUSTED" in text
+
+class AllModelsFailed(Exception):
+    pass
+
+# 1. PER-MODEL HEALTH
+class ModelHealth:
+    """Latency EWMA, error-rate EWMA, 429 counter and circuit-breaker state for one model."""
+    def __init__(self, name, order):
+        self.name = name
+        self.order = order
+        self.state = CLOSED
+        self.latency = None          # EWMA seconds, None until the first success
+        self.error_rate = 0.0        # EWMA of failures (0-1)
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.routed = 0
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.probing = False
+
+    def publish(self):
+        """Mirrors the health figures into the metrics registry (exporter / dashboard)."""
+        metrics.set_gauge("model_circuit_state", STATE_CODES[self.state], model=self.name)
+        metrics.set_gauge("model_error_rate", round(self.error_rate, 3), model=self.name)
+        if self.latency is not None:
+            metrics.set_gauge("model_latency_ewma_seconds", round(self.latency, 3), model=self.name)
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "latency_ewma_s": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "routed": self.routed,
+        }
+
+# 2. ROUTER
+class ModelRouter:
+    """
+    Sends each request to the fastest healthy model.
+    - A model's breaker OPENS after `failure_threshold` failures in a row (or on any
+      429) and stays open for `cooldown` seconds, doubling up to `max_cooldown`.
+    - After the cooldown it goes HALF_OPEN: exactly one probe request is let through;
+      success closes the breaker, failure re-opens it.
+    - With `hedge_after` set, if the primary hasn't answered after that many seconds a
+      second request goes to the next healthy model and the first answer wins.
+    Routing decisions, outcomes and breaker states also go to the metrics registry
+    (model_routed, model_requests, model_hedges, model_circuit_state, ...).
+    """
+    def __init__(self, models, failure_threshold=3, cooldown=30.0, max_cooldown=600.0, alpha=0.3, hedge_after=None):
+        self.models = {name: ModelHealth(name, i) for i, name in enumerate(models)}
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.alpha = alpha
+        self.hedge_after = hedge_after
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(models), thread_name_prefix="model") if hedge_after else None
+
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.last_decision = None
+
+    # --- Routing ---
+    def candidates(self):
+        """Models to try, best first. Claims the half-open probe slot for any model it returns in that state."""
+        now = time.monotonic()
+        with self._lock:
+            ready = []
+            for h in self.models.values():
+                if h.state == OPEN and now - h.opened_at >= h.cooldown:
+                    h.state = HALF_OPEN
+                    h.publish()
+                if h.state == CLOSED:
+                    ready.append(h)
+                elif h.state == HALF_OPEN and not h.probing:
+                    h.probing = True
+                    ready.append(h)
+            # Half-open probes go first (real traffic, with fallback), then known-fast
+            # models, then untried ones in configured order
+            ready.sort(key=lambda h: (h.state != HALF_OPEN, h.latency is None, h.latency or 0.0, h.order))
+            return [h.name for h in ready]
+
+    def _release_probes(self, names):
+        with self._lock:
+            for name in names:
+                self.models[name].probing = False
+
+    def record_success(self, name, latency):
+        with self._lock:
+            h = self.models[name]
+            h.requests += 1
+            h.successes += 1
+            h.consecutive_failures = 0
+            h.error_rate = (1 - self.alpha) * h.error_rate
+            h.latency = latency if h.latency is None else (1 - self.alpha) * h.latency + self.alpha * latency
+            if h.state != CLOSED:
+                print(f"🟢 Circuit CLOSED for {name} (probe ok, {latency:.2f}s)")
+            h.state = CLOSED
+            h.cooldown = 0.0
+            h.probing = False
+            h.publish()
+        metrics.inc("model_requests", model=name, result="ok")
+
+    def record_failure(self, name, error):
+        with self._lock:
+            h = self.models[name]
+            h.requests += 1
+            h.errors += 1
+            h.consecutive_failures += 1
+            h.error_rate = (1 - self.alpha) * h.error_rate + self.alpha
+            limited = is_rate_limit(error)
+            if limited:
+                h.rate_limited += 1
+            if h.state == HALF_OPEN or limited or h.consecutive_failures >= self.failure_threshold:
+                h.cooldown = min(self.max_cooldown, h.cooldown * 2 if h.cooldown else self.base_cooldown)
+                h.opened_at = time.monotonic()
+                if h.state != OPEN:
+                    print(f"🔴 Circuit OPEN for {name} for {h.cooldown:.0f}s ({'429' if limited else 'errors'})")
+                h.state = OPEN
+            h.probing = False
+            h.publish()
+        metrics.inc("model_requests", model=name, result="rate_limited" if limited else "error")
+
+    def _timed(self, fn, name):
+        started = time.monotonic()
+        try:
+            result = fn(name)
+        except Exception as e:
+            self.record_failure(name, e)
+            raise
+        self.record_success(name, time.monotonic() - started)
+        return result
+
+    def call(self, fn):
+        """
+        Runs fn(model_name) on the best model, falling through to the next on failure.
+        Returns (result, model_name). Raises AllModelsFailed if nothing answered.
+        """
+        names = self.candidates()
+        if not names:
+            raise AllModelsFailed("All model circuits are open")
+
+        errors = []
+        remaining = list(names)
+        try:
+            while remaining:
+                primary = remaining.pop(0)
+                metrics.inc("model_routed", model=primary)
+                with self._lock:
+                    self.models[primary].routed += 1
+                    self.last_decision = {"model": primary, "state": self.models[primary].state, "at": time.time()}
+
+                if self._executor is None or not remaining:
+                    try:
+                        return self._timed(fn, primary), primary
+                    except Exception as e:
+                        errors.append(f"{primary}: {e}")
+                        continue
+
+                result = self._hedged(fn, primary, remaining, errors)
+                if result is not None:
+                    return result
+        finally:
+            self._release_probes(names)
+        raise AllModelsFailed("; ".join(errors))
+
+    def _hedged(self, fn, primary, remaining, errors):
+        futures = {self._executor.submit(self._timed, fn, primary): primary}
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            backup = remaining.pop(0)
+            metrics.inc("model_routed", model=backup)
+            metrics.inc("model_hedges", result="fired")
+            with self._lock:
+                self.models[backup].routed += 1
+                self.hedges_fired += 1
+            print(f"⏱️ {primary} slower than {self.hedge_after}s - hedging with {backup}")
+            futures[self._executor.submit(self._timed, fn, backup)] = backup
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+                    continue
+                if name != primary:
+                    metrics.inc("model_hedges", result="won")
+                    with self._lock:
+                        self.hedges_won += 1
+                return result, name
+        return None
+
+    # --- Metrics ---
+    def stats(self):
+        with self._lock:
+            return {
+                "models": {name: h.snapshot() for name, h in self.models.items()},
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+                "last_decision": self.last_decision,
+            }
+
+    def format_stats(self):
+        parts = []
+        for name, s in self.stats()["models"].items():
+            latency = f"{s['latency_ewma_s']:.2f}s" if s["latency_ewma_s"] is not None else "-"
+            parts.append(f"{name}[{s['state']} {latency} err {s['error_rate']:.0%} 429x{s['rate_limited']}]")
+        return " ".join(parts)
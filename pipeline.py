@@ -0,0 +1,258 @@
+import cv2
+import time
+import threading
+from collections import deque
+from scene_gate import SceneChangeGate
+from capture import FrameGrabber, display_available
+from metrics import metrics, span
+
+# 1. ANALYSIS PIPELINE
+class AnalysisPipeline:
+    """
+    Capture -> analysis hand-off.
+    The capture loop pushes frames into a small bounded queue (the OLDEST frame is
+    dropped when it is full) and worker threads run the slow Gemini analysis, so
+    the video loop never waits on the network.
+
+    With batch_size > 1 a worker collects up to `batch_size` jobs (waiting at most
+    `max_wait` seconds after the first one) and calls analyze_fn ONCE with the
+    list of job argument tuples.
+    """
+    def __init__(self, analyze_fn, workers=1, max_queue=2, name="analysis", batch_size=1, max_wait=0.0):
+        self.analyze_fn = analyze_fn
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.max_queue = max(1, max_queue, self.batch_size)
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._running = True
+
+        # Counters (read them through stats())
+        self.submitted = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=2048)   # submit -> analysis finished, seconds
+
+        self._threads = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, *args):
+        """Queue one analysis job. Never blocks; returns False if an older job was dropped."""
+        with self._cond:
+            dropped = False
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+                dropped = True
+                metrics.inc("frames_dropped")
+            self._queue.append((time.perf_counter(), args))
+            self.submitted += 1
+            self._cond.notify()
+        return not dropped
+
+    def _take_batch(self):
+        """Called with the lock held and at least one job queued."""
+        if self.batch_size == 1:
+            return [self._queue.popleft()]
+        deadline = time.monotonic() + self.max_wait
+        while self._running and len(self._queue) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+        return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                jobs = self._take_batch()
+                if not jobs:
+                    continue
+                self.in_flight += len(jobs)
+
+            started = time.perf_counter()
+            for queued_at, _ in jobs:
+                metrics.observe("queue_wait", started - queued_at)
+            try:
+                if self.batch_size == 1:
+                    self.analyze_fn(*jobs[0][1])
+                else:
+                    self.analyze_fn([args for _, args in jobs])
+            except Exception as e:
+                print(f"❌ Worker Error: {e}")
+                metrics.inc("analysis_errors", stage="worker")
+                with self._cond:
+                    self.failed += len(jobs)
+            else:
+                # Only finished analyses count as processed (failures are in `failed`)
+                done = time.perf_counter()
+                metrics.inc("frames_analyzed", len(jobs))
+                with self._cond:
+                    self.processed += len(jobs)
+                    self.latencies.extend(done - queued_at for queued_at, _ in jobs)
+            finally:
+                metrics.observe("analysis", time.perf_counter() - started)
+                with self._cond:
+                    self.in_flight -= len(jobs)
+                    self.batches += 1
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def latency_percentiles(self):
+        with self._cond:
+            values = sorted(self.latencies)
+        if not values:
+            return {"p50": None, "p95": None, "p99": None}
+        pick = lambda p: round(values[min(len(values) - 1, int(p / 100 * len(values)))], 4)
+        return {"p50": pick(50), "p95": pick(95), "p99": pick(99)}
+
+    def stats(self):
+        latency = self.latency_percentiles()
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "queue_max": self.max_queue,
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "latency_s": latency,
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        return f"queue {s['queue_depth']}/{s['queue_max']} | busy {s['in_flight']} | dropped {s['dropped']} | done {s['processed']}"
+
+    def stop(self, wait=True, timeout=5.0):
+        """Stops the workers once the queue is drained."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join(timeout)
+
+# 2. CAPTURE / DISPLAY LOOP
+def run_stream(video_source, analyze_fn, interval, window_title="Factory Sentinel - Live", workers=1, max_queue=2, gate=None, batch_size=1, max_wait=0.0,
+               headless=False, duration=None, detector=None, preview_fps=15.0, detect_fps=5.0):
+    """
+    Shared video loop for all sentinel scripts.
+    A FrameGrabber thread keeps the source drained with grab() only; this loop wakes
+    every `interval` seconds, decodes just the latest frame, checks it with the
+    scene-change gate and, if the scene moved (or the last verdict is too old),
+    hands it to the pipeline. The display keeps running while the workers talk to Gemini.
+    Pass SceneChangeGate(threshold=0) to send every sample like before.
+    With batch_size > 1, analyze_fn receives a list of (frame,) jobs.
+    headless=True skips every GUI call (forced when there is no display); the preview
+    otherwise decodes `preview_fps` frames a second. duration (seconds) stops the loop
+    and waits for queued analyses to finish (used by the benchmark).
+    detector (detector.DetectorCascade) checks `detect_fps` frames a second in front of
+    the gate: a due sample only goes out once a person / moving machinery shows up in
+    its zones, and with crop enabled only the detection box is uploaded.
+    """
+    if not headless and not display_available():
+        print("🖥️ No display found - running headless")
+        headless = True
+
+    print(f"🎥 Starting Video Feed: {video_source}")
+    grabber = FrameGrabber(video_source)
+    pipeline = AnalysisPipeline(analyze_fn, workers=workers, max_queue=max_queue, batch_size=batch_size, max_wait=max_wait)
+    gate = gate or SceneChangeGate()
+    last_analysis_time = 0
+    decoded = 0
+    started = time.time()
+
+    # Only decode as often as someone needs pixels
+    tick = interval
+    if detector is not None:
+        tick = min(tick, 1.0 / detect_fps)
+    if not headless:
+        tick = min(tick, 1.0 / preview_fps)
+    grabber.wait_ready()
+
+    try:
+        while duration is None or time.time() - started < duration:
+            tick_start = time.time()
+            frame = grabber.retrieve()
+            if frame is None:
+                if grabber.finished:
+                    break
+                time.sleep(min(tick, 0.5))
+                continue
+            decoded += 1
+
+            # Measured from the tick start so a tick of exactly `interval` is always due
+            due = tick_start - last_analysis_time >= interval
+            detection = None
+            if detector is not None:
+                with span("detect"):
+                    detection = detector.check(frame, people=due)
+                if due and not detection.escalate:
+                    # Empty floor: no call, keep checking until something shows up
+                    due = False
+                    metrics.inc("frames_skipped", reason="idle")
+
+            if due:
+                last_analysis_time = tick_start
+                with span("gate"):
+                    changed = gate.should_analyze(frame, now=last_analysis_time)
+                metrics.set_gauge("queue_depth", pipeline.queue_depth())
+                if changed:
+                    found = f", {detection.reason}" if detection else ""
+                    print(f"📸 Scanning ({gate.last_reason}{found}, diff {gate.last_score:.1f})... ({pipeline.format_stats()})")
+                    pipeline.submit((detection.crop(frame) if detection else frame).copy())
+                else:
+                    metrics.inc("frames_skipped", reason="unchanged")
+                    print(f"💤 Scene unchanged (diff {gate.last_score:.1f}) - skipped, {gate.skipped} calls saved")
+
+            remaining = tick - (time.time() - tick_start)
+            if headless:
+                if remaining > 0:
+                    time.sleep(remaining)
+                continue
+
+            # The grabber caches the decoded frame: draw on a copy
+            view = frame.copy()
+            if detection is not None:
+                for x, y, w, h in detection.boxes:
+                    cv2.rectangle(view, (x, y), (x + w, y + h), (0, 200, 255), 2)
+            cv2.putText(view, f"{pipeline.format_stats()} | saved {gate.skipped}", (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            cv2.imshow(window_title, view)
+
+            if cv2.waitKey(max(1, int(remaining * 1000))) & 0xFF == ord('q'):
+                break
+    finally:
+        elapsed = time.time() - started
+        pipeline.stop(wait=duration is not None, timeout=30.0)
+        grabber.stop()
+        if not headless:
+            cv2.destroyAllWindows()
+        g = gate.stats()
+        print(f"📉 Scene gate: {g['sent']} analyzed, {g['saved']} API calls saved out of {g['checks']} samples")
+        c = grabber.stats()
+        print(f"🎞️ Capture: {c['grabbed']} frames grabbed, {c['decoded']} decoded, {c['reconnects']} reconnects")
+
+    stats = pipeline.stats()
+    stats["gate"] = gate.stats()
+    if detector is not None:
+        stats["detector"] = detector.stats()
+    stats["capture"] = grabber.stats()
+    stats["frames"] = grabber.grabbed
+    stats["decoded"] = decoded
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["capture_fps"] = round(grabber.grabbed / elapsed, 2) if elapsed > 0 else 0.0
+    return stats
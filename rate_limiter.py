@@ -0,0 +1,254 @@
+import re
+import time
+import heapq
+import random
+import threading
+
+# 1. TOKEN BUCKET
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holds at most `capacity`."""
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, n=1):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= n:
+                self._tokens -= n
+                return True
+            return False
+
+    def take(self, n=1):
+        """Takes `n` tokens without waiting. The balance may go negative: the debt delays later callers."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= n
+
+    def wait_time(self, n=1):
+        """Seconds until `n` tokens are available."""
+        with self._lock:
+            self._refill(time.monotonic())
+            missing = n - self._tokens
+            if missing <= 0:
+                return 0.0
+            return missing / self.rate if self.rate > 0 else float("inf")
+
+    def acquire(self, n=1, timeout=None):
+        """Blocks until `n` tokens are taken. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.try_acquire(n):
+                return True
+            wait = self.wait_time(n)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(max(0.01, wait))
+
+# 2. MULTI-CAMERA BUDGET
+class CameraBudget:
+    """
+    Global requests-per-minute budget split evenly across cameras.
+    Each camera gets its own bucket of rpm / N, so one busy camera can never
+    starve the others of Gemini calls.
+    Samples only check ready(camera, 1 / batch_size) and every request actually
+    sent is booked with charge(), split across its cameras, so verdict-cache hits
+    cost nothing.
+    """
+    def __init__(self, rpm, camera_ids, burst=1):
+        self.rpm = rpm
+        share = rpm / max(1, len(camera_ids))
+        self.buckets = {cid: TokenBucket(share / 60.0, burst) for cid in camera_ids}
+        self.granted = {cid: 0 for cid in camera_ids}
+        self.denied = {cid: 0 for cid in camera_ids}
+
+    def ready(self, camera_id, n=1):
+        """True if the camera could spend `n` calls right now (does not consume them)."""
+        if self.buckets[camera_id].wait_time(n) == 0:
+            return True
+        self.denied[camera_id] += 1
+        return False
+
+    def try_acquire(self, camera_id):
+        if self.buckets[camera_id].try_acquire():
+            self.granted[camera_id] += 1
+            return True
+        self.denied[camera_id] += 1
+        return False
+
+    def charge(self, camera_ids):
+        """Books ONE request carrying frames of these cameras; each camera pays its share of it."""
+        camera_ids = list(camera_ids)
+        for cid in camera_ids:
+            self.buckets[cid].take(1.0 / len(camera_ids))
+            self.granted[cid] += 1
+
+    def stats(self):
+        return {
+            cid: {"granted": self.granted[cid], "denied": self.denied[cid], "rpm_share": round(self.rpm / len(self.buckets), 2)}
+            for cid in self.buckets
+        }
+
+# 3. PRIORITY GATE + QUOTA-AWARE BACKOFF FOR GEMINI CALLS
+PRIORITY_URGENT = 0     # re-checks of a camera that just reported DANGER
+PRIORITY_ROUTINE = 1    # normal SAFE polling
+PRIORITY_BACKGROUND = 2 # probes, warm-ups
+
+RETRY_HINT = re.compile(r"retry(?:[ _-]?delay)?['\"]?\s*(?:in|[:=])\s*['\"]?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+def retry_after_hint(error):
+    """Seconds the server asked us to wait (Retry-After header or 'retryDelay': '12s' in the body), else None."""
+    if getattr(error, "retry_after", None) is not None:
+        return float(error.retry_after)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            return float(headers.get("retry-after") or headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+    match = RETRY_HINT.search(str(error))
+    return float(match.group(1)) if match else None
+
+def is_retryable(error):
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    text = str(error)
+    return code in (429, 500, 503) or any(s in text for s in ("429", "RESOURCE_EXHAUSTED", "503", "UNAVAILABLE"))
+
+class RateLimitedModels:
+    """
+    Drop-in wrapper for `client.models` that every Gemini request goes through.
+    - Token buckets sized to the RPM (and optionally TPM) quota.
+    - Waiting callers are served by priority, then arrival order, so a DANGER
+      re-check jumps ahead of routine SAFE polls.
+    - 429 / 5xx errors are retried with jittered exponential backoff. A Retry-After
+      hint is honoured and pauses ALL callers, not just the one that got it.
+    Pass priority=... to generate_content(); it is not forwarded to the SDK.
+    """
+    def __init__(self, models, rpm=15, tpm=None, tokens_per_request=600, max_retries=3,
+                 base_delay=1.0, max_delay=60.0, sleep=time.sleep, clock=time.monotonic):
+        self._models = models
+        self.requests = TokenBucket(rpm / 60.0, max(1, int(rpm // 10) or 1))
+        self.tokens = TokenBucket(tpm / 60.0, tpm / 6.0) if tpm else None
+        self.tokens_per_request = tokens_per_request
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._clock = clock
+
+        self._cond = threading.Condition()
+        self._waiting = []          # heap of (priority, ticket)
+        self._ticket = 0
+        self._paused_until = 0.0
+
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.waited_s = 0.0
+        self.by_priority = {}
+
+    def set_rpm(self, rpm):
+        """Resizes the request bucket (e.g. a supervisor started with --rpm)."""
+        with self._cond:
+            self.requests = TokenBucket(rpm / 60.0, max(1, int(rpm // 10) or 1))
+            self._cond.notify_all()
+
+    def __getattr__(self, name):
+        # list(), get(), ... go straight to the SDK
+        return getattr(self._models, name)
+
+    def _acquire(self, priority):
+        started = self._clock()
+        with self._cond:
+            ticket = (priority, self._ticket)
+            self._ticket += 1
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] == ticket:
+                        wait = self._paused_until - self._clock()
+                        if wait <= 0:
+                            wait = self.requests.wait_time()
+                            if self.tokens is not None:
+                                wait = max(wait, self.tokens.wait_time(self.tokens_per_request))
+                            if wait <= 0 and self.requests.try_acquire():
+                                if self.tokens is not None:
+                                    self.tokens.try_acquire(self.tokens_per_request)
+                                break
+                        self._cond.wait(max(0.01, min(wait, 1.0)))
+                    else:
+                        self._cond.wait(1.0)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+        self.waited_s += self._clock() - started
+
+    def pause(self, seconds):
+        """Stops every caller for `seconds` (used when the server says we're over quota)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+            self._cond.notify_all()
+
+    def generate_content(self, *args, priority=PRIORITY_ROUTINE, **kwargs):
+        self.by_priority[priority] = self.by_priority.get(priority, 0) + 1
+        attempt = 0
+        while True:
+            self._acquire(priority)
+            self.calls += 1
+            try:
+                return self._models.generate_content(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    self.failures += 1
+                    raise
+                hint = retry_after_hint(e)
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                delay = delay * random.uniform(0.5, 1.0)    # jitter: cameras don't retry in lockstep
+                if hint is not None:
+                    delay = max(delay, hint)
+                if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e) or getattr(e, "code", None) == 429:
+                    # Pause before giving up too: the other cameras must hold off even if this caller won't retry
+                    self.rate_limited += 1
+                    self.pause(delay)
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                attempt += 1
+                print(f"⏳ Gemini busy ({str(e)[:60]}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                self._sleep(delay)
+
+    def stats(self):
+        with self._cond:
+            waiting = len(self._waiting)
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "waiting": waiting,
+            "waited_s": round(self.waited_s, 2),
+            "by_priority": dict(self.by_priority),
+        }
+
+class RateLimitedClient:
+    """Wraps a genai.Client (or the fake one) so `client.models.generate_content` is rate limited."""
+    def __init__(self, client, **limits):
+        self._client = client
+        self.models = RateLimitedModels(client.models, **limits)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
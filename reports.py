@@ -0,0 +1,171 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fpdf import FPDF
+
+# --- PDF GENERATOR (FIXED FOR TEXT WRAPPING) ---
+class PDF(FPDF):
+    def header(self):
+        self.set_font('Arial', 'B', 16)
+        self.cell(0, 10, 'Factory Sentinel - Full Incident Report', 0, 1, 'C')
+        self.ln(10)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+def generate_pdf(report_data):
+    # This is for single reports (from button)
+    # We wrap this in a list to use the same logic as the full report
+    return generate_full_report([report_data] if isinstance(report_data, dict) else report_data)
+
+def describe_filters(filters):
+    parts = []
+    if filters.get("start") or filters.get("end"):
+        parts.append(f"{filters.get('start') or '...'} to {filters.get('end') or '...'}")
+    if filters.get("camera"):
+        parts.append(f"camera {filters['camera']}")
+    if filters.get("search"):
+        parts.append(f"issue contains '{filters['search']}'")
+    return ", ".join(parts) or "all incidents"
+
+def generate_full_report(history_data=None, store=None, filters=None, max_pages=None, chunk_size=500, notes=None):
+    """
+    Renders the incident table. Either pass `history_data` (a list) or a `store`,
+    in which case incidents are streamed `chunk_size` rows at a time using the
+    store's filters (start, end, camera, search). Rendering stops once the PDF
+    reaches `max_pages`. `notes` are extra summary lines printed above the table.
+    """
+    filters = filters or {}
+    pdf = PDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+
+    # Meta Data
+    pdf.cell(0, 10, f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 0, 1)
+    pdf.cell(0, 10, f"Location: {filters.get('camera') or 'All cameras'}", 0, 1)
+    pdf.cell(0, 10, f"Filter: {describe_filters(filters)}", 0, 1)
+    for note in notes or []:
+        pdf.multi_cell(0, 8, note.encode('latin-1', 'replace').decode('latin-1'))
+    pdf.ln(5)
+
+    # Table Header
+    pdf.set_fill_color(200, 220, 255)
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(45, 10, "Time", 1, 0, 'C', 1)
+    pdf.cell(35, 10, "Camera", 1, 0, 'C', 1)
+    pdf.cell(110, 10, "Violation Detected", 1, 1, 'C', 1)
+
+    # Table Content
+    pdf.set_font("Arial", size=10)
+
+    if history_data is not None:
+        chunks = [history_data]
+    elif store is not None:
+        chunks = store.iter_chunks(chunk_size=chunk_size, **filters)
+    else:
+        chunks = []
+
+    rows = 0
+    truncated = False
+    for chunk in chunks:
+        for item in chunk:
+            timestamp = str(item.get('timestamp', item.get('Time', 'N/A')))
+            camera = str(item.get('location', 'Camera-01'))
+            issue = str(item.get('issue', item.get('Violation', 'Unknown Issue')))
+            # Aggregated incidents: how long it lasted and how sure the model got
+            if item.get('ended_at') and item['ended_at'] != timestamp:
+                issue += f" (until {str(item['ended_at'])[-8:]}"
+                issue += f", peak {item['peak_confidence']:.0f}%)" if item.get('peak_confidence') is not None else ")"
+            if item.get('state') == 'open':
+                issue += " [ONGOING]"
+            # Core PDF fonts are latin-1 only
+            issue = issue.encode('latin-1', 'replace').decode('latin-1')
+
+            # --- LOGIC FOR TEXT WRAPPING ---
+            # 1. Save current cursor position (Top-Left of the row)
+            x_start = pdf.get_x()
+            y_start = pdf.get_y()
+
+            # 2. Check for page break
+            if y_start > 270: # If near bottom of A4 page
+                if max_pages and pdf.page_no() >= max_pages:
+                    truncated = True
+                    break
+                pdf.add_page()
+                y_start = pdf.get_y()
+                x_start = pdf.get_x()
+
+            # 3. Print the "Violation" cell FIRST using MultiCell to measure its height
+            # We move the cursor to the right to print the other columns afterwards
+            pdf.set_xy(x_start + 80, y_start)
+            pdf.multi_cell(110, 10, issue, 1, 'L')
+
+            # 4. Get the new Y position (Bottom of the row)
+            y_end = pdf.get_y()
+            row_height = y_end - y_start
+
+            # 5. Move cursor BACK to the start to print the "Time" and "Camera" cells
+            pdf.set_xy(x_start, y_start)
+            pdf.cell(45, row_height, timestamp, 1, 0, 'C') # Use row_height so borders match
+            pdf.cell(35, row_height, camera, 1, 0, 'C')
+
+            # 6. Move cursor to the next line for the next loop
+            pdf.set_xy(x_start, y_end)
+            rows += 1
+        if truncated:
+            break
+
+    if truncated:
+        pdf.set_font("Arial", 'I', 10)
+        pdf.cell(190, 10, f"Report truncated at {max_pages} pages ({rows} incidents shown). Narrow the filters for more.", 0, 1, 'C')
+    elif not rows:
+        pdf.cell(190, 10, "No incidents recorded.", 1, 1, 'C')
+
+    return pdf.output(dest='S').encode('latin-1')
+
+# --- BACKGROUND REPORT SERVICE ---
+class ReportService:
+    """
+    Builds PDFs on a worker thread so the Streamlit script never blocks on them.
+    Finished reports are cached by (filters, max_pages, store version): the same
+    download twice is instant, and any new or updated incident invalidates it naturally.
+    """
+    def __init__(self, store, workers=1, max_cached=8):
+        self.store = store
+        self.max_cached = max_cached
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, filters, max_pages=None):
+        clean = tuple(sorted((k, v) for k, v in filters.items() if v))
+        return (clean, max_pages, self.store.version())
+
+    def request(self, filters, max_pages=None):
+        """Starts (or reuses) a render. Returns the cache key to poll with result()."""
+        key = self.key(filters, max_pages)
+        with self._lock:
+            if key not in self._futures:
+                self._futures[key] = self._executor.submit(
+                    generate_full_report, store=self.store, filters=dict(key[0]), max_pages=max_pages
+                )
+            self._futures.move_to_end(key)
+            while len(self._futures) > self.max_cached:
+                self._futures.popitem(last=False)
+        return key
+
+    def result(self, key):
+        """PDF bytes once ready, None while rendering. Raises if the render failed."""
+        with self._lock:
+            future = self._futures.get(key)
+        if future is None or not future.done():
+            return None
+        return future.result()
+
+    def is_pending(self, key):
+        with self._lock:
+            future = self._futures.get(key)
+        return future is not None and not future.done()
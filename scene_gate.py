@@ -0,0 +1,72 @@
+import cv2
+import time
+
+# SCENE-CHANGE GATE
+class SceneChangeGate:
+    """
+    Cheap local check that runs before analyze_frame.
+    Frames are shrunk to a tiny blurred grayscale thumbnail and compared with the
+    thumbnail of the LAST frame we actually sent to Gemini. We only spend an API
+    call when the mean pixel difference crosses `threshold` (0-255 scale), or when
+    the last verdict is older than `max_staleness` seconds (safety net).
+    """
+    def __init__(self, threshold=8.0, max_staleness=60.0, size=(64, 48)):
+        self.threshold = threshold
+        self.max_staleness = max_staleness
+        self.size = size
+
+        self._reference = None
+        self._last_sent_time = 0
+
+        self.checks = 0
+        self.sent = 0
+        self.skipped = 0
+        self.last_score = 0.0
+        self.last_reason = None
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def score(self, frame):
+        """Mean absolute difference against the last analyzed frame (255 if there is none)."""
+        if self._reference is None:
+            return 255.0
+        return float(cv2.absdiff(self._thumbnail(frame), self._reference).mean())
+
+    def should_analyze(self, frame, now=None):
+        now = time.time() if now is None else now
+        thumb = self._thumbnail(frame)
+        self.checks += 1
+
+        if self._reference is None:
+            self.last_score, reason = 255.0, "first frame"
+        else:
+            self.last_score = float(cv2.absdiff(thumb, self._reference).mean())
+            if self.last_score >= self.threshold:
+                reason = "scene changed"
+            elif now - self._last_sent_time >= self.max_staleness:
+                reason = "max staleness"
+            else:
+                reason = None
+
+        self.last_reason = reason
+        if reason is None:
+            self.skipped += 1
+            return False
+
+        self._reference = thumb
+        self._last_sent_time = now
+        self.sent += 1
+        return True
+
+    def stats(self):
+        return {
+            "checks": self.checks,
+            "sent": self.sent,
+            "saved": self.skipped,
+            "last_score": round(self.last_score, 2),
+            "last_reason": self.last_reason,
+        }
@@ -0,0 +1,139 @@
+import time
+import heapq
+import threading
+from metrics import metrics
+
+PRIORITY_DANGER = 0
+PRIORITY_INFO = 1
+
+# SPEECH WORKER
+class SpeechWorker:
+    """
+    One long-lived thread that owns the ONLY pyttsx3 engine.
+    Alerts go into a small priority queue (lower number = spoken first). The same
+    message is collapsed if it was already queued/spoken within `dedupe_window`
+    seconds, and alerts older than `max_age` when their turn comes are dropped
+    instead of being read out late.
+    """
+    def __init__(self, rate=150, max_queue=10, dedupe_window=30.0, max_age=15.0):
+        self.rate = rate
+        self.max_queue = max_queue
+        self.dedupe_window = dedupe_window
+        self.max_age = max_age
+
+        self._heap = []
+        self._seq = 0
+        self._recent = {}
+        self._cond = threading.Condition()
+
+        self.queued = 0
+        self.spoken = 0
+        self.deduped = 0
+        self.dropped_full = 0
+        self.dropped_stale = 0
+        self.errors = 0
+        self.last_latency = 0.0     # enqueue -> start speaking
+        self.avg_latency = 0.0
+        self.last_duration = 0.0    # time spent speaking
+
+        self._thread = threading.Thread(target=self._run, name="speech", daemon=True)
+        self._thread.start()
+
+    def say(self, text, priority=PRIORITY_DANGER):
+        """Queues an alert. Never blocks; returns False if it was collapsed or rejected."""
+        key = " ".join(text.lower().split())
+        now = time.monotonic()
+        with self._cond:
+            last = self._recent.get(key)
+            if last is not None and now - last < self.dedupe_window:
+                self.deduped += 1
+                return False
+
+            if len(self._heap) >= self.max_queue:
+                # Full: evict the least important, newest entry, unless the new one is even less important
+                worst = max(self._heap)
+                if (priority, self._seq) > worst[:2]:
+                    self.dropped_full += 1
+                    return False
+                self._heap.remove(worst)
+                heapq.heapify(self._heap)
+                self.dropped_full += 1
+
+            self._recent[key] = now
+            if len(self._recent) > 256:
+                self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedupe_window}
+
+            heapq.heappush(self._heap, (priority, self._seq, now, text))
+            self._seq += 1
+            self.queued += 1
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        try:
+            # The engine must be created on the thread that uses it
+            import pyttsx3
+            engine = pyttsx3.init()
+            engine.setProperty('rate', self.rate)
+        except Exception as e:
+            print(f"⚠️ Speech disabled: {e}")
+            engine = None
+
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                priority, _, queued_at, text = heapq.heappop(self._heap)
+
+            waited = time.monotonic() - queued_at
+            if waited > self.max_age:
+                self.dropped_stale += 1
+                metrics.inc("speech_dropped", reason="stale")
+                continue
+            if engine is None:
+                continue
+
+            self.last_latency = waited
+            self.avg_latency = waited if self.spoken == 0 else 0.8 * self.avg_latency + 0.2 * waited
+            started = time.monotonic()
+            try:
+                engine.say(text)
+                engine.runAndWait()
+                self.spoken += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ Speech error: {e}")
+            self.last_duration = time.monotonic() - started
+            metrics.observe("tts", self.last_duration)
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._heap)
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth(),
+            "queued": self.queued,
+            "spoken": self.spoken,
+            "deduped": self.deduped,
+            "dropped_full": self.dropped_full,
+            "dropped_stale": self.dropped_stale,
+            "errors": self.errors,
+            "last_latency_s": round(self.last_latency, 3),
+            "avg_latency_s": round(self.avg_latency, 3),
+            "last_duration_s": round(self.last_duration, 3),
+        }
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_speech_worker():
+    """Process-wide worker, shared by every camera / script."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = SpeechWorker()
+        return _worker
+
+def speak_warning(text, priority=PRIORITY_DANGER):
+    return get_speech_worker().say(f"Alert! {text}", priority)
@@ -1,12 +1,17 @@
-import cv2
-import time
-import json
 import os
-import pyttsx3
-import threading
+import argparse
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from pipeline import run_stream
+from rate_limiter import RateLimitedClient
+from speech import speak_warning
+from frame_channel import FramePublisher, WRITE_FILES
+from frame_encoder import FrameEncoder
+from timeseries import TimeSeriesStore
+from model_router import ModelRouter, AllModelsFailed
+from verdict import PROMPT, VerdictParseError, generation_config, parse_verdict
+from metrics import span, start_exporter
 
 # 1. FORCE RELOAD .ENV (The Fix for "Zombie Keys")
 # override=True ensures we actually use the new key in the file
@@ -24,22 +29,12 @@ if api_key[-4:] != "e3LQ":
     print("⚠️ WARNING: This does NOT match your new key (e3LQ)!")
     print("👉 Action: Check your .env file again.")
 
-client = genai.Client(api_key=api_key)
-
-# 3. AUDIO SETUP
-engine = pyttsx3.init()
-engine.setProperty('rate', 150)
-
-def speak_warning(text):
-    def run_speech():
-        try:
-            local_engine = pyttsx3.init()
-            local_engine.say(f"Alert! {text}")
-            local_engine.runAndWait()
-        except:
-            pass
-    t = threading.Thread(target=run_speech)
-    t.start()
+# Every Gemini call goes through one token bucket (GEMINI_RPM); no retries here,
+# the model router fails over to the next model instead
+client = RateLimitedClient(genai.Client(api_key=api_key), rpm=float(os.getenv("GEMINI_RPM", "15")), max_retries=0)
+publisher = FramePublisher(write_files=WRITE_FILES)
+encoder = FrameEncoder()
+timeseries = TimeSeriesStore()
 
 # --- SMART MODEL MANAGER ---
 # Updated with EXACT OFFICIAL NAMES to fix 404 errors
@@ -48,84 +43,75 @@ MODELS_TO_TRY = [
     "gemini-1.5-flash-001",       # <--- FIXED NAME (The reliable backup)
     "gemini-1.5-pro-001"          # <--- FIXED NAME (High intelligence backup)
 ]
-current_model_index = 0
 
-def analyze_frame(frame):
-    global current_model_index
-    
-    # Resize to 640x480
-    frame_resized = cv2.resize(frame, (640, 480))
-    _, buffer = cv2.imencode('.jpg', frame_resized)
-    image_bytes = buffer.tobytes()
-    
-    prompt = "You are a Factory Safety Officer. Analyze this image. Return ONLY JSON: {'status': 'SAFE'/'DANGER', 'issue': 'short description', 'confidence': 0-100}"
-
-    for attempt in range(len(MODELS_TO_TRY)):
-        model_name = MODELS_TO_TRY[current_model_index]
-        
-        try:
-            print(f"🔄 Attempting with model: {model_name}...")
-            
-            response = client.models.generate_content(
-                model=model_name, 
-                contents=[
-                    types.Content(
-                        role="user",
-                        parts=[
-                            types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
-                            types.Part.from_text(text=prompt)
-                        ]
-                    )
-                ]
-            )
-            
-            # SUCCESS!
-            text_data = response.text.replace("```json", "").replace("```", "").strip()
-            print(f"✅ GEMINI SAYS: {text_data}")
-
-            try:
-                data = json.loads(text_data)
-                if data.get("status") == "DANGER":
-                    print(f"🔊 SPEAKING: {data.get('issue')}")
-                    speak_warning(f"Violation detected. {data.get('issue')}")
-            except:
-                pass
-
-            with open("status.json", "w") as f:
-                f.write(text_data)
-            cv2.imwrite("current_frame.jpg", frame_resized)
-            return 
-
-        except Exception as e:
-            print(f"⚠️ Error with {model_name}: {e}")
-            # Switch to next model immediately
-            current_model_index = (current_model_index + 1) % len(MODELS_TO_TRY)
-
-def start_stream(video_source):
-    cap = cv2.VideoCapture(video_source)
-    print(f"✅ Processing: {video_source}")
-    print("------------------------------------------------")
-    
-    last_analysis_time = 0
-    analysis_interval = 15.0 
+# Fastest healthy model wins; failing models are benched by a circuit breaker
+# and probed again after a cooldown. Set MODEL_HEDGE_AFTER (seconds) to race a
+# backup model when the primary is slow.
+hedge_after = os.getenv("MODEL_HEDGE_AFTER")
+router = ModelRouter(MODELS_TO_TRY, hedge_after=float(hedge_after) if hedge_after else None)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            continue
+# JSON mode + verdict schema (every model in MODELS_TO_TRY supports it)
+verdict_config = generation_config(max_tokens=os.getenv("VERDICT_MAX_TOKENS"))
 
-        cv2.imshow('Factory Sentinel - Live', frame)
-
-        if time.time() - last_analysis_time >= analysis_interval:
-            analyze_frame(frame)
-            last_analysis_time = time.time()
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+def analyze_frame(frame):
+    # Aspect-preserving resize + one JPEG encode, reused for upload and dashboard
+    frame_resized, image_bytes = encoder.prepare(frame)
+    
+    def ask(model_name):
+        print(f"🔄 Attempting with model: {model_name}...")
+        return client.models.generate_content(
+            model=model_name, 
+            contents=[
+                types.Content(
+                    role="user",
+                    parts=[
+                        types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
+                        types.Part.from_text(text=PROMPT)
+                    ]
+                )
+            ],
+            config=verdict_config,
+        )
+
+    try:
+        # Covers failover and hedging: the time until SOME model answered
+        with span("gemini_call"):
+            response, model_name = router.call(ask)
+    except AllModelsFailed as e:
+        print(f"⚠️ No model answered: {e}")
+        print(f"📊 Router: {router.format_stats()}")
+        return
+
+    # SUCCESS! Parse before publishing so a garbled answer can't overwrite the status
+    print(f"📊 Router: {router.format_stats()}")
+    try:
+        with span("parse"):
+            verdict = parse_verdict(response.text)
+    except VerdictParseError as e:
+        print(f"⚠️ Unusable answer from {model_name}, status left unchanged: {e}")
+        return
+    print(f"✅ GEMINI SAYS ({model_name}): {verdict.to_json()}")
+
+    # Atomic hand-off to the dashboard (reuses the JPEG we just uploaded)
+    publisher.publish(verdict.to_json(), image_bytes)
+    timeseries.record("Camera-01", verdict.confidence, verdict.status)
+
+    if verdict.is_danger:
+        print(f"🔊 SPEAKING: {verdict.issue}")
+        speak_warning(f"Violation detected. {verdict.issue}")
+
+def start_stream(video_source, headless=False):
+    # Analysis runs on a background worker; the video loop never waits on Gemini
+    # headless=True (or no display) runs without the preview window, e.g. on a server
+    return run_stream(video_source, analyze_frame, interval=15.0, window_title='Factory Sentinel - Live', headless=headless)
 
 if __name__ == "__main__":
-    start_stream("factory_sample.mp4")
+    parser = argparse.ArgumentParser(description="Watch one camera with the Gemini sentinel.")
+    # Use 0 for webcam, or filename / RTSP URL for video
+    parser.add_argument("source", nargs="?", default="factory_sample.mp4")
+    parser.add_argument("--headless", action="store_true", help="no preview window")
+    args = parser.parse_args()
+
+    # Per-stage timings: http://127.0.0.1:METRICS_PORT/metrics and METRICS_FILE (dashboard)
+    start_exporter()
+    start_stream(int(args.source) if args.source.isdigit() else args.source, headless=args.headless)
@@ -0,0 +1,219 @@
+import cv2
+import json
+import time
+import argparse
+import threading
+from functools import partial
+from pipeline import AnalysisPipeline
+from scene_gate import SceneChangeGate
+from rate_limiter import CameraBudget
+from speech import get_speech_worker
+from alerts import get_alert_dispatcher
+from metrics import metrics, span, start_exporter
+from detector import make_detector
+from capture import FrameGrabber, display_available
+
+# 1. SHARED SENTINEL
+# Importing the sentinel gives us ONE genai.Client, one SMS client and the
+# incident logging shared by every camera.
+import gemini3_launch as sentinel
+
+DEFAULT_RPM = 15          # Free-tier Gemini Flash budget
+DEFAULT_INTERVAL = 5.0    # Seconds between samples per camera
+DETECT_FPS = 5.0          # Decoded frames per second for the local detector
+
+# 2. CAMERA LIST
+def parse_source(source):
+    """'0' -> webcam index 0, anything else stays a path / URL."""
+    if isinstance(source, int):
+        return source
+    return int(source) if str(source).isdigit() else source
+
+def load_cameras(args):
+    """
+    Cameras come from a JSON file ([{"id": "Dock-2", "source": "dock.mp4", "interval": 5, "detector": "hog"}, ...])
+    or straight from the command line (python supervisor.py factory_sample.mp4 0).
+    """
+    if len(args) == 1 and str(args[0]).endswith(".json"):
+        with open(args[0], "r") as f:
+            entries = json.load(f)
+    else:
+        entries = [{"source": a} for a in (args or ["factory_sample.mp4"])]
+
+    cameras = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            entry = {"source": entry}
+        cameras.append({
+            "id": str(entry.get("id", f"Camera-{i + 1:02d}")),
+            "source": parse_source(entry["source"]),
+            "interval": float(entry.get("interval", DEFAULT_INTERVAL)),
+            "detector": entry.get("detector"),
+        })
+    return cameras
+
+# 3. ONE CAPTURE LOOP PER CAMERA
+class CameraLoop(threading.Thread):
+    """Samples one camera through a grab-only FrameGrabber and feeds the shared pipeline."""
+    def __init__(self, camera, pipeline, budget, stop_event, detector=None, batch_size=1):
+        super().__init__(name=f"capture-{camera['id']}", daemon=True)
+        self.camera = camera
+        self.camera_id = camera["id"]
+        self.pipeline = pipeline
+        self.budget = budget
+        self.stop_event = stop_event
+        self.gate = SceneChangeGate()
+        self.detector = detector
+        self.batch_size = batch_size
+        self.budget_skips = 0
+        self.grabber = None
+        self._last_analysis = 0
+
+    def latest_frame(self):
+        """Decoded on demand (preview only); None before the first frame arrives."""
+        return self.grabber.retrieve() if self.grabber is not None else None
+
+    def run(self):
+        source = self.camera["source"]
+        print(f"🎥 [{self.camera_id}] Starting Video Feed: {source}")
+        self.grabber = FrameGrabber(source, name=f"grab-{self.camera_id}")
+        # Decode once per sample, or DETECT_FPS times a second when the detector is on
+        tick = self.camera["interval"]
+        if self.detector is not None:
+            tick = min(tick, 1.0 / DETECT_FPS)
+        self.grabber.wait_ready()
+
+        while not self.stop_event.is_set():
+            tick_start = time.time()
+            frame = self.grabber.retrieve()
+            if frame is not None:
+                self.sample(frame, tick_start)
+            self.stop_event.wait(max(0.01, tick - (time.time() - tick_start)))
+
+        self.grabber.stop()
+
+    def sample(self, frame, now):
+        due = now - self._last_analysis >= self.camera["interval"]
+        detection = None
+        if self.detector is not None:
+            # The motion model sees every decoded frame; people are only searched for when a sample is due
+            with span("detect"):
+                detection = self.detector.check(frame, people=due)
+            if due and not detection.escalate:
+                metrics.inc("frames_skipped", reason="idle")
+                return
+        if not due:
+            return
+
+        self._last_analysis = now
+        # Check the budget first so a denied sample doesn't reset the gate's reference frame.
+        # The call is booked by the worker when a request actually goes out (verdict-cache
+        # hits are free); in batch mode a frame is 1/batch_size of a request
+        if not self.budget.ready(self.camera_id, 1.0 / self.batch_size):
+            self.budget_skips += 1
+            metrics.inc("frames_skipped", reason="budget")
+            print(f"⏳ [{self.camera_id}] RPM share used up - skipping sample")
+            return
+        with span("gate"):
+            changed = self.gate.should_analyze(frame, now=now)
+        metrics.set_gauge("queue_depth", self.pipeline.queue_depth())
+        if not changed:
+            metrics.inc("frames_skipped", reason="unchanged")
+            return
+        print(f"📸 [{self.camera_id}] Scanning ({self.gate.last_reason})... ({self.pipeline.format_stats()})")
+        self.pipeline.submit((detection.crop(frame) if detection else frame).copy(), self.camera_id)
+
+    def stats(self):
+        s = self.gate.stats()
+        s["budget_skips"] = self.budget_skips
+        if self.detector is not None:
+            s["detector"] = self.detector.stats()
+        if self.grabber is not None:
+            s["capture"] = self.grabber.stats()
+        return s
+
+# 4. SUPERVISOR
+def run_supervisor(cameras, rpm=DEFAULT_RPM, workers=None, headless=False, batch_size=1, max_wait=2.0, detector=None, crop=False):
+    ids = [c["id"] for c in cameras]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Duplicate camera IDs: {ids}")
+
+    if not headless and not display_available():
+        print("🖥️ No display found - running headless")
+        headless = True
+    workers = workers or min(4, len(cameras))
+    # --rpm is THE limit: resize the sentinel's shared request limiter to match
+    sentinel.client.models.set_rpm(rpm)
+    budget = CameraBudget(rpm, ids)
+    if batch_size > 1:
+        # Frames from several cameras share one multi-image Gemini request, charged once
+        analyze = partial(sentinel.analyze_batch, charge=budget.charge)
+        pipeline = AnalysisPipeline(analyze, workers=workers, max_queue=max(len(cameras), batch_size), batch_size=batch_size, max_wait=max_wait)
+    else:
+        analyze = partial(sentinel.analyze_frame, charge=budget.charge)
+        pipeline = AnalysisPipeline(analyze, workers=workers, max_queue=len(cameras))
+    start_exporter()
+    stop_event = threading.Event()
+
+    loops = [CameraLoop(c, pipeline, budget, stop_event, make_detector(c.get("detector") or detector, c["id"], crop), batch_size) for c in cameras]
+    for loop in loops:
+        loop.start()
+
+    print(f"🛰️ Supervising {len(loops)} camera(s) | {workers} worker(s) | {rpm} RPM shared")
+    print("------------------------------------------------")
+
+    try:
+        # GUI calls must stay on the main thread
+        while any(loop.is_alive() for loop in loops):
+            if headless:
+                time.sleep(0.5)
+                continue
+            for loop in loops:
+                frame = loop.latest_frame()
+                if frame is None:
+                    continue
+                frame = frame.copy()
+                cv2.putText(frame, f"{loop.camera_id} | {pipeline.format_stats()}", (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+                cv2.imshow(f"Factory Sentinel - {loop.camera_id}", frame)
+            if cv2.waitKey(30) & 0xFF == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for loop in loops:
+            loop.join(timeout=2.0)
+        pipeline.stop(wait=False)
+        sentinel.incidents.close_all()
+        get_alert_dispatcher().flush(timeout=10.0)
+        sentinel.context.close()
+        if not headless:
+            cv2.destroyAllWindows()
+
+    summary = {
+        "pipeline": pipeline.stats(),
+        "budget": budget.stats(),
+        "speech": get_speech_worker().stats(),
+        "alerts": get_alert_dispatcher().stats(),
+        "context_cache": sentinel.context.stats(),
+        "incidents": sentinel.incidents.stats(),
+        "cameras": {l.camera_id: l.stats() for l in loops},
+        "stages": metrics.snapshot()["stages"],
+    }
+    print(f"📊 Summary: {json.dumps(summary)}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several cameras through one shared Gemini sentinel.")
+    parser.add_argument("cameras", nargs="*", help="cameras.json, or video files / device indices")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_RPM, help="global Gemini requests-per-minute budget")
+    parser.add_argument("--workers", type=int, default=None, help="analysis worker threads (default: one per camera, max 4)")
+    parser.add_argument("--headless", action="store_true", help="no preview windows")
+    parser.add_argument("--batch-size", type=int, default=1, help="frames per Gemini request (1 = no batching)")
+    parser.add_argument("--batch-wait", type=float, default=2.0, help="max seconds to wait for a batch to fill")
+    parser.add_argument("--detector", choices=["off", "motion", "hog", "dnn"], default="off", help="local first stage: only escalate frames with people / motion in the zones")
+    parser.add_argument("--detector-crop", action="store_true", help="upload only the detection box")
+    args = parser.parse_args()
+
+    run_supervisor(load_cameras(args.cameras), rpm=args.rpm, workers=args.workers, headless=args.headless,
+                   batch_size=args.batch_size, max_wait=args.batch_wait, detector=args.detector, crop=args.detector_crop)
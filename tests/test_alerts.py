@@ -0,0 +1,104 @@
+import pytest
+from alerts import Alert, AlertDispatcher, ChannelWorker, LogChannel, SmsChannel, format_alerts
+from fake_alerts import FakeSink
+
+class FlakySink(FakeSink):
+    """FakeSink that fails its first `failures` sends."""
+    def __init__(self, failures, **options):
+        super().__init__(**options)
+        self.failures = failures
+
+    def send(self, message, alerts):
+        if self.failures:
+            self.failures -= 1
+            self.attempts += 1
+            raise ConnectionError("provider down")
+        super().send(message, alerts)
+
+@pytest.fixture
+def workers():
+    started = []
+    yield started
+    for worker in started:
+        worker.stop()
+
+def test_failed_send_is_retried(workers):
+    sink = FlakySink(failures=2)
+    worker = ChannelWorker(sink, max_retries=3, backoff=0.01)
+    workers.append(worker)
+
+    worker.put(Alert("Dock-2", "No helmet"))
+    assert worker.flush(timeout=5.0)
+    assert sink.attempts == 3
+    assert len(sink.messages) == 1
+    assert worker.stats()["retries"] == 2
+    assert worker.stats()["delivered"] == 1
+
+def test_gives_up_after_max_retries(workers):
+    sink = FakeSink(fail_rate=1.0)
+    worker = ChannelWorker(sink, max_retries=2, backoff=0.01)
+    workers.append(worker)
+
+    worker.put(Alert("Dock-2", "No helmet"))
+    assert worker.flush(timeout=5.0)
+    assert sink.attempts == 3
+    assert sink.messages == []
+    assert worker.stats()["failed"] == 1
+
+def test_rate_limited_alerts_go_out_as_one_digest(workers):
+    sink = FakeSink(per_minute=60)   # one send per second
+    worker = ChannelWorker(sink)
+    workers.append(worker)
+
+    worker.put(Alert("Dock-2", "No helmet"))
+    assert worker.flush(timeout=5.0)
+    for camera, issue in [("Dock-2", "Blocked exit"), ("Press-1", "No gloves"), ("Press-1", "Guard open")]:
+        worker.put(Alert(camera, issue))
+    assert worker.flush(timeout=5.0)
+
+    assert [len(m["alerts"]) for m in sink.messages] == [1, 3]
+    assert sink.messages[1]["text"].startswith("🚨 FACTORY ALERT: 3 violations on 2 cameras")
+    assert worker.stats()["digests"] == 1
+
+def test_full_queue_drops_oldest(workers):
+    sink = FakeSink(per_minute=60)
+    worker = ChannelWorker(sink, max_queue=2)
+    workers.append(worker)
+
+    worker.put(Alert("Dock-2", "first"))
+    assert worker.flush(timeout=5.0)
+    for issue in ("a", "b", "c"):
+        worker.put(Alert("Dock-2", issue))
+    assert worker.flush(timeout=5.0)
+
+    digest = sink.messages[-1]
+    assert [a["issue"] for a in digest["alerts"]] == ["b", "c"]
+    assert "1 older alerts dropped" in digest["text"]
+    assert worker.stats()["dropped"] == 1
+
+def test_dispatcher_routes_by_kind():
+    class FakeTwilio:
+        class messages:
+            sent = []
+
+            @classmethod
+            def create(cls, body, from_, to):
+                cls.sent.append(body)
+
+    sink = FakeSink()
+    dispatcher = AlertDispatcher([SmsChannel(FakeTwilio, "+1", "+2", per_minute=0), sink])
+    try:
+        assert dispatcher.dispatch(Alert("Dock-2", "No helmet", "open")) == 2
+        assert dispatcher.dispatch(Alert("Dock-2", "No helmet", "close")) == 1   # SMS skips resolutions
+        assert dispatcher.flush(timeout=5.0)
+    finally:
+        dispatcher.stop()
+    assert len(FakeTwilio.messages.sent) == 1
+    assert [a["kind"] for m in sink.messages for a in m["alerts"]] == ["open", "close"]
+
+def test_format_single_and_digest():
+    alert = Alert("Dock-2", "No helmet", "escalate", confidence=90)
+    assert format_alerts([alert]) == "🚨 FACTORY ALERT (Dock-2): ESCALATED (90%): No helmet"
+    digest = format_alerts([alert, Alert("Dock-2", "No helmet", "close")])
+    assert "1 violations on 1 camera " in digest and "1 resolved" in digest
+    assert LogChannel().kinds == ("open", "escalate", "close")
@@ -0,0 +1,102 @@
+import json
+import time
+import pytest
+
+pytest.importorskip("google.genai")
+
+from google.genai import types
+from fake_gemini import FakeClient
+from context_cache import ContextCache, is_cache_error
+
+MODEL = "gemini-2.0-flash"
+
+@pytest.fixture
+def site_file(tmp_path):
+    path = tmp_path / "site_context.json"
+    path.write_text(json.dumps({
+        "default": {"rules": ["Hard hats everywhere on the floor"]},
+        "Press-1": {"rules": ["Press area: gloves + face shield"]},
+    }))
+    return str(path)
+
+def make_cache(client, path, **options):
+    options.setdefault("ttl", 600)
+    options.setdefault("refresh_margin", 60)
+    return ContextCache(client, MODEL, path=path, mode="auto", **options)
+
+def test_no_site_material_means_plain_prompt(tmp_path):
+    cache = make_cache(FakeClient(), str(tmp_path / "missing.json"))
+    assert cache.resolve("Dock-2") is None
+    assert cache.prompt_key("Dock-2", "PROMPT") == "PROMPT"
+
+def test_resolve_creates_once_and_reuses(site_file):
+    client = FakeClient()
+    cache = make_cache(client, site_file)
+
+    ref = cache.resolve("Dock-2")
+    assert ref.cached
+    assert client.caches.alive(ref.config["cached_content"])
+    assert cache.resolve("Dock-2").config == ref.config
+    assert client.caches.created == 1
+
+    # Cameras with different rules get their own cache (and their own verdict-cache key)
+    press = cache.resolve("Press-1")
+    assert press.config != ref.config
+    assert cache.prompt_key("Press-1", "P") != cache.prompt_key("Dock-2", "P")
+    assert client.caches.created == 2
+
+def test_falls_back_inline_when_caching_is_refused(site_file):
+    client = FakeClient(min_cache_tokens=1_000_000)
+    cache = make_cache(client, site_file, retry_after=900)
+
+    ref = cache.resolve("Dock-2")
+    assert not ref.cached
+    assert "Hard hats" in ref.config["system_instruction"]
+    cache.resolve("Dock-2")
+    assert cache.stats()["failures"] == 1   # no second create attempt until retry_after
+    assert cache.stats()["inline_requests"] == 2
+
+def test_ttl_is_extended_near_expiry(site_file):
+    client = FakeClient()
+    cache = make_cache(client, site_file)
+    ref = cache.resolve("Dock-2")
+
+    entry = cache._caches[ref.key]
+    entry["expires"] = time.time() + 30   # inside the 60 s refresh margin
+    assert cache.resolve("Dock-2").config == ref.config
+    assert client.caches.updated == 1
+    assert entry["expires"] > time.time() + 500
+
+def test_expired_cache_is_recreated(site_file):
+    client = FakeClient()
+    cache = make_cache(client, site_file)
+    ref = cache.resolve("Dock-2")
+
+    cache._caches[ref.key]["expires"] = time.time() - 1
+    fresh = cache.resolve("Dock-2")
+    assert fresh.config != ref.config
+    assert client.caches.created == 2
+
+def test_invalidate_after_server_side_loss(site_file):
+    client = FakeClient()
+    cache = make_cache(client, site_file)
+    ref = cache.resolve("Dock-2")
+    client.caches.delete(name=ref.config["cached_content"])   # expired early / deleted elsewhere
+
+    with pytest.raises(Exception) as error:
+        client.models.generate_content(model=MODEL, contents="frame", config=types.GenerateContentConfig(**ref.config))
+    assert is_cache_error(error.value)
+
+    cache.invalidate(ref)
+    fresh = cache.resolve("Dock-2")
+    assert client.caches.alive(fresh.config["cached_content"])
+    assert fresh.config != ref.config
+
+def test_close_deletes_our_caches(site_file):
+    client = FakeClient()
+    cache = make_cache(client, site_file)
+    cache.resolve("Dock-2")
+    cache.resolve("Press-1")
+    cache.close()
+    assert client.caches.stats()["live"] == 0
+    assert cache.stats()["caches"] == 0
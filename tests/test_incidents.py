@@ -0,0 +1,26 @@
+from incidents import IncidentTracker
+from incident_store import IncidentStore
+
+T0 = 1_800_000_000.0
+
+def test_stale_open_rows_are_closed_on_start(tmp_path):
+    store = IncidentStore(str(tmp_path / "incidents.db"), migrate_from=None)
+    crashed = IncidentTracker(store=store, clock=lambda: T0)
+    crashed.observe("Dock-2", "DANGER", "No helmet", 80)
+    assert store.open_count() == 1   # never closed: the process died
+
+    IncidentTracker(store=store, clock=lambda: T0 + 60)   # still fresh: could be another live process
+    assert store.open_count() == 1
+    IncidentTracker(store=store, clock=lambda: T0 + 3600)
+    assert store.open_count() == 0
+
+def test_close_before_insert_is_still_written(tmp_path):
+    store = IncidentStore(str(tmp_path / "incidents.db"), migrate_from=None)
+    tracker = IncidentTracker(store=store, clock=lambda: T0)
+    with tracker._lock:
+        opened = [tracker._danger("Dock-2", "No helmet", 80, T0)]
+        closed = [tracker._close(inc, T0) for inc in tracker._open.pop("Dock-2")]
+    tracker._persist(closed)   # the closing thread got to the store first
+    tracker._persist(opened)
+    assert store.open_count() == 0
+    assert store.range()[0]["state"] == "closed"
@@ -0,0 +1,78 @@
+import time
+import pytest
+from fake_gemini import FakeAPIError
+from model_router import ModelRouter, AllModelsFailed, CLOSED, OPEN, HALF_OPEN
+
+def failing_on(*bad, calls=None):
+    """fn(model_name) for router.call(): raises a 503 for the `bad` models, answers otherwise."""
+    def fn(name):
+        if calls is not None:
+            calls.append(name)
+        if name in bad:
+            raise FakeAPIError(503, "UNAVAILABLE")
+        return f"answer from {name}"
+    return fn
+
+def test_failure_falls_through_to_next_model():
+    router = ModelRouter(["primary", "backup"], failure_threshold=3, cooldown=60.0)
+    calls = []
+    assert router.call(failing_on("primary", calls=calls)) == ("answer from backup", "backup")
+    assert calls == ["primary", "backup"]
+    assert router.models["primary"].errors == 1
+
+def test_breaker_opens_after_consecutive_failures():
+    router = ModelRouter(["primary"], failure_threshold=2, cooldown=60.0)
+    calls = []
+    fn = failing_on("primary", calls=calls)
+
+    with pytest.raises(AllModelsFailed):
+        router.call(fn)
+    assert router.models["primary"].state == CLOSED   # one failure: still closed
+    with pytest.raises(AllModelsFailed):
+        router.call(fn)
+    assert router.models["primary"].state == OPEN
+
+    calls.clear()
+    with pytest.raises(AllModelsFailed, match="open"):
+        router.call(fn)
+    assert calls == []   # the open model isn't tried at all
+
+def test_rate_limit_opens_breaker_immediately():
+    router = ModelRouter(["primary", "backup"], failure_threshold=5, cooldown=60.0)
+
+    def fn(name):
+        if name == "primary":
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED")
+        return name
+
+    router.call(fn)
+    assert router.models["primary"].state == OPEN
+    assert router.models["primary"].rate_limited == 1
+
+def test_half_open_lets_exactly_one_probe_through():
+    router = ModelRouter(["primary", "backup"], failure_threshold=1, cooldown=0.05)
+    router.call(failing_on("primary"))
+    assert router.models["primary"].state == OPEN
+    time.sleep(0.06)
+
+    first = router.candidates()
+    assert first[0] == "primary"   # the probe goes first
+    assert router.models["primary"].state == HALF_OPEN
+    assert router.candidates() == ["backup"]   # probe slot taken: nobody else gets the model
+
+    router.record_success("primary", 0.1)
+    assert router.models["primary"].state == CLOSED
+    assert "primary" in router.candidates()
+
+def test_failed_probe_reopens_with_longer_cooldown():
+    router = ModelRouter(["primary", "backup"], failure_threshold=1, cooldown=0.05, max_cooldown=1.0)
+    router.call(failing_on("primary"))
+    time.sleep(0.06)
+
+    calls = []
+    assert router.call(failing_on("primary", calls=calls)) == ("answer from backup", "backup")
+    health = router.models["primary"]
+    assert calls == ["primary", "backup"]
+    assert health.state == OPEN
+    assert health.cooldown == pytest.approx(0.1)
+    assert not health.probing
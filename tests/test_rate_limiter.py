@@ -0,0 +1,107 @@
+import time
+import threading
+import pytest
+from fake_gemini import FakeAPIError, FakeResponse
+from rate_limiter import (TokenBucket, CameraBudget, RateLimitedModels, retry_after_hint,
+                          PRIORITY_URGENT, PRIORITY_ROUTINE)
+
+class ScriptedModels:
+    """client.models stand-in: raises the queued errors first, then answers; logs the contents of each call."""
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.log = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, model=None, contents=None, config=None):
+        with self._lock:
+            self.log.append(contents)
+            if self.errors:
+                raise self.errors.pop(0)
+        return FakeResponse("{}")
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def test_token_bucket_debt_delays_next_caller():
+    bucket = TokenBucket(rate=10.0, capacity=1)
+    assert bucket.try_acquire()
+    bucket.take(0.5)
+    assert not bucket.try_acquire()
+    assert bucket.wait_time() == pytest.approx(0.15, abs=0.02)
+
+def test_camera_budget_charges_batches_once():
+    budget = CameraBudget(rpm=60, camera_ids=["a", "b"])
+    assert budget.ready("a", 0.5) and budget.ready("b", 0.5)
+    budget.charge(["a", "b"])   # one request for both cameras: half a call each
+    assert budget.ready("a", 0.5) and not budget.ready("a", 1)
+    assert budget.granted == {"a": 1, "b": 1}
+
+def test_urgent_callers_are_served_before_routine():
+    models = ScriptedModels()
+    limiter = RateLimitedModels(models, rpm=60)
+    limiter.requests = TokenBucket(rate=2.0, capacity=1)
+    limiter.requests.try_acquire()   # empty: everyone below has to queue
+
+    routine = threading.Thread(target=limiter.generate_content, kwargs={"contents": "routine", "priority": PRIORITY_ROUTINE})
+    routine.start()
+    wait_for(lambda: limiter.stats()["waiting"] == 1)
+    urgent = threading.Thread(target=limiter.generate_content, kwargs={"contents": "urgent", "priority": PRIORITY_URGENT})
+    urgent.start()
+    wait_for(lambda: limiter.stats()["waiting"] == 2)
+
+    routine.join(5.0)
+    urgent.join(5.0)
+    assert models.log == ["urgent", "routine"]
+    assert limiter.stats()["by_priority"] == {PRIORITY_ROUTINE: 1, PRIORITY_URGENT: 1}
+
+def test_retry_after_pauses_every_caller():
+    now = [100.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    models = ScriptedModels([FakeAPIError(429, "RESOURCE_EXHAUSTED", retry_after=7.5)])
+    limiter = RateLimitedModels(models, rpm=600, sleep=sleep, clock=lambda: now[0])
+
+    assert limiter.generate_content(contents="frame").text == "{}"
+    assert slept == [7.5]   # the server's hint beats the (shorter) backoff
+    assert limiter._paused_until == pytest.approx(107.5)
+    assert limiter.stats()["rate_limited"] == 1
+    assert limiter.stats()["retries"] == 1
+
+    # While paused, another caller holds off too
+    limiter.pause(30.0)
+    caller = threading.Thread(target=limiter.generate_content, kwargs={"contents": "other"})
+    caller.start()
+    time.sleep(0.1)
+    assert models.log == ["frame", "frame"]
+    now[0] += 30.0
+    caller.join(5.0)
+    assert models.log[-1] == "other"
+
+def test_rate_limit_pauses_even_without_retries():
+    models = ScriptedModels([FakeAPIError(429, "RESOURCE_EXHAUSTED", retry_after=7.5)])
+    limiter = RateLimitedModels(models, rpm=600, max_retries=0, sleep=lambda s: None, clock=lambda: 100.0)
+    with pytest.raises(FakeAPIError):
+        limiter.generate_content(contents="frame")
+    assert limiter._paused_until == pytest.approx(107.5)
+    assert limiter.stats()["rate_limited"] == 1
+    assert limiter.stats()["failures"] == 1
+
+def test_non_retryable_errors_are_raised():
+    models = ScriptedModels([FakeAPIError(400, "INVALID_ARGUMENT")])
+    limiter = RateLimitedModels(models, rpm=600, sleep=lambda s: None)
+    with pytest.raises(FakeAPIError):
+        limiter.generate_content(contents="frame")
+    assert limiter.stats()["failures"] == 1
+
+def test_retry_hint_parsing():
+    assert retry_after_hint(FakeAPIError(429, "x", retry_after=3)) == 3.0
+    assert retry_after_hint(Exception("429 RESOURCE_EXHAUSTED. Please retry in 1.5s.")) == 1.5
+    assert retry_after_hint(Exception("{'retryDelay': '12s'}")) == 12.0
+    assert retry_after_hint(Exception("503 UNAVAILABLE")) is None
@@ -0,0 +1,32 @@
+from timeseries import TimeSeriesStore
+
+T0 = 1_800_000_000.0   # on an hour boundary
+
+def filled_store(tmp_path, hours=6, step=10):
+    store = TimeSeriesStore(str(tmp_path))
+    for i in range(0, hours * 3600, step):
+        store.record("Dock-2", 50 + i % 7, "DANGER" if i % 600 == 0 else "SAFE", now=T0 + i)
+    return store
+
+def test_minute_query_keeps_the_bucket_straddling_start(tmp_path):
+    store = filled_store(tmp_path)
+    series = store.query("Dock-2", start=T0 + 1830, end=T0 + 6 * 3600, max_points=500)
+
+    assert series["resolution"] == "1m"
+    assert series["t"][0] == T0 + 1800   # the 30:00 minute overlaps the window: it's drawn
+    assert len(series["t"]) == 330
+
+def test_hour_query_keeps_the_bucket_straddling_start(tmp_path):
+    store = filled_store(tmp_path)
+    series = store.query("Dock-2", start=T0 + 1830, end=T0 + 6 * 3600, max_points=10)
+
+    assert series["resolution"] == "1h"
+    assert series["t"] == [T0 + h * 3600 for h in range(6)]
+    assert sum(series["count"]) == 6 * 360   # written hours + the still-open one, nothing lost
+
+def test_raw_query_is_exact(tmp_path):
+    store = filled_store(tmp_path)
+    series = store.query("Dock-2", start=T0 + 25, end=T0 + 65, max_points=100)
+
+    assert series["resolution"] == "raw"
+    assert series["t"] == [T0 + 30, T0 + 40, T0 + 50, T0 + 60]
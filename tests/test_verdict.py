@@ -0,0 +1,14 @@
+from verdict import Verdict, parse_verdict, parse_verdicts
+
+def test_single_quoted_status_is_recovered():
+    verdict = parse_verdict("{'status': 'DANGER', 'issue': 'No helmet'}")
+    assert verdict.status == "DANGER" and verdict.issue == "No helmet"
+
+def test_unnumbered_items_fill_free_slots():
+    text = '[{"frame": 2, "status": "SAFE", "issue": ""}, {"status": "DANGER", "issue": "Blocked exit"}]'
+    first, second = parse_verdicts(text, 2)
+    assert isinstance(first, Verdict) and first.status == "DANGER"
+    assert second.status == "SAFE"
+
+def test_missing_frames_stay_empty():
+    assert parse_verdicts('[{"frame": 3, "status": "SAFE", "issue": ""}]', 3)[:2] == [None, None]
@@ -0,0 +1,261 @@
+import os
+import time
+import struct
+import threading
+from urllib.parse import quote, unquote
+
+TIMESERIES_DIR = os.getenv("TIMESERIES_DIR", "timeseries")
+RAW_RETENTION = float(os.getenv("TIMESERIES_RAW_DAYS", "2")) * 86400
+MINUTE_RETENTION = float(os.getenv("TIMESERIES_MINUTE_DAYS", "30")) * 86400
+
+# On-disk layout: three append-only files of fixed-size little-endian records per camera
+#   <camera>.raw.bin  time(d) confidence(f) danger(B) pad   -> 16 bytes per verdict
+#   <camera>.1m.bin   bucket_start(d) min(f) max(f) sum(d) count(I) danger(I) -> 32 bytes
+#   <camera>.1h.bin   same layout as 1m
+# Records are in time order, so a time range is two binary searches away.
+RAW = struct.Struct("<dfBxxx")
+ROLLUP = struct.Struct("<dffdII")
+LEVELS = [("raw", RAW, 0), ("1m", ROLLUP, 60), ("1h", ROLLUP, 3600)]
+
+# Internally every point is a rollup tuple: (t, min, max, sum, count, danger)
+def _from_raw(record):
+    t, confidence, danger = record
+    return (t, confidence, confidence, confidence, 1, danger)
+
+def _merge(a, b):
+    if a is None:
+        return b
+    return (a[0], min(a[1], b[1]), max(a[2], b[2]), a[3] + b[3], a[4] + b[4], a[5] + b[5])
+
+def downsample(points, seconds):
+    """Merges time-ordered rollup tuples into `seconds`-wide buckets aligned to the epoch."""
+    out = []
+    for point in points:
+        start = point[0] - point[0] % seconds
+        if out and out[-1][0] == start:
+            out[-1] = _merge(out[-1], point)
+        else:
+            out.append((start,) + tuple(point[1:]))
+    return out
+
+# 1. RECORD FILES
+class _RecordFile:
+    """Read side of one series file: count, binary search by time, range reads."""
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        try:
+            self._f = open(path, "rb")
+            # A record being appended right now is ignored until it's complete
+            self.count = os.fstat(self._f.fileno()).st_size // fmt.size
+        except OSError:
+            self._f = None
+            self.count = 0
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def time_at(self, index):
+        self._f.seek(index * self.fmt.size)
+        return struct.unpack_from("<d", self._f.read(8))[0]
+
+    def bisect(self, t):
+        """Index of the first record at or after t."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.time_at(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def read(self, start_index, end_index):
+        if end_index <= start_index:
+            return []
+        self._f.seek(start_index * self.fmt.size)
+        data = self._f.read((end_index - start_index) * self.fmt.size)
+        return list(self.fmt.iter_unpack(data[:len(data) - len(data) % self.fmt.size]))
+
+    def range(self, start, end):
+        return self.read(self.bisect(start), self.bisect(end))
+
+    def last_time(self):
+        return self.time_at(self.count - 1) if self.count else None
+
+# 2. WRITE SIDE
+class _Bucket:
+    """The open (not yet written) bucket of one rollup level."""
+    def __init__(self, seconds, path):
+        self.seconds = seconds
+        self.file = open(path, "ab", buffering=0)
+        self.current = None
+
+    def add(self, point):
+        """Folds a point in. Returns the bucket it finalized (now on disk), or None."""
+        start = point[0] - point[0] % self.seconds
+        done = None
+        if self.current is not None and self.current[0] != start:
+            done = self.current
+            self.file.write(ROLLUP.pack(*done))
+        self.current = _merge(self.current if done is None else None, (start,) + tuple(point[1:]))
+        return done
+
+class _Series:
+    """One camera's writer: raw append + cascading 1-minute / 1-hour rollups."""
+    def __init__(self, paths, now):
+        raw_path, minute_path, hour_path = paths
+        self._compact(minute_path, ROLLUP, now - MINUTE_RETENTION)
+        self.minute = _Bucket(60, minute_path)
+        self.hour = _Bucket(3600, hour_path)
+        self.last_t = 0.0
+        self._recover(raw_path, minute_path, hour_path)
+        # After recovery: everything trimmed from raw is already in a rollup (or the open bucket)
+        self._compact(raw_path, RAW, now - RAW_RETENTION)
+        self.raw = open(raw_path, "ab", buffering=0)
+
+    @staticmethod
+    def _compact(path, fmt, cutoff):
+        """Drops records older than the retention window (once, when the writer opens)."""
+        with _RecordFile(path, fmt) as f:
+            keep = f.bisect(cutoff) if f.count else 0
+            if not keep:
+                return
+            tail = f.read(keep, f.count)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as out:
+            out.write(b"".join(fmt.pack(*r) for r in tail))
+        os.replace(tmp, path)
+
+    def _recover(self, raw_path, minute_path, hour_path):
+        # Rebuild the open buckets from what's on disk but not rolled up yet
+        with _RecordFile(hour_path, ROLLUP) as hours:
+            hour_end = hours.last_time() + 3600 if hours.count else float("-inf")
+        with _RecordFile(minute_path, ROLLUP) as minutes:
+            for record in minutes.read(minutes.bisect(hour_end), minutes.count):
+                self.hour.add(record)
+            minute_end = minutes.last_time() + 60 if minutes.count else float("-inf")
+        with _RecordFile(raw_path, RAW) as raw:
+            for record in raw.read(raw.bisect(minute_end), raw.count):
+                self._roll(_from_raw(record))
+            self.last_t = raw.last_time() or 0.0
+
+    def _roll(self, point):
+        done = self.minute.add(point)
+        if done is not None:
+            self.hour.add(done)
+
+    def add(self, now, confidence, danger):
+        now = max(now, self.last_t)   # keep the file sorted if the wall clock steps back
+        self.last_t = now
+        self.raw.write(RAW.pack(now, confidence, danger))
+        self._roll((now, confidence, confidence, confidence, 1, danger))
+
+# 3. STORE
+class TimeSeriesStore:
+    """
+    Per-camera confidence history on disk, shared by the sentinel (writes) and
+    the dashboard (reads, from any number of sessions or processes).
+    Every verdict is one 16-byte append; 1-minute and 1-hour min/max/avg rollups
+    are written as their buckets close. query() picks the finest resolution that
+    fits `max_points`, so drawing 15 minutes or 30 days costs the same.
+    Raw points are kept TIMESERIES_RAW_DAYS, minutes TIMESERIES_MINUTE_DAYS,
+    hours forever. One writing process per camera.
+    """
+    def __init__(self, directory=TIMESERIES_DIR):
+        self.directory = directory
+        self._series = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, camera):
+        name = quote(camera, safe="")
+        return [os.path.join(self.directory, f"{name}.{level}.bin") for level, _, _ in LEVELS]
+
+    # 1. WRITES
+    def record(self, camera, confidence, status="SAFE", now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            series = self._series.get(camera)
+            if series is None:
+                series = self._series[camera] = _Series(self._paths(camera), now)
+            series.add(now, float(confidence or 0), 1 if status == "DANGER" else 0)
+
+    # 2. QUERIES
+    def cameras(self):
+        suffix = ".raw.bin"
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(unquote(n[:-len(suffix)]) for n in names if n.endswith(suffix))
+
+    def version(self, camera):
+        """Changes with every recorded verdict (size of the raw file)."""
+        try:
+            return os.path.getsize(self._paths(camera)[0])
+        except OSError:
+            return 0
+
+    def _level(self, paths, index, start, end):
+        """
+        Points of level `index` in [start, end): written buckets + the still-open tail
+        from the finer level. A bucket that straddles `start` is included (whole).
+        """
+        _, fmt, seconds = LEVELS[index]
+        if seconds:
+            start -= start % seconds
+        with _RecordFile(paths[index], fmt) as f:
+            points = f.range(start, end)
+            covered = f.last_time() + seconds if (seconds and f.count) else float("-inf")
+        if index == 0:
+            return [_from_raw(p) for p in points]
+        tail = self._level(paths, index - 1, max(start, covered), end) if covered < end else []
+        return points + downsample(tail, seconds)
+
+    def _estimate(self, paths, index, start, end):
+        _, fmt, seconds = LEVELS[index]
+        if seconds:
+            start -= start % seconds
+        with _RecordFile(paths[index], fmt) as f:
+            count = f.bisect(end) - f.bisect(start)
+            covered = f.last_time() + seconds if (seconds and f.count) else start
+        return count + (int((end - max(start, covered)) // seconds) + 1 if seconds and covered < end else 0)
+
+    def query(self, camera, start=None, end=None, max_points=500):
+        """
+        Returns {'resolution', 't', 'avg', 'min', 'max', 'count', 'danger'} (lists,
+        oldest first) for [start, end), default: the last hour.
+        """
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        paths = self._paths(camera)
+
+        index = len(LEVELS) - 1
+        for i in range(len(LEVELS)):
+            if self._estimate(paths, i, start, end) <= max_points:
+                index = i
+                break
+        points = self._level(paths, index, start, end)
+        resolution = LEVELS[index][0]
+        if len(points) > max_points:
+            # Longer than max_points hours: merge hours further
+            seconds = 3600 * -(-(end - start) // (3600 * max_points))
+            points = downsample(points, seconds)
+            resolution = f"{int(seconds // 3600)}h"
+
+        return {
+            "resolution": resolution,
+            "t": [p[0] for p in points],
+            "avg": [p[3] / p[4] if p[4] else 0.0 for p in points],
+            "min": [p[1] for p in points],
+            "max": [p[2] for p in points],
+            "count": [p[4] for p in points],
+            "danger": [p[5] for p in points],
+        }
@@ -1,12 +1,17 @@
-import cv2
-import time
-import json
 import os
-import pyttsx3
-import threading
+import argparse
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from pipeline import run_stream
+from rate_limiter import RateLimitedClient, PRIORITY_BACKGROUND
+from speech import speak_warning
+from frame_channel import FramePublisher, WRITE_FILES
+from frame_encoder import FrameEncoder
+from timeseries import TimeSeriesStore
+from model_discovery import discover, cache_key
+from verdict import VerdictParseError, parse_verdict
+from metrics import span, start_exporter
 
 # 1. SETUP
 load_dotenv(override=True)
@@ -17,7 +22,11 @@ if not api_key:
     exit()
 
 print(f"🔑 Key: ...{api_key[-4:]}")
-client = genai.Client(api_key=api_key)
+# Every Gemini call goes through one token bucket (GEMINI_RPM) with 429 backoff
+client = RateLimitedClient(genai.Client(api_key=api_key), rpm=float(os.getenv("GEMINI_RPM", "15")))
+publisher = FramePublisher(write_files=WRITE_FILES)
+encoder = FrameEncoder()
+timeseries = TimeSeriesStore()
 
 # 2. LEGACY MODEL SELECTOR
 # We are dropping down to 1.0 because 2.0/1.5 are blocked
@@ -27,22 +36,39 @@ LEGACY_MODELS = [
     "gemini-1.0-pro-001"  # Specific version
 ]
 
-valid_model = None
-
-print("\n🔌 CONNECTING TO LEGACY SERVERS...")
-for model_name in LEGACY_MODELS:
-    try:
-        print(f"   👉 Testing: {model_name}...", end=" ")
-        # Tiny test
-        client.models.generate_content(
-            model=model_name,
-            contents="Hi"
-        )
-        print("✅ ALIVE!")
-        valid_model = model_name
-        break 
-    except Exception as e:
-        print("❌ Dead.")
+def probe_models():
+    """Spends one tiny request per model until one answers. Results are cached on disk."""
+    print("\n🔌 CONNECTING TO LEGACY SERVERS...")
+    probes = {}
+    selected = None
+    for model_name in LEGACY_MODELS:
+        try:
+            print(f"   👉 Testing: {model_name}...", end=" ")
+            # Tiny test
+            client.models.generate_content(
+                model=model_name,
+                contents="Hi",
+                priority=PRIORITY_BACKGROUND
+            )
+            print("✅ ALIVE!")
+            probes[model_name] = True
+            selected = model_name
+            break 
+        except Exception as e:
+            print("❌ Dead.")
+            probes[model_name] = False
+    if not selected:
+        # Don't cache a total failure: next start should probe again
+        raise RuntimeError("no legacy model answered")
+    return {"selected": selected, "probes": probes}
+
+def on_probe_revalidated(value):
+    global valid_model
+    print(f"🔁 Probe results changed, switching to: {value['selected']}")
+    valid_model = value["selected"]
+
+discovery = discover(cache_key("universal_connect", api_key), probe_models, on_update=on_probe_revalidated)
+valid_model = discovery["selected"] if discovery else None
 
 if not valid_model:
     print("\n❌ ALL MODELS BLOCKED. YOU MUST ENABLE BILLING.")
@@ -53,87 +79,62 @@ if not valid_model:
 print(f"\n🚀 LAUNCHING SENTINEL WITH: {valid_model}")
 print("------------------------------------------------")
 
-# 3. AUDIO SETUP
-engine = pyttsx3.init()
-engine.setProperty('rate', 150)
-
-def speak_warning(text):
-    def run_speech():
-        try:
-            local_engine = pyttsx3.init()
-            local_engine.say(f"Alert! {text}")
-            local_engine.runAndWait()
-        except:
-            pass
-    t = threading.Thread(target=run_speech)
-    t.start()
-
-# 4. MAIN LOOP
+# 3. MAIN LOOP
 def analyze_frame(frame):
-    # Resize to 640x480
-    frame_resized = cv2.resize(frame, (640, 480))
-    _, buffer = cv2.imencode('.jpg', frame_resized)
-    image_bytes = buffer.tobytes()
+    # Aspect-preserving resize + one JPEG encode, reused for upload and dashboard
+    frame_resized, image_bytes = encoder.prepare(frame)
     
     # Gemini 1.0 Pro is text-only usually, but we try sending image
     # If it fails, we fall back to text simulation for the video
-    prompt = "You are a Safety Officer. Analyze this factory scene. Return ONLY JSON: {'status': 'SAFE'/'DANGER', 'issue': 'short description'}"
+    # 1.0 models have no JSON mode / response schema: the prompt spells out the format
+    # and the tolerant parser copes with fences or single quotes
+    prompt = 'You are a Safety Officer. Analyze this factory scene. Return ONLY JSON: {"status": "SAFE" or "DANGER", "issue": "at most 8 words", "confidence": 0-100}'
 
     try:
-        response = client.models.generate_content(
-            model=valid_model, 
-            contents=[
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
-                        types.Part.from_text(text=prompt)
-                    ]
-                )
-            ]
-        )
+        with span("gemini_call"):
+            response = client.models.generate_content(
+                model=valid_model, 
+                contents=[
+                    types.Content(
+                        role="user",
+                        parts=[
+                            types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
+                            types.Part.from_text(text=prompt)
+                        ]
+                    )
+                ]
+            )
         
-        text_data = response.text.replace("```json", "").replace("```", "").strip()
-        print(f"🤖 AI: {text_data}")
+        # Parse FIRST: a garbled answer must not overwrite the dashboard status
+        with span("parse"):
+            verdict = parse_verdict(response.text)
+        print(f"🤖 AI: {verdict.to_json()}")
 
-        try:
-            data = json.loads(text_data)
-            if data.get("status") == "DANGER":
-                print(f"🔊 WARNING: {data.get('issue')}")
-                speak_warning(f"Violation. {data.get('issue')}")
-        except:
-            pass
+        # Atomic hand-off to the dashboard (reuses the JPEG we just uploaded)
+        publisher.publish(verdict.to_json(), image_bytes)
+        timeseries.record("Camera-01", verdict.confidence, verdict.status)
 
-        with open("status.json", "w") as f:
-            f.write(text_data)
-        cv2.imwrite("current_frame.jpg", frame_resized)
+        if verdict.is_danger:
+            print(f"🔊 WARNING: {verdict.issue}")
+            speak_warning(f"Violation. {verdict.issue}")
 
+    except VerdictParseError as e:
+        print(f"⚠️ Unusable answer, status left unchanged: {e}")
     except Exception as e:
         print(f"❌ API Error: {e}")
 
-def start_stream(video_source):
-    cap = cv2.VideoCapture(video_source)
-    print("🎥 Starting Video Feed...")
-    last_analysis_time = 0
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            continue
-
-        cv2.imshow('Factory Sentinel - Live', frame)
-
-        if time.time() - last_analysis_time >= 15.0:
-            print("📸 Scanning...")
-            analyze_frame(frame)
-            last_analysis_time = time.time()
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+def start_stream(video_source, headless=False):
+    # Analysis runs on a background worker; the video loop never waits on Gemini
+    # headless=True (or no display) runs without the preview window, e.g. on a server
+    return run_stream(video_source, analyze_frame, interval=15.0, window_title='Factory Sentinel - Live', headless=headless)
 
 if __name__ == "__main__":
-    start_stream("factory_sample.mp4")
+    parser = argparse.ArgumentParser(description="Watch one camera with the Gemini sentinel.")
+    # Use 0 for webcam, or filename / RTSP URL for video
+    parser.add_argument("source", nargs="?", default="factory_sample.mp4")
+    parser.add_argument("--headless", action="store_true", help="no preview window")
+    args = parser.parse_args()
+
+    # Per-stage timings: http://127.0.0.1:METRICS_PORT/metrics and METRICS_FILE (dashboard)
+    start_exporter()
+    start_stream(int(args.source) if args.source.isdigit() else args.source, headless=args.headless)
@@ -0,0 +1,217 @@
+import re
+import ast
+import json
+from metrics import metrics
+
+# STRUCTURED VERDICTS
+# Gemini is asked for JSON mode with a response schema, so the answer is normally
+# plain JSON that json.loads takes in one step. The tolerant parser below is the
+# fallback for models / SDK paths without schema support (fenced blocks, single-quoted
+# pseudo-JSON, chatty prefixes). Every parse is counted as
+# verdict_parse{result=json|repaired|regex|failed}.
+
+STATUSES = ("SAFE", "DANGER")
+
+PROMPT = "Factory safety officer. Check this image for safety violations. status DANGER only for a clear violation; issue: at most 8 words; confidence 0-100."
+# With a cached / system-instruction context (context_cache.py) the role and rules live
+# in SYSTEM_INSTRUCTION and each request only carries the image(s) + FRAME_PROMPT
+SYSTEM_INSTRUCTION = "You are a factory safety officer checking camera images for safety violations. status DANGER only for a clear violation; issue: at most 8 words; confidence 0-100."
+FRAME_PROMPT = "Check this camera frame."
+BATCH_FRAME_PROMPT = "You get {n} camera frames, numbered 1-{n} in the order sent (reference images don't count). One entry per image, same order: frame number, status, issue, confidence."
+BATCH_PROMPT = "Factory safety officer. You get {n} images, numbered 1-{n} in the order sent. Check each one for safety violations. One entry per image, same order: frame number, status (DANGER only for a clear violation), issue (at most 8 words), confidence 0-100."
+
+_VERDICT_PROPERTIES = {
+    "status": {"type": "STRING", "enum": list(STATUSES)},
+    "issue": {"type": "STRING", "description": "at most 8 words"},
+    "confidence": {"type": "INTEGER", "minimum": 0, "maximum": 100},
+}
+
+VERDICT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": _VERDICT_PROPERTIES,
+    "required": ["status", "issue", "confidence"],
+    "property_ordering": ["status", "issue", "confidence"],
+}
+
+BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"frame": {"type": "INTEGER"}, **_VERDICT_PROPERTIES},
+        "required": ["frame", "status", "issue", "confidence"],
+        "property_ordering": ["frame", "status", "issue", "confidence"],
+    },
+}
+
+class VerdictParseError(ValueError):
+    pass
+
+# 1. TYPED VERDICT
+class Verdict:
+    """One safety verdict. from_dict normalises case, '85%' style confidences and 0-1 fractions."""
+    def __init__(self, status, issue="", confidence=None, frame=None):
+        self.status = status
+        self.issue = issue
+        self.confidence = confidence
+        self.frame = frame
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise VerdictParseError(f"expected an object, got {type(data).__name__}")
+        status = str(data.get("status", "")).strip().upper()
+        if status not in STATUSES:
+            raise VerdictParseError(f"unknown status {data.get('status')!r}")
+        return cls(
+            status=status,
+            issue=str(data.get("issue") or "").strip(),
+            confidence=_confidence(data.get("confidence")),
+            frame=data.get("frame"),
+        )
+
+    @property
+    def is_danger(self):
+        return self.status == "DANGER"
+
+    def to_dict(self):
+        return {"status": self.status, "issue": self.issue, "confidence": self.confidence}
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def __repr__(self):
+        return f"Verdict({self.status}, {self.issue!r}, {self.confidence})"
+
+def _confidence(value):
+    if value is None or value == "":
+        return None
+    try:
+        number = float(str(value).strip().rstrip("%"))
+    except ValueError:
+        return None
+    if 0 < number <= 1 and "." in str(value):
+        number *= 100
+    return int(round(min(100.0, max(0.0, number))))
+
+# 2. REQUEST CONFIG
+def generation_config(batch_size=1, max_tokens=None, cached_content=None, system_instruction=None):
+    """
+    JSON mode + response schema: the model can only answer with a verdict (or a list
+    of them), which also keeps the output to a few dozen tokens. max_tokens is an
+    optional hard cap; leave it unset for thinking models, whose reasoning counts
+    against it. cached_content (a cache name) or system_instruction come from
+    context_cache.ContextCache.resolve().
+    """
+    from google.genai import types
+    options = {
+        "response_mime_type": "application/json",
+        "response_schema": BATCH_SCHEMA if batch_size > 1 else VERDICT_SCHEMA,
+        "temperature": 0.0,
+    }
+    if max_tokens:
+        options["max_output_tokens"] = int(max_tokens) * max(1, batch_size)
+    if cached_content:
+        options["cached_content"] = cached_content
+    elif system_instruction:
+        options["system_instruction"] = system_instruction
+    return types.GenerateContentConfig(**options)
+
+# 3. TOLERANT PARSER
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.S | re.I)
+# Only an explicit status key counts: a bare "safe" / "danger" in prose is not a verdict
+_STATUS = re.compile(r"""['"]status['"]\s*:\s*['"](SAFE|DANGER)['"]""", re.I)
+_ISSUE = re.compile(r"""["']?issue["']?\s*[:=]\s*["']([^"']*)["']""", re.I)
+_CONFIDENCE = re.compile(r"""["']?confidence["']?\s*[:=]\s*["']?(\d+(?:\.\d+)?)""", re.I)
+
+def _block(text):
+    """The outermost {...} or [...] in text, whichever opens first."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    end = text.rfind("}" if text[start] == "{" else "]")
+    return text[start:end + 1] if end > start else None
+
+def extract_json(text):
+    """Returns (how, value) where how is 'json' (clean), 'repaired' or 'regex'. Raises VerdictParseError."""
+    if text is None:
+        raise VerdictParseError("empty response")
+    stripped = text.strip()
+
+    # Fast path: what JSON mode returns
+    if stripped[:1] in ("{", "["):
+        try:
+            return "json", json.loads(stripped)
+        except ValueError:
+            pass
+
+    fenced = _FENCE.search(stripped)
+    candidate = _block(fenced.group(1) if fenced else stripped)
+    if candidate:
+        try:
+            return "repaired", json.loads(candidate)
+        except ValueError:
+            pass
+        try:
+            # {'status': 'SAFE', ...} - the old prompt taught models single quotes
+            value = ast.literal_eval(candidate)
+            if isinstance(value, (dict, list)):
+                return "repaired", value
+        except (ValueError, SyntaxError):
+            pass
+
+    status = _STATUS.search(stripped)
+    if status:
+        issue = _ISSUE.search(stripped)
+        confidence = _CONFIDENCE.search(stripped)
+        return "regex", {
+            "status": status.group(1),
+            "issue": issue.group(1) if issue else "",
+            "confidence": confidence.group(1) if confidence else None,
+        }
+    raise VerdictParseError(f"no verdict in {stripped[:80]!r}")
+
+def parse_verdict(text):
+    """Model text -> Verdict. Raises VerdictParseError (counted) if nothing usable is in it."""
+    try:
+        how, value = extract_json(text)
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        verdict = Verdict.from_dict(value)
+    except VerdictParseError:
+        metrics.inc("verdict_parse", result="failed")
+        raise
+    metrics.inc("verdict_parse", result=how)
+    return verdict
+
+def parse_verdicts(text, count):
+    """Batch answer -> list of `count` Verdicts (None where the model skipped or garbled a frame)."""
+    try:
+        how, items = extract_json(text)
+    except VerdictParseError:
+        metrics.inc("verdict_parse", result="failed")
+        raise
+    if isinstance(items, dict):
+        items = [items]
+    metrics.inc("verdict_parse", result=how)
+
+    verdicts = [None] * count
+    unnumbered = []
+    for item in items:
+        try:
+            verdict = Verdict.from_dict(item)
+        except VerdictParseError:
+            metrics.inc("verdict_parse", result="failed")
+            continue
+        try:
+            index = int(verdict.frame) - 1
+        except (TypeError, ValueError):
+            unnumbered.append(verdict)
+            continue
+        if 0 <= index < count and verdicts[index] is None:
+            verdicts[index] = verdict
+    # Numbered answers claim their frames first; the rest fill the free slots in order
+    free = (i for i, v in enumerate(verdicts) if v is None)
+    for verdict, index in zip(unnumbered, free):
+        verdicts[index] = verdict
+    return verdicts